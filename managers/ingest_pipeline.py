@@ -0,0 +1,234 @@
+# managers/ingest_pipeline.py
+
+import os
+import queue
+import threading
+
+from utils.exiftool_batch import extract_metadata_batch
+from utils.media_utils import (
+    DEFAULT_WRITE_BATCH_SIZE,
+    LOOKUP_CHUNK_SIZE,
+    get_existing_media_records,
+    insert_media_records,
+    update_media_records
+)
+
+DEFAULT_WORKERS = 1
+DEFAULT_QUEUE_DEPTH = 1000
+
+
+class IngestWriter:
+    """
+    The database side of an ingest: resolves existing rows a chunk at a time,
+    queues inserts and updates, writes them in batches and records which files
+    were processed. Only ever used from one thread, which owns `db_conn`.
+    """
+
+    def __init__(self, db_conn, media_type, logger, processed, dry_run=False,
+                 batch_limit=DEFAULT_WRITE_BATCH_SIZE, content_index=None, roots=()):
+        self.db_conn = db_conn
+        self.media_type = media_type
+        self.logger = logger
+        self.processed = processed
+        self.dry_run = dry_run
+        self.batch_limit = batch_limit
+        self.content_index = content_index
+        self.roots = tuple(os.path.join(os.path.abspath(r), "") for r in roots)
+        self.inserted = self.updated = self.skipped = self.duplicates = 0
+        self.lookup_batch = []
+        self.insert_batch = []
+        self.update_batch = []
+
+    def add(self, file_path, metadata):
+        if not self.db_conn:
+            self.logger.info(f"DRY_RUN: Would process metadata for {os.path.basename(file_path)}")
+            self.skipped += 1
+            return
+        if self.is_duplicate(file_path):
+            return
+
+        self.lookup_batch.append((file_path, metadata))
+        if len(self.lookup_batch) >= LOOKUP_CHUNK_SIZE:
+            self.resolve_lookup_batch()
+
+        if len(self.insert_batch) >= self.batch_limit:
+            self.flush_inserts()
+        if len(self.update_batch) >= self.batch_limit:
+            self.flush_updates()
+
+    def is_ingested(self, path):
+        """
+        Whether `path` is itself part of the library: under the ingest roots
+        or already processed. Copies the mover made elsewhere (the local twin
+        of a --target both move) are indexed too, but are not in the library.
+        """
+        return path.startswith(self.roots) or path in self.processed
+
+    def is_duplicate(self, file_path):
+        """
+        True if the content index already has a file with the same content;
+        the file is then marked processed and not written. Otherwise the file
+        is queued for the index.
+        """
+        if self.content_index is None:
+            return False
+        try:
+            size = os.path.getsize(file_path)
+        except OSError:
+            return False
+        duplicate, entry = self.content_index.find_duplicate(self.db_conn, file_path, size, logger=self.logger,
+                                                             accept=self.is_ingested)
+        if duplicate:
+            self.logger.info(f"[{self.media_type}] Duplicate content of {duplicate}, skipping {file_path}")
+            self.duplicates += 1
+            self.processed.add(file_path)
+            return True
+        self.content_index.add(file_path, entry)
+        if self.content_index.pending() >= self.batch_limit:
+            self.content_index.flush(self.db_conn, self.logger)
+        return False
+
+    def resolve_lookup_batch(self):
+        if not self.lookup_batch:
+            return
+        names = [os.path.basename(fp) for fp, _ in self.lookup_batch]
+        self.logger.debug(f"Checking DB for existing records: {len(names)} files")
+        try:
+            existing_rows = get_existing_media_records(self.db_conn, names, self.media_type, self.logger)
+        except Exception as e:
+            self.logger.error(f"[{self.media_type}] Existing-record lookup failed, leaving {len(names)} files for the next run: {e}")
+            self.skipped += len(self.lookup_batch)
+            self.lookup_batch.clear()
+            return
+
+        for file_path, metadata in self.lookup_batch:
+            file_name = os.path.basename(file_path)
+            existing = existing_rows.get(file_name)
+            if existing:
+                self.logger.debug(f"Found existing record for {file_name}, queuing update")
+                self.update_batch.append((file_path, existing["id"], metadata, existing))
+            else:
+                self.logger.debug(f"No existing record found for {file_name}, queuing insert")
+                self.insert_batch.append((file_path, metadata))
+        self.lookup_batch.clear()
+
+    def flush_inserts(self):
+        if not self.insert_batch:
+            return
+        written = insert_media_records(self.db_conn, self.insert_batch, self.media_type, self.logger,
+                                       self.dry_run, batch_size=self.batch_limit)
+        for file_path in written:
+            self.processed.add(file_path)
+        self.inserted += len(written)
+        self.insert_batch.clear()
+
+    def flush_updates(self):
+        if not self.update_batch:
+            return
+        written = update_media_records(self.db_conn, self.update_batch, self.media_type, self.logger,
+                                       self.dry_run, batch_size=self.batch_limit)
+        for file_path in written:
+            self.processed.add(file_path)
+        self.updated += len(written)
+        self.update_batch.clear()
+
+    def finish(self):
+        self.resolve_lookup_batch()
+        self.flush_inserts()
+        self.flush_updates()
+        self.processed.flush(self.db_conn, self.logger)
+        if self.content_index is not None:
+            self.content_index.flush(self.db_conn, self.logger)
+
+
+def run_ingest_pipeline(logger, files, writer, prepare=None, workers=DEFAULT_WORKERS,
+                        queue_depth=DEFAULT_QUEUE_DEPTH):
+    """
+    Run an ingest as three stages joined by bounded queues:
+
+        walker thread  ->  `workers` metadata-extraction threads  ->  one writer thread
+
+    `files` is the walker's iterator of paths, `prepare(file_path, metadata)`
+    post-processes each extraction, and `writer` (an IngestWriter) receives
+    every result on the writer thread, which is the only one to touch the
+    database. Full queues block the stage feeding them. The first exception
+    raised by any stage stops the others and is re-raised here.
+    """
+    workers = max(1, workers)
+    path_q = queue.Queue(maxsize=queue_depth)
+    result_q = queue.Queue(maxsize=queue_depth)
+    done = object()
+    stop = threading.Event()
+    errors = []
+
+    def fail(stage, e):
+        logger.error(f"Ingest pipeline {stage} failed: {e}")
+        errors.append(e)
+        stop.set()
+
+    def put(q, item):
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def drain(q):
+        while True:
+            try:
+                item = q.get(timeout=0.5)
+            except queue.Empty:
+                if stop.is_set():
+                    return
+                continue
+            if item is done:
+                return
+            yield item
+
+    def walk():
+        try:
+            for file_path in files:
+                if not put(path_q, file_path):
+                    return
+        except Exception as e:
+            fail("walker", e)
+        finally:
+            for _ in range(workers):
+                put(path_q, done)
+
+    def extract():
+        try:
+            for file_path, metadata in extract_metadata_batch(drain(path_q), logger):
+                if prepare is not None:
+                    metadata = prepare(file_path, metadata)
+                if not put(result_q, (file_path, metadata)):
+                    return
+        except Exception as e:
+            fail("extractor", e)
+        finally:
+            put(result_q, done)
+
+    def write():
+        try:
+            finished = 0
+            while finished < workers and not stop.is_set():
+                for file_path, metadata in drain(result_q):
+                    writer.add(file_path, metadata)
+                finished += 1
+            if not stop.is_set():
+                writer.finish()
+        except Exception as e:
+            fail("writer", e)
+
+    threads = [threading.Thread(target=walk, name="ingest-walker", daemon=True)]
+    threads += [threading.Thread(target=extract, name=f"ingest-extract-{i}", daemon=True) for i in range(workers)]
+    threads.append(threading.Thread(target=write, name="ingest-writer", daemon=True))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    if errors:
+        raise errors[0]
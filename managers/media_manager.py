@@ -8,19 +8,46 @@ import json
 from pathlib import Path
 from datetime import datetime
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
 from app_utils import setup_logging, app_failed, load_media_types, load_metadata_mappings
 from metadata_parser import select_oldest_datetime
-from db_connection import connect_to_database
+from utils.db_backend import DEFAULT_BACKEND, is_sqlite
+from utils.db_pool import ConnectionManager, DEFAULT_POOL_SIZE
 import re
-from utils.media_utils import (
-    get_existing_media_record,
-    insert_new_media_record,
-    update_missing_media_fields
-)
+from utils.media_utils import DEFAULT_WRITE_BATCH_SIZE
+from managers.ingest_pipeline import IngestWriter, run_ingest_pipeline, DEFAULT_QUEUE_DEPTH
+from managers.migrations import run_migrations
+from managers.schema import create_tables
+from managers.work_queue import DEFAULT_LEASE_SECONDS, requeue, run_queue, work_units
 from utils.file_mover import move_file
 from utils.file_mover import process_sources
 from processors.processmedia import process_google_takeout
+from processors.takeout import DEFAULT_TAKEOUT_BATCH_SIZE, DEFAULT_TAKEOUT_WORKERS, GOOGLE_TAKEOUT_ROOT_DIR
+from processors.places import process_places
+from utils.geocoder import DEFAULT_GEOHASH_PRECISION, DEFAULT_MAX_PLACE_KM
 from metadata_parser import parse_metadata
+from utils.exiftool_pool import configure_pool, DEFAULT_WORKERS
+from utils.exiftool_batch import extract_metadata_batch
+from utils.metadata_cache import configure_cache, get_cache, DEFAULT_CACHE_PATH
+from utils.processed_index import ProcessedIndex
+from utils.content_index import ContentIndex
+from utils.perceptual_hash import (
+    DEFAULT_MAX_DISTANCE,
+    DEFAULT_PHASH_WORKERS,
+    available as perceptual_hash_available,
+    find_similar,
+    index_photo_hashes,
+    load_hash_tree,
+    near_duplicate_report,
+    photo_paths
+)
+from utils.bulk_loader import bulk_load_media, enable_local_infile
+from utils.scanner import BackgroundCounter, scan_files
+from utils.scan_journal import configure_journal, get_journal, DEFAULT_JOURNAL_PATH
+from managers.watcher import watch_sources, DEFAULT_DEBOUNCE
+from utils.transfer_scheduler import DEFAULT_PER_DEVICE
+from utils.date_writeback import DEFAULT_WRITE_BATCH
 
 sys.path.append(str(Path(__file__).resolve().parent.parent))
 
@@ -47,16 +74,11 @@ remote_dashcam_dir = remote_videos_dir / "DC"
 remote_tiktok_dir = remote_videos_dir / "TikTok"
 
 def get_exiftool_data(file_path, logger):
-    command = ["exiftool", "-j", file_path]
-    logger.debug(f"Running command: {' '.join(command)}")
-    try:
-        result = subprocess.run(command, capture_output=True, text=True, check=True)
-        metadata = json.loads(result.stdout)[0]
+    logger.debug(f"Running command: exiftool -j {file_path}")
+    for _, metadata in extract_metadata_batch([file_path], logger):
         logger.debug(f"Raw ExifTool metadata: {metadata}")
         return metadata
-    except Exception as e:
-        logger.warning(f"ExifTool failed for {file_path}: {e}")
-        return {}
+    return {}
 
 """
 def update_media_record(db_conn, media_id, metadata, media_type, logger, dry_run=False):
@@ -103,98 +125,179 @@ def update_media_record(db_conn, media_id, metadata, media_type, logger, dry_run
             logger.error(f"Failed to update ID {media_id}: {e}")
 """
 
-def list_valid_files(root_dir, extensions, logger):
-    for root, _, files in os.walk(root_dir):
-        logger.debug(f"Scanning: {root}")
-        for file in files:
-            ext = os.path.splitext(file)[1].lower()
-            if ext in extensions:
-                yield os.path.join(root, file)
-            else:
-                logger.debug(f"Skipping unsupported: {file}")
+def list_valid_files(root_dir, extensions, logger, journal=None):
+    return scan_files(root_dir, extensions, logger=logger, journal=journal)
+
+def apply_date_fallback(file_path, metadata, logger):
+    file_name = os.path.basename(file_path)
+    logger.debug(f"Raw ExifTool metadata: {metadata}")
+
+    if "CreateDate" not in metadata:
+        fallback_dt = select_oldest_datetime({}, logger, filename=file_name)
+        if fallback_dt:
+            metadata["CreateDate"] = fallback_dt.strftime("%Y:%m:%d %H:%M:%S")
+            logger.debug(f"Using fallback datetime: {metadata['CreateDate']}")
+            logger.debug("Running fallback datetime parser, not using execute_query")
+            logger.debug(f"select_oldest_datetime received: {file_name}")
+    return metadata
 
 def process_media_files(logger, source_dirs, valid_exts, db_conn,
-                        dry_run=False, debug=False, verbose=False, media_type="Videos"):
+                        dry_run=False, debug=False, verbose=False, media_type="Videos",
+                        processed=None, batch_limit=DEFAULT_WRITE_BATCH_SIZE, bulk_load=False,
+                        workers=1, queue_depth=DEFAULT_QUEUE_DEPTH, count_total=True, full_rescan=False,
+                        content_index=None, phash_workers=None, files=None):
 
     if dry_run:
         debug = verbose = True
 
-    media_files = [fp for d in source_dirs for fp in list_valid_files(d, valid_exts, logger)]
-    total_files = len(media_files)
-    logger.info(f"[{media_type}] Total files: {total_files}")
-
-    updated = skipped = inserted = unmatched = 0
-    batch_limit = 10
-    insert_batch = []
-    update_batch = []
-
-    for idx, file_path in enumerate(media_files, 1):
-        if is_processed(db_conn, file_path, media_type):
-            logger.debug(f"{file_path} already processed. Skipping.")
-            skipped += 1
-            continue
+    # `files` is one work unit of a distributed ingest: the queue decides what
+    # is scanned, so the local scan journal does not apply.
+    scan = get_journal().begin(media_type, full_rescan) if get_journal() is not None and files is None else None
 
+    # Files are streamed from the scan; the total is only for progress output
+    # and is counted on a background thread so it never holds up processing.
+    # An incremental scan has no meaningful total, so it is not counted.
+    if files is not None:
+        media_files, total_files = files, "?"
+    else:
+        media_files = (entry for d in source_dirs for entry in list_valid_files(d, valid_exts, logger, scan))
+        total_files = BackgroundCounter(source_dirs, valid_exts) if count_total and scan is None else "?"
+
+    if processed is None:
+        processed = ProcessedIndex.load(db_conn, logger)
+
+    writer = IngestWriter(db_conn, media_type, logger, processed, dry_run=dry_run, batch_limit=batch_limit,
+                          content_index=content_index, roots=source_dirs)
+    unmatched = 0
+    positions = {}
+
+    def pending_files():
+        for idx, entry in enumerate(media_files, 1):
+            if entry.path in processed:
+                logger.debug(f"{entry.path} already processed. Skipping.")
+                writer.skipped += 1
+                continue
+            positions[entry.path] = idx
+            yield entry
+
+    def prepare(file_path, metadata):
+        idx = positions.pop(file_path, "?")
         prefix = f"[{media_type}] [{idx}/{total_files}]"
         logger.info(f"{prefix} Processing: {file_path}" if verbose else f"{prefix}")
 
-        file_name = os.path.basename(file_path)
-        metadata = get_exiftool_data(file_path, logger)
-
-        if "CreateDate" not in metadata:
-            fallback_dt = select_oldest_datetime({}, logger, filename=file_name)
-            if fallback_dt:
-                metadata["CreateDate"] = fallback_dt.strftime("%Y:%m:%d %H:%M:%S")
-                logger.debug(f"Using fallback datetime: {metadata['CreateDate']}")
-                logger.debug("Running fallback datetime parser, not using execute_query")
-                logger.debug(f"select_oldest_datetime received: {file_name}")
-
-        if not db_conn:
-            logger.info(f"DRY_RUN: Would process metadata for {file_name}")
-            skipped += 1
-            continue
-
-        logger.debug(f"Checking DB for existing record: {file_name}")
-        existing = get_existing_media_record(db_conn, file_name, media_type, logger)
-        if existing:
-            logger.debug(f"Found existing record for {file_name}, queuing update")
-            update_batch.append((file_path, existing["id"], metadata, existing))
-        else:
-            logger.debug(f"No existing record found for {file_name}, queuing insert")
-            insert_batch.append((file_path, metadata))
-
-        # Batch flush
-        if len(insert_batch) >= batch_limit:
-            for file_path, record in insert_batch:
-                insert_new_media_record(db_conn, record, media_type, logger, dry_run, file_path=file_path)
-                inserted += 1
-            insert_batch.clear()
-
-        if len(update_batch) >= batch_limit:
-            for file_path, media_id, record, existing_row in update_batch:
-                update_missing_media_fields(db_conn, media_id, record, existing_row, media_type, logger, dry_run, file_path=file_path)
-                updated += 1
-            update_batch.clear()
-
-    # Final flush
-    for file_path, record in insert_batch:
-        insert_new_media_record(db_conn, record, media_type, logger, dry_run, file_path=file_path)
-        inserted += 1
-
-    for file_path, media_id, record, existing_row in update_batch:
-        update_missing_media_fields(db_conn, media_id, record, existing_row, media_type, logger, dry_run, file_path=file_path)
-        updated += 1
-
-    logger.info(f"[{media_type}] Summary: scanned={total_files}, inserted={inserted}, updated={updated}, skipped={skipped}, unmatched={unmatched}")
+        return apply_date_fallback(file_path, metadata, logger)
+
+    def extracted_files():
+        for file_path, metadata in extract_metadata_batch(pending_files(), logger):
+            yield file_path, prepare(file_path, metadata)
+
+    if bulk_load and db_conn:
+        if enable_local_infile(db_conn, logger):
+            unique_files = ((fp, md) for fp, md in extracted_files() if not writer.is_duplicate(fp))
+            loaded = bulk_load_media(db_conn, unique_files, media_type, logger)
+            for file_path in loaded:
+                processed.add(file_path)
+            processed.flush(db_conn, logger)
+            if content_index is not None:
+                content_index.flush(db_conn, logger)
+            if scan is not None:
+                scan.commit(keep=processed.__contains__)
+            if media_type == "Photos" and phash_workers:
+                index_photo_hashes(db_conn, logger, workers=phash_workers)
+            logger.info(f"[{media_type}] Summary: scanned={total_files}, bulk_loaded={len(loaded)}, skipped={writer.skipped}, duplicates={writer.duplicates}")
+            return
+        logger.warning(f"[{media_type}] Falling back to batched inserts")
+
+    if workers > 1:
+        logger.info(f"[{media_type}] Running pipeline with {workers} extraction workers, queue depth {queue_depth}")
+        run_ingest_pipeline(logger, pending_files(), writer, prepare=prepare,
+                            workers=workers, queue_depth=queue_depth)
+    else:
+        for file_path, metadata in extracted_files():
+            writer.add(file_path, metadata)
+        writer.finish()
+
+    if scan is not None and not dry_run:
+        scan.commit(keep=processed.__contains__)
+    if media_type == "Photos" and phash_workers and db_conn:
+        index_photo_hashes(db_conn, logger, workers=phash_workers)
+    logger.info(f"[{media_type}] Summary: scanned={total_files}, inserted={writer.inserted}, updated={writer.updated}, skipped={writer.skipped}, duplicates={writer.duplicates}, unmatched={unmatched}")
+    if get_cache() is not None:
+        logger.info(f"[{media_type}] Metadata cache: {get_cache().stats()}")
 
 def handle_media(logger, media_type, source_dirs, ext_set,
                  dry_run=False, debug=False, verbose=False,
-                 config_file=None, config_section=None):
+                 pool=None, processed=None,
+                 batch_limit=DEFAULT_WRITE_BATCH_SIZE, bulk_load=False,
+                 workers=1, queue_depth=DEFAULT_QUEUE_DEPTH, count_total=True, full_rescan=False,
+                 content_index=None, phash_workers=None):
 
     logger.info(f"Handling {media_type} files...")
-    db_conn = None if dry_run else connect_to_database(config_file, config_section)
-    process_media_files(logger, source_dirs, ext_set, db_conn,
-                        dry_run=dry_run, debug=debug, verbose=verbose,
-                        media_type=media_type)
+    # On the main thread this is main()'s connection; a worker thread checks out its own and returns it when done.
+    with pool.session() if pool is not None and not dry_run else nullcontext() as db_conn:
+        process_media_files(logger, source_dirs, ext_set, db_conn,
+                            dry_run=dry_run, debug=debug, verbose=verbose,
+                            media_type=media_type, processed=processed,
+                            batch_limit=batch_limit, bulk_load=bulk_load,
+                            workers=workers, queue_depth=queue_depth, count_total=count_total,
+                            full_rescan=full_rescan, content_index=content_index, phash_workers=phash_workers)
+
+def distributed_media(logger, media_type, source_dirs, ext_set, pool=None, shards=0,
+                      lease_seconds=DEFAULT_LEASE_SECONDS, phash_workers=None, **options):
+    """
+    Ingest `media_type` as one of any number of workers, on this host or
+    others, sharing the database's MediaProcessingQueue: each leased unit
+    runs through process_media_files until the queue is drained.
+    """
+    logger.info(f"Handling {media_type} files from the shared work queue...")
+    options.pop("full_rescan", None)
+
+    def process_unit(db_conn, files):
+        seen = 0
+
+        def counted():
+            nonlocal seen
+            for entry in files:
+                seen += 1
+                yield entry
+
+        process_media_files(logger, source_dirs, ext_set, db_conn, media_type=media_type, files=counted(), **options)
+        return seen
+
+    run_queue(pool, media_type, source_dirs, ext_set, process_unit, logger, shards=shards,
+              lease_seconds=lease_seconds)
+    if media_type == "Photos" and phash_workers:
+        with pool.session() as db_conn:
+            index_photo_hashes(db_conn, logger, workers=phash_workers)
+
+def watch_media(logger, jobs, db_conn, processed, dry_run=False, verbose=False,
+                batch_limit=DEFAULT_WRITE_BATCH_SIZE, debounce=DEFAULT_DEBOUNCE, content_index=None):
+    """Ingest files as they land in the source directories of `jobs`."""
+    writers, ext_types, roots = {}, {}, []
+    for media_type, source_dirs, exts in jobs:
+        writers[media_type] = IngestWriter(db_conn, media_type, logger, processed, dry_run=dry_run,
+                                           batch_limit=batch_limit, content_index=content_index, roots=source_dirs)
+        ext_types.update((ext, media_type) for ext in exts)
+        roots.extend(d for d in source_dirs if os.path.isdir(d))
+
+    def ingest_batch(paths):
+        by_type = {}
+        for file_path in paths:
+            if file_path in processed:
+                continue
+            media_type = ext_types[os.path.splitext(file_path)[1].lower()]
+            by_type.setdefault(media_type, []).append(file_path)
+
+        for media_type, file_paths in by_type.items():
+            writer = writers[media_type]
+            for file_path, metadata in extract_metadata_batch(file_paths, logger):
+                if verbose:
+                    logger.info(f"[{media_type}] [watch] Processing: {file_path}")
+                writer.add(file_path, apply_date_fallback(file_path, metadata, logger))
+            writer.finish()
+            logger.info(f"[{media_type}] [watch] inserted={writer.inserted}, updated={writer.updated}, skipped={writer.skipped}")
+
+    watch_sources(logger, roots, ingest_batch, extensions=set(ext_types), debounce=debounce)
 
 def main():
     parser = argparse.ArgumentParser(description="Unified Media Manager")
@@ -212,11 +315,228 @@ def main():
         action="store_true",
         help="Remove source files after successful move operations (enabled only in non-dry-run mode)."
     )
+    parser.add_argument(
+        "--rsync",
+        action="store_true",
+        help="Copy files with an rsync subprocess instead of the built-in rename/copy_file_range transfer."
+    )
+    parser.add_argument(
+        "--copies-per-device",
+        type=int,
+        default=DEFAULT_PER_DEVICE,
+        help=f"Concurrent file copies per destination device in move-only mode (default: {DEFAULT_PER_DEVICE})."
+    )
+    parser.add_argument(
+        "--date-write-batch",
+        type=int,
+        default=DEFAULT_WRITE_BATCH,
+        help=f"Moved files whose dates need fixing are written back this many per exiftool call (default: {DEFAULT_WRITE_BATCH})."
+    )
+    parser.add_argument(
+        "--xmp-sidecar-min-mb",
+        type=int,
+        default=None,
+        help="Write dates of moved videos at least this many MB to an XMP sidecar instead of rewriting the video."
+    )
+    parser.add_argument(
+        "--no-dedupe",
+        action="store_true",
+        help="Do not check file contents against the ContentHashes index before moving or ingesting."
+    )
+    parser.add_argument(
+        "--phash",
+        action="store_true",
+        help="After a Photos ingest, compute perceptual hashes for photos that do not have one yet."
+    )
+    parser.add_argument(
+        "--phash-workers",
+        type=int,
+        default=DEFAULT_PHASH_WORKERS,
+        help=f"Processes used to compute perceptual hashes (default: {DEFAULT_PHASH_WORKERS})."
+    )
+    parser.add_argument(
+        "--find-similar",
+        metavar="PATH",
+        help="List library photos that look like PATH (by perceptual hash) and exit."
+    )
+    parser.add_argument(
+        "--near-duplicates",
+        action="store_true",
+        help="Print groups of near-duplicate photos in the library and exit."
+    )
+    parser.add_argument(
+        "--max-distance",
+        type=int,
+        default=DEFAULT_MAX_DISTANCE,
+        help=f"Maximum Hamming distance between perceptual hashes of similar photos (default: {DEFAULT_MAX_DISTANCE})."
+    )
     parser.add_argument(
         "--only-takeout",
         action="store_true",
         help="Only process Google Takeout data; skip local media scanning and moving."
     )
+    parser.add_argument(
+        "--takeout-batch-size",
+        type=int,
+        default=DEFAULT_TAKEOUT_BATCH_SIZE,
+        help=f"Face associations written per batch during Takeout import (default: {DEFAULT_TAKEOUT_BATCH_SIZE})."
+    )
+    parser.add_argument(
+        "--takeout-dir",
+        nargs="+",
+        default=[GOOGLE_TAKEOUT_ROOT_DIR],
+        help=f"Google Takeout directories and/or the original .zip/.tgz archives (default: {GOOGLE_TAKEOUT_ROOT_DIR})."
+    )
+    parser.add_argument(
+        "--takeout-workers",
+        type=int,
+        default=DEFAULT_TAKEOUT_WORKERS,
+        help=f"Processes used to parse Takeout JSON sidecars (default: {DEFAULT_TAKEOUT_WORKERS})."
+    )
+    parser.add_argument(
+        "--places",
+        action="store_true",
+        help="After ingest, reverse geocode new photo/video coordinates into Places."
+    )
+    parser.add_argument(
+        "--gazetteer",
+        metavar="PATH",
+        help="GeoNames dump (e.g. cities500.txt) or an index built from one, for offline reverse geocoding with --places."
+    )
+    parser.add_argument(
+        "--no-nominatim",
+        action="store_true",
+        help="With --places, do not query Nominatim for coordinates the gazetteer cannot resolve."
+    )
+    parser.add_argument(
+        "--max-place-km",
+        type=float,
+        default=DEFAULT_MAX_PLACE_KM,
+        help=f"Farthest a gazetteer place may be from a coordinate to be used for it (default: {DEFAULT_MAX_PLACE_KM})."
+    )
+    parser.add_argument(
+        "--geohash-precision",
+        type=int,
+        choices=range(1, 13),
+        metavar="{1..12}",
+        default=DEFAULT_GEOHASH_PRECISION,
+        help=f"Geohash length of the cells media are geocoded by; 6 is ~1 km, 7 ~150 m, 8 ~40 m "
+             f"(default: {DEFAULT_GEOHASH_PRECISION})."
+    )
+    parser.add_argument(
+        "--backend",
+        default=DEFAULT_BACKEND,
+        help="Database to use: 'mysql' (the [media] section of ~/.my.cnf) or 'sqlite:///path/to/media.sqlite' "
+             f"(default: {DEFAULT_BACKEND})."
+    )
+    parser.add_argument(
+        "--db-pool-size",
+        type=int,
+        default=DEFAULT_POOL_SIZE,
+        help="Most database connections open at once; the main thread and each media-type worker hold one "
+             f"(default: {DEFAULT_POOL_SIZE})."
+    )
+    parser.add_argument(
+        "--distributed",
+        action="store_true",
+        help="Share the ingest with other media_manager.py workers on the same database: units of the scan are "
+             "leased from the MediaProcessingQueue table, and units of crashed workers are taken over once "
+             "their lease expires. Work units and processed files are keyed by path, so every host must mount "
+             "the source directories at the same path."
+    )
+    parser.add_argument(
+        "--shards",
+        type=int,
+        default=0,
+        help="With --distributed, split each media type into this many shards, assigning each top-level entry "
+             "of the source directories to one by its path hash, instead of one work unit per top-level "
+             "directory (default: directories)."
+    )
+    parser.add_argument(
+        "--lease-seconds",
+        type=int,
+        default=DEFAULT_LEASE_SECONDS,
+        help=f"With --distributed, how long a work unit stays leased without a heartbeat; heartbeats are sent "
+             f"every third of it (default: {DEFAULT_LEASE_SECONDS})."
+    )
+    parser.add_argument(
+        "--requeue",
+        action="store_true",
+        help="Start a new distributed pass: put the finished and failed work units of the selected media types "
+             "back in the queue, then exit. Run it once, before starting the --distributed workers."
+    )
+    parser.add_argument(
+        "--exiftool-workers",
+        type=int,
+        default=DEFAULT_WORKERS,
+        help=f"Number of persistent exiftool processes to keep running (default: {DEFAULT_WORKERS})."
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=DEFAULT_WRITE_BATCH_SIZE,
+        help=f"Rows per INSERT/UPDATE transaction; shrunk further to fit max_allowed_packet (default: {DEFAULT_WRITE_BATCH_SIZE})."
+    )
+    parser.add_argument(
+        "--bulk-load",
+        action="store_true",
+        help="Load records through a TSV file and LOAD DATA LOCAL INFILE (fastest for a first ingest into empty tables)."
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Metadata-extraction threads per media type. Above 1, ingest runs as a walker -> extractors -> "
+             "single DB writer pipeline and Videos/Photos run concurrently (pair with --exiftool-workers)."
+    )
+    parser.add_argument(
+        "--queue-depth",
+        type=int,
+        default=DEFAULT_QUEUE_DEPTH,
+        help=f"Maximum items waiting between pipeline stages (default: {DEFAULT_QUEUE_DEPTH})."
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="Keep running and ingest (or, with --move-only, move) files as they land, using inotify."
+    )
+    parser.add_argument(
+        "--debounce",
+        type=float,
+        default=DEFAULT_DEBOUNCE,
+        help=f"Seconds a file must be quiet before --watch picks it up (default: {DEFAULT_DEBOUNCE})."
+    )
+    parser.add_argument(
+        "--no-count",
+        action="store_true",
+        help="Do not count files in the background for progress output."
+    )
+    parser.add_argument(
+        "--scan-journal",
+        default=str(DEFAULT_JOURNAL_PATH),
+        help=f"SQLite file recording directory mtimes and file fingerprints from earlier scans, so rescans "
+             f"only list changed directories (default: {DEFAULT_JOURNAL_PATH})."
+    )
+    parser.add_argument(
+        "--no-scan-journal",
+        action="store_true",
+        help="Walk every directory and do not record the scan."
+    )
+    parser.add_argument(
+        "--full-rescan",
+        action="store_true",
+        help="Walk every directory and re-offer every file, then refresh the scan journal."
+    )
+    parser.add_argument(
+        "--metadata-cache",
+        default=str(DEFAULT_CACHE_PATH),
+        help=f"SQLite file caching exiftool output per file (default: {DEFAULT_CACHE_PATH})."
+    )
+    parser.add_argument(
+        "--no-metadata-cache",
+        action="store_true",
+        help="Always run exiftool instead of reusing cached metadata."
+    )
 
     args = parser.parse_args()
 
@@ -227,19 +547,75 @@ def main():
     if debug:
         logger.setLevel(logging.DEBUG)
 
+    configure_pool(args.exiftool_workers)
+    if not args.no_metadata_cache:
+        configure_cache(args.metadata_cache)
+    if not args.no_scan_journal:
+        configure_journal(args.scan_journal)
+
     config_file = os.path.expanduser("~/.my.cnf")
     config_section = "media"
-    db_conn = None if args.dry_run else connect_to_database(config_file, config_section)
+    pool = None if args.dry_run else ConnectionManager(args.backend, config_file, config_section,
+                                                        size=args.db_pool_size)
+    try:
+        db_conn = pool.connection() if pool is not None else None
+    except Exception as e:
+        app_failed("media_manager", f"Cannot open the database: {e}")
+        sys.exit(1)
+    if db_conn is not None:
+        try:
+            if is_sqlite(db_conn):
+                create_tables(db_conn, logger)
+            else:
+                run_migrations(db_conn, logger)
+        except Exception as e:
+            app_failed("media_manager", f"Schema migration failed: {e}")
+            sys.exit(1)
+    processed = ProcessedIndex.load(db_conn, logger) if not args.only_takeout else None
+    content_index = None
+    if not (args.only_takeout or args.no_dedupe):
+        content_index = ContentIndex.load(db_conn, logger)
+
+    if args.find_similar or args.near_duplicates:
+        if db_conn is None:
+            app_failed("media_manager", "--find-similar and --near-duplicates need a database and cannot be combined with --dry-run")
+            sys.exit(1)
+        if not perceptual_hash_available():
+            app_failed("media_manager", "Pillow is required for perceptual hashing")
+            sys.exit(1)
+        if args.find_similar:
+            tree = load_hash_tree(db_conn, logger)
+            matches = find_similar(tree, args.find_similar, args.max_distance)
+            paths = photo_paths(db_conn, [photo_id for _, photo_id in matches])
+            for distance, photo_id in matches:
+                print(f"{distance}\t{paths.get(photo_id, '?')}")
+        else:
+            near_duplicate_report(db_conn, logger, args.max_distance)
+        return
 
     # MOVE-ONLY mode
     if args.move_only:
         print("\n🔄 Move-only mode activated.")
         from utils.file_mover import pick_sources_interactively, process_sources
+        sidecar_min_bytes = args.xmp_sidecar_min_mb * 1024 ** 2 if args.xmp_sidecar_min_mb is not None else None
         sources = args.sources or pick_sources_interactively()
         if not sources:
             print("No sources selected. Exiting.")
             sys.exit(0)
 
+        if args.watch:
+            from utils.file_mover import move_files
+
+            def move_batch(paths):
+                move_files([p for p in paths if p not in processed], mode=args.target,
+                           dry_run=args.dry_run, verbose=verbose, processed=processed, use_rsync=args.rsync,
+                           per_device=args.copies_per_device, date_write_batch=args.date_write_batch,
+                           sidecar_min_bytes=sidecar_min_bytes, db_conn=db_conn, content_index=content_index)
+                processed.flush(db_conn, logger)
+
+            watch_sources(logger, sources, move_batch, skip_hidden=True, debounce=args.debounce)
+            sys.exit(0)
+
         process_sources(
             sources=sources,
             mode=args.target,
@@ -247,42 +623,101 @@ def main():
             verbose=verbose,
             debug=debug,
             db_conn=db_conn,
-            remove=args.remove
+            remove=args.remove,
+            processed=processed,
+            full_rescan=args.full_rescan,
+            use_rsync=args.rsync,
+            per_device=args.copies_per_device,
+            date_write_batch=args.date_write_batch,
+            sidecar_min_bytes=sidecar_min_bytes,
+            content_index=content_index
         )
+        if get_cache() is not None:
+            logger.info(f"Metadata cache: {get_cache().stats()}")
         sys.exit(0)
 
     if args.only_takeout:
         logger.info("Skipping local media processing as --only-takeout was specified.")
-        process_google_takeout(db_conn, batch_size=args.takeout_batch_size)
-        db_conn.close()
+        db_conn = pool.connection()  # health-checked again before the phase
+        process_google_takeout(db_conn, batch_size=args.takeout_batch_size, root_dir=args.takeout_dir,
+                               workers=args.takeout_workers)
+        pool.close_all()
         logger.info("\n--- Takeout-only mode finished. ---")
         return
 
     # Full media ingest mode
-    try:
-        if args.all or args.videos:
-            handle_media(logger, "Videos",
-                         ["/multimedia/Videos", "/multimedia/Home_Videos", "/multimedia/TikTok"],
-                         VIDEO_EXTS,
-                         dry_run=args.dry_run,
-                         debug=debug,
-                         verbose=verbose,
-                         config_file=config_file,
-                         config_section=config_section)
-
-        if args.all or args.photos:
-            handle_media(logger, "Photos",
-                         ["/multimedia/Photos"],
-                         IMAGE_EXTS,
-                         dry_run=args.dry_run,
+    jobs = []
+    if args.all or args.videos:
+        jobs.append(("Videos", ["/multimedia/Videos", "/multimedia/Home_Videos", "/multimedia/TikTok"], VIDEO_EXTS))
+    if args.all or args.photos:
+        jobs.append(("Photos", ["/multimedia/Photos"], IMAGE_EXTS))
+
+    media_options = dict(dry_run=args.dry_run,
                          debug=debug,
                          verbose=verbose,
-                         config_file=config_file,
-                         config_section=config_section)
+                         pool=pool,
+                         processed=processed,
+                         batch_limit=args.batch_size,
+                         bulk_load=args.bulk_load,
+                         workers=args.workers,
+                         queue_depth=args.queue_depth,
+                         count_total=not args.no_count,
+                         full_rescan=args.full_rescan,
+                         content_index=content_index,
+                         phash_workers=args.phash_workers if args.phash else None)
+    if args.requeue:
+        if pool is None:
+            app_failed("media_manager", "--requeue needs a database and cannot be combined with --dry-run")
+            sys.exit(1)
+        for media_type, source_dirs, _ in jobs:
+            reset = requeue(db_conn, media_type, work_units(source_dirs, args.shards))
+            logger.info(f"[{media_type}] Requeued {reset} work units for a new pass")
+        pool.close_all()
+        return
+
+    run_job = handle_media
+    if args.distributed:
+        if pool is None:
+            app_failed("media_manager", "--distributed needs a database and cannot be combined with --dry-run")
+            sys.exit(1)
+        run_job = distributed_media
+        media_options.update(shards=args.shards, lease_seconds=args.lease_seconds)
+
+    if args.watch:
+        watch_media(logger, jobs, db_conn, processed, dry_run=args.dry_run, verbose=verbose,
+                    batch_limit=args.batch_size, debounce=args.debounce, content_index=content_index)
+        return
+
+    threaded = args.workers > 1 and len(jobs) > 1
+    # main() keeps holding one connection; threaded media types and lease heartbeats each need their own.
+    needed = 1 + (len(jobs) if threaded else 0) + ((len(jobs) if threaded else 1) if args.distributed else 0)
+    if pool is not None and pool.size < needed:
+        logger.warning(f"--db-pool-size {pool.size} is too small for this run; using {needed}")
+        pool.size = needed
+
+    try:
+        if threaded:
+            # Each media type gets its own pooled connection and pipeline.
+            with ThreadPoolExecutor(max_workers=len(jobs)) as executor:
+                futures = [executor.submit(run_job, logger, media_type, source_dirs, exts, **media_options)
+                           for media_type, source_dirs, exts in jobs]
+                for future in futures:
+                    future.result()
+        else:
+            for media_type, source_dirs, exts in jobs:
+                run_job(logger, media_type, source_dirs, exts, **media_options)
+
+        if args.places and pool is not None:
+            db_conn = pool.connection()  # ingest may have left it idle long enough to be dropped
+            process_places(db_conn, gazetteer_path=args.gazetteer, use_nominatim=not args.no_nominatim,
+                           max_km=args.max_place_km, precision=args.geohash_precision)
 
     except Exception as e:
         app_failed("media_manager", f"Fatal error: {e}")
         sys.exit(1)
+    finally:
+        if pool is not None:
+            pool.close_all()
 
 if __name__ == "__main__":
     main()
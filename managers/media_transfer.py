@@ -1,35 +1,48 @@
 import os
-import shutil
 import logging
 from pathlib import Path
 
-def transfer_files(sources, target, dry_run=False, remove_sources=False):
-    target = Path(target).expanduser()
-    os.makedirs(target, exist_ok=True)
+from utils.file_transfer import ensure_dir, transfer_file_multi
+from utils.scanner import scan_files
+from utils.transfer_scheduler import TransferScheduler, DEFAULT_PER_DEVICE
 
-    for source in sources:
-        source_path = Path(source).expanduser()
-        if not source_path.exists():
-            logging.warning(f"Source path {source_path} does not exist.")
-            continue
+def transfer_files(sources, target, dry_run=False, remove_sources=False, per_device=DEFAULT_PER_DEVICE):
+    # `target` may be a list of directories; each file is then read once and written to all of them.
+    targets = [Path(t).expanduser() for t in (target if isinstance(target, (list, tuple)) else [target])]
+    for t in targets:
+        ensure_dir(t)
 
-        for root, _, files in os.walk(source_path):
-            for name in files:
-                src = Path(root) / name
-                dst = target / name
+    def finished(src):
+        def callback(future):
+            if isinstance(future.exception(), FileExistsError):
+                logging.warning(f"Not transferring {src}: {future.exception().filename} already exists")
+            elif future.exception() is not None:
+                logging.error(f"Failed to transfer {src}: {future.exception()}")
+            elif remove_sources:
+                logging.info(f"Removed source file: {src}")
+        return callback
+
+    with TransferScheduler(per_device=per_device) as scheduler:
+        for source in sources:
+            source_path = Path(source).expanduser()
+            if not source_path.exists():
+                logging.warning(f"Source path {source_path} does not exist.")
+                continue
+
+            for entry in scan_files(source_path):
+                src = Path(entry.path)
+                dsts = [t / entry.name for t in targets]
 
                 prefix = "DRY_RUN: " if dry_run else ""
-                logging.info(f"{prefix}Transfer {src} -> {dst}")
+                logging.info(f"{prefix}Transfer {src} -> {', '.join(str(d) for d in dsts)}")
 
                 if not dry_run:
-                    shutil.copy2(src, dst)
-                    if remove_sources:
-                        try:
-                            os.remove(src)
-                            logging.info(f"Removed source file: {src}")
-                        except Exception as e:
-                            logging.error(f"Failed to remove source file {src}: {e}")
+                    try:
+                        size = entry.stat().st_size
+                    except OSError:
+                        size = 0
+                    future = scheduler.submit(transfer_file_multi, src, dsts, remove=remove_sources,
+                                              size=size, targets=targets)
+                    future.add_done_callback(finished(src))
                 elif remove_sources:
                     logging.info(f"DRY_RUN: Would remove {src}")
-
-
@@ -0,0 +1,192 @@
+# managers/migrations.py
+
+from datetime import datetime
+
+BACKFILL_CHUNK_SIZE = 10000
+LOCK_NAME = "media_organizer_migrations"
+LOCK_TIMEOUT = 60
+
+CREATE_TABLE = """
+    CREATE TABLE IF NOT EXISTS SchemaMigrations (
+        version INT PRIMARY KEY,
+        name VARCHAR(255) NOT NULL,
+        applied_at DATETIME NOT NULL
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+"""
+
+
+def _table_exists(cursor, table):
+    cursor.execute("SELECT 1 FROM information_schema.tables WHERE table_schema = DATABASE() AND table_name = %s",
+                   (table,))
+    return cursor.fetchone() is not None
+
+
+def _column_exists(cursor, table, column):
+    cursor.execute("SELECT 1 FROM information_schema.columns "
+                   "WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s", (table, column))
+    return cursor.fetchone() is not None
+
+
+def _index_exists(cursor, table, index):
+    cursor.execute("SELECT 1 FROM information_schema.statistics "
+                   "WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s", (table, index))
+    return cursor.fetchone() is not None
+
+
+def _add_index(db_conn, logger, table, index, definition):
+    # MySQL DDL commits implicitly, so every step checks first and a rerun after a crash picks up where it stopped.
+    with db_conn.cursor() as cursor:
+        if not _table_exists(cursor, table) or _index_exists(cursor, table, index):
+            return
+        logger.info(f"Adding index {index} on {table}")
+        cursor.execute(f"ALTER TABLE {table} ADD {definition}, ALGORITHM=INPLACE, LOCK=NONE")
+
+
+def backfill(db_conn, logger, table, assignment, where, chunk_size=BACKFILL_CHUNK_SIZE):
+    """
+    Run `UPDATE table SET assignment WHERE where` in primary-key ranges of
+    `chunk_size` rows, committing after each, so the table stays writable and
+    no single transaction holds locks on all of it.
+    """
+    with db_conn.cursor() as cursor:
+        cursor.execute(f"SELECT MIN(id), MAX(id) FROM {table}")
+        low, high = cursor.fetchone()
+    if low is None:
+        return 0
+    updated = 0
+    for start in range(low, high + 1, chunk_size):
+        with db_conn.cursor() as cursor:
+            cursor.execute(f"UPDATE {table} SET {assignment} WHERE id BETWEEN %s AND %s AND ({where})",
+                           (start, start + chunk_size - 1))
+            updated += cursor.rowcount
+        db_conn.commit()
+        if (start - low) // chunk_size % 50 == 49:
+            logger.info(f"Backfilled {table} up to id {start + chunk_size - 1} of {high}")
+    logger.info(f"Backfilled {updated} rows of {table}")
+    return updated
+
+
+def add_media_processing_path_hash(db_conn, logger):
+    """
+    MediaProcessing.path_hash = UNHEX(MD5(file_path)) with a unique index.
+    The old unique key only covers the first 767 characters of file_path; the
+    hash covers all of it in 16 bytes.
+    """
+    with db_conn.cursor() as cursor:
+        if not _table_exists(cursor, "MediaProcessing"):
+            cursor.execute("""
+                CREATE TABLE MediaProcessing (
+                    id INT AUTO_INCREMENT PRIMARY KEY,
+                    file_path VARCHAR(2048),
+                    path_hash BINARY(16),
+                    processed TINYINT(1) DEFAULT 0,
+                    processed_at DATETIME,
+                    UNIQUE KEY idx_media_processing_path_hash (path_hash)
+                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+            """)
+            return
+        if not _column_exists(cursor, "MediaProcessing", "path_hash"):
+            logger.info("Adding MediaProcessing.path_hash")
+            cursor.execute("ALTER TABLE MediaProcessing ADD COLUMN path_hash BINARY(16) NULL AFTER file_path")
+    backfill(db_conn, logger, "MediaProcessing", "path_hash = UNHEX(MD5(file_path))",
+             "path_hash IS NULL AND file_path IS NOT NULL")
+    _add_index(db_conn, logger, "MediaProcessing", "idx_media_processing_path_hash",
+               "UNIQUE INDEX idx_media_processing_path_hash (path_hash)")
+
+
+def drop_media_processing_path_prefix_key(db_conn, logger):
+    """
+    Drop the unique key on the first 767 characters of file_path. Two long
+    paths sharing that prefix collided on it, and ON DUPLICATE KEY UPDATE then
+    rewrote the first path's row, so the second was reprocessed every run. The
+    unique path_hash covers the whole path; rows written by older versions
+    since migration 1 are backfilled before the key goes.
+    """
+    backfill(db_conn, logger, "MediaProcessing", "path_hash = UNHEX(MD5(file_path))",
+             "path_hash IS NULL AND file_path IS NOT NULL")
+    with db_conn.cursor() as cursor:
+        if not _index_exists(cursor, "MediaProcessing", "idx_unique_file_path"):
+            return
+        logger.info("Dropping index idx_unique_file_path on MediaProcessing")
+        cursor.execute("ALTER TABLE MediaProcessing DROP INDEX idx_unique_file_path, ALGORITHM=INPLACE, LOCK=NONE")
+
+
+def add_media_lookup_indexes(db_conn, logger):
+    """
+    Photos/Videos lookups by file_name (existing-record resolution, the
+    bulk-load merge, Takeout matching by name and date) and by
+    (file_location, file_name) become index lookups instead of table scans.
+    """
+    for table, prefix in (("Photos", "photos"), ("Videos", "videos")):
+        _add_index(db_conn, logger, table, f"idx_{prefix}_name_date",
+                   f"INDEX idx_{prefix}_name_date (file_name, date_taken)")
+        # utf8mb4 index keys are capped at 3072 bytes, so the long location column is indexed by prefix.
+        _add_index(db_conn, logger, table, f"idx_{prefix}_location_name",
+                   f"INDEX idx_{prefix}_location_name (file_location(255), file_name)")
+
+
+def add_geocoding_cells_retry_after(db_conn, logger):
+    """
+    GeocodingCells.retry_after: cells Nominatim had no place for are cached
+    with a NULL osm_id and are not queried again before this time.
+    """
+    with db_conn.cursor() as cursor:
+        if not _table_exists(cursor, "GeocodingCells") or _column_exists(cursor, "GeocodingCells", "retry_after"):
+            return
+        logger.info("Adding GeocodingCells.retry_after")
+        cursor.execute("ALTER TABLE GeocodingCells ADD COLUMN retry_after DATETIME NULL")
+
+
+# Append only: a version, once released, is never renumbered or edited.
+MIGRATIONS = [
+    (1, "media_processing_path_hash", add_media_processing_path_hash),
+    (2, "media_lookup_indexes", add_media_lookup_indexes),
+    (3, "drop_media_processing_path_prefix_key", drop_media_processing_path_prefix_key),
+    (4, "geocoding_cells_retry_after", add_geocoding_cells_retry_after),
+]
+
+
+def applied_versions(db_conn):
+    with db_conn.cursor() as cursor:
+        cursor.execute("SELECT version FROM SchemaMigrations")
+        return {row[0] for row in cursor.fetchall()}
+
+
+def run_migrations(db_conn, logger, migrations=MIGRATIONS):
+    """
+    Apply the migrations not yet recorded in SchemaMigrations, in version
+    order. A named lock keeps two runs from migrating at the same time.
+    Returns the versions applied; a failing migration raises and is retried
+    on the next run.
+    """
+    with db_conn.cursor() as cursor:
+        cursor.execute(CREATE_TABLE)
+        cursor.execute("SELECT GET_LOCK(%s, %s)", (LOCK_NAME, LOCK_TIMEOUT))
+        if not cursor.fetchone()[0]:
+            raise RuntimeError("Timed out waiting for another run to finish migrating the schema")
+    db_conn.commit()
+    applied = []
+    try:
+        done = applied_versions(db_conn)
+        for version, name, migrate in sorted(migrations, key=lambda m: m[0]):
+            if version in done:
+                continue
+            logger.info(f"Applying schema migration {version}: {name}")
+            migrate(db_conn, logger)
+            with db_conn.cursor() as cursor:
+                cursor.execute("INSERT INTO SchemaMigrations (version, name, applied_at) VALUES (%s, %s, %s)",
+                               (version, name, datetime.now()))
+            db_conn.commit()
+            applied.append(version)
+    except Exception:
+        db_conn.rollback()
+        raise
+    finally:
+        with db_conn.cursor() as cursor:
+            cursor.execute("SELECT RELEASE_LOCK(%s)", (LOCK_NAME,))
+            cursor.fetchone()
+    if applied:
+        logger.info(f"Applied schema migrations: {', '.join(map(str, applied))}")
+    else:
+        logger.debug("Schema is up to date")
+    return applied
@@ -0,0 +1,139 @@
+# managers/schema.py
+
+# The legacy create_tables_if_not_exists layout, with the columns and indexes
+# later added by managers/migrations.py folded in. Written in MySQL syntax; the
+# SQLite backend translates it when it creates a new database.
+TABLES = [
+    """
+    CREATE TABLE IF NOT EXISTS faces (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        name VARCHAR(255) UNIQUE
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS MediaProcessing (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        file_path VARCHAR(2048),
+        path_hash BINARY(16),
+        processed TINYINT(1) DEFAULT 0,
+        processed_at DATETIME,
+        UNIQUE KEY idx_media_processing_path_hash (path_hash)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS People (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        person_name VARCHAR(255) UNIQUE
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS Photos (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        file_name VARCHAR(255),
+        file_location VARCHAR(2048),
+        resolution VARCHAR(50),
+        size BIGINT,
+        latitude DOUBLE,
+        longitude DOUBLE,
+        altitude DOUBLE,
+        date_taken DATETIME,
+        camera_make VARCHAR(255),
+        camera_model VARCHAR(255),
+        shutter_speed VARCHAR(50),
+        aperture VARCHAR(50),
+        iso VARCHAR(50),
+        flash TINYINT(1),
+        light_meter VARCHAR(50),
+        lens_id VARCHAR(255),
+        lens_spec VARCHAR(255),
+        circle_of_confusion VARCHAR(50),
+        KEY idx_photos_name_date (file_name, date_taken),
+        KEY idx_photos_location_name (file_location(255), file_name)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS photo_faces (
+        photo_id INT,
+        face_id INT,
+        PRIMARY KEY (photo_id, face_id),
+        FOREIGN KEY (photo_id) REFERENCES Photos(id) ON DELETE CASCADE,
+        FOREIGN KEY (face_id) REFERENCES faces(id) ON DELETE CASCADE
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS Places (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        osm_id BIGINT UNIQUE,
+        osm_type VARCHAR(50),
+        display_name TEXT,
+        city VARCHAR(255),
+        state VARCHAR(255),
+        country VARCHAR(255),
+        latitude DOUBLE,
+        longitude DOUBLE
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS photo_places (
+        photo_id INT,
+        place_id INT,
+        PRIMARY KEY (photo_id, place_id),
+        FOREIGN KEY (photo_id) REFERENCES Photos(id) ON DELETE CASCADE,
+        FOREIGN KEY (place_id) REFERENCES Places(id) ON DELETE CASCADE
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS Videos (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        file_name VARCHAR(255),
+        file_location VARCHAR(2048),
+        resolution VARCHAR(50),
+        size BIGINT,
+        latitude DOUBLE,
+        longitude DOUBLE,
+        date_taken DATETIME,
+        camera_make VARCHAR(255),
+        camera_model VARCHAR(255),
+        duration DOUBLE,
+        frame_rate DOUBLE,
+        light_meter VARCHAR(50),
+        lens_id VARCHAR(255),
+        lens_spec VARCHAR(255),
+        circle_of_confusion VARCHAR(50),
+        altitude DOUBLE,
+        shutter_speed VARCHAR(50),
+        aperture VARCHAR(50),
+        iso VARCHAR(50),
+        flash TINYINT(1),
+        KEY idx_videos_name_date (file_name, date_taken),
+        KEY idx_videos_location_name (file_location(255), file_name)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS video_faces (
+        video_id INT,
+        face_id INT,
+        frame_number INT DEFAULT 0,
+        PRIMARY KEY (video_id, face_id, frame_number),
+        FOREIGN KEY (video_id) REFERENCES Videos(id) ON DELETE CASCADE,
+        FOREIGN KEY (face_id) REFERENCES faces(id) ON DELETE CASCADE
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS video_places (
+        video_id INT,
+        place_id INT,
+        PRIMARY KEY (video_id, place_id),
+        FOREIGN KEY (video_id) REFERENCES Videos(id) ON DELETE CASCADE,
+        FOREIGN KEY (place_id) REFERENCES Places(id) ON DELETE CASCADE
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+    """,
+]
+
+
+def create_tables(db_conn, logger):
+    with db_conn.cursor() as cursor:
+        for query in TABLES:
+            cursor.execute(query)
+    db_conn.commit()
+    logger.info("Database tables checked/created.")
@@ -0,0 +1,145 @@
+# managers/watcher.py
+
+import os
+import select
+import time
+
+from utils.inotify import (
+    IN_CLOSE_WRITE,
+    IN_CREATE,
+    IN_ISDIR,
+    IN_MOVED_TO,
+    IN_Q_OVERFLOW,
+    Inotify
+)
+from utils.scanner import scan_files
+
+DEFAULT_DEBOUNCE = 2.0
+DEFAULT_WATCH_BATCH_SIZE = 200
+
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+
+
+def _wanted(name, extensions, skip_hidden):
+    if skip_hidden and name.startswith("."):
+        return False
+    return extensions is None or os.path.splitext(name)[1].lower() in extensions
+
+
+def watch_sources(logger, roots, handle_batch, extensions=None, skip_hidden=False,
+                  debounce=DEFAULT_DEBOUNCE, batch_size=DEFAULT_WATCH_BATCH_SIZE, stop=None):
+    """
+    Watch `roots` recursively with inotify and pass finished files to
+    `handle_batch(paths)` in micro-batches.
+
+    Only completed files are picked up (IN_CLOSE_WRITE, or IN_MOVED_TO for
+    files renamed into place). A path is handed over once no new event has
+    arrived for it for `debounce` seconds, so files written in several passes
+    are handled once. Directories created later are watched too, and any files
+    already in them are queued, since they may have landed before the watch.
+    If the kernel queue overflows, the roots are rescanned. A file found by a
+    scan rather than a close event may still be being written, so it is only
+    handed over once its size and mtime have stayed the same for `debounce`
+    seconds, or when its close event arrives.
+
+    Runs until `stop` (a threading.Event) is set or KeyboardInterrupt.
+    """
+    inotify = Inotify()
+    pending = {}  # path -> time of its last event
+    unsettled = {}  # scanned path -> (size, mtime_ns) when last looked at
+
+    def watch_tree(root, queue_existing):
+        for directory in _directories(root, skip_hidden):
+            if inotify.watched(directory):
+                continue
+            try:
+                inotify.add_watch(directory, WATCH_MASK)
+            except OSError as e:
+                logger.warning(f"Cannot watch {directory}: {e}")
+                continue
+            logger.debug(f"Watching: {directory}")
+        if queue_existing:
+            for entry in scan_files(root, extensions, skip_hidden_dirs=skip_hidden):
+                if _wanted(entry.name, extensions, skip_hidden) and entry.path not in pending:
+                    signature = _signature(entry.path)
+                    if signature is not None:
+                        unsettled[entry.path] = signature
+                        pending[entry.path] = time.monotonic()
+
+    for root in roots:
+        watch_tree(root, queue_existing=False)
+    logger.info(f"Watching {len(roots)} source(s) for new media (debounce {debounce}s, batch {batch_size})")
+
+    try:
+        while stop is None or not stop.is_set():
+            readable, _, _ = select.select([inotify], [], [], min(debounce, 1.0))
+            now = time.monotonic()
+            if readable:
+                for directory, name, mask in inotify.read_events():
+                    if mask & IN_Q_OVERFLOW:
+                        logger.warning("inotify queue overflowed; rescanning watched sources")
+                        for root in roots:
+                            watch_tree(root, queue_existing=True)
+                        continue
+                    if directory is None:
+                        continue
+                    path = os.path.join(directory, name)
+                    if mask & IN_ISDIR:
+                        if mask & (IN_CREATE | IN_MOVED_TO) and not (skip_hidden and name.startswith(".")):
+                            watch_tree(path, queue_existing=True)
+                        continue
+                    if mask & (IN_CLOSE_WRITE | IN_MOVED_TO) and _wanted(name, extensions, skip_hidden):
+                        unsettled.pop(path, None)
+                        pending[path] = now
+
+            ready = []
+            for path in [path for path, seen in pending.items() if now - seen >= debounce]:
+                if path in unsettled:
+                    signature = _signature(path)
+                    if signature is not None and signature != unsettled[path]:
+                        # Still growing: look again after another quiet interval.
+                        unsettled[path] = signature
+                        pending[path] = now
+                        continue
+                    del unsettled[path]
+                del pending[path]
+                ready.append(path)
+            ready = [path for path in ready if os.path.isfile(path)]
+            for i in range(0, len(ready), batch_size):
+                batch = ready[i:i + batch_size]
+                logger.info(f"Handling {len(batch)} new file(s)")
+                try:
+                    handle_batch(batch)
+                except Exception as e:
+                    logger.error(f"Failed to handle batch of {len(batch)} file(s): {e}")
+    except KeyboardInterrupt:
+        logger.info("Watch mode stopped.")
+    finally:
+        inotify.close()
+
+
+def _signature(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_size, st.st_mtime_ns
+
+
+def _directories(root, skip_hidden):
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        yield directory
+        try:
+            with os.scandir(directory) as it:
+                for entry in it:
+                    if skip_hidden and entry.name.startswith("."):
+                        continue
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                    except OSError:
+                        continue
+        except OSError:
+            continue
@@ -0,0 +1,282 @@
+# managers/work_queue.py
+
+import logging
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+
+from utils.db_backend import is_sqlite
+from utils.processed_index import path_hash
+from utils.scanner import scan_files
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LEASE_SECONDS = 120
+MAX_ATTEMPTS = 5
+IDLE_POLL_SECONDS = 5.0
+
+# Work units of a distributed ingest. MediaProcessing records which files are
+# done; this table records which units of the scan are pending, leased to a
+# worker, done or failed. Lease times come from the workers' clocks, so hosts
+# sharing a queue should be NTP-synced to well within the lease length.
+TABLE = """
+    CREATE TABLE IF NOT EXISTS MediaProcessingQueue (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        media_type VARCHAR(16) NOT NULL,
+        work_key VARCHAR(2048) NOT NULL,    -- 'tree:<dir>', 'top:<dir>' or 'shard:<k>/<n>'
+        key_hash BINARY(16) NOT NULL,
+        status VARCHAR(16) NOT NULL DEFAULT 'pending',  -- pending, leased, done or failed
+        owner VARCHAR(255),
+        lease_expires DATETIME,
+        attempts INT NOT NULL DEFAULT 0,
+        files INT,
+        updated_at DATETIME,
+        UNIQUE KEY idx_queue_key (media_type, key_hash),
+        KEY idx_queue_claim (media_type, status, lease_expires)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+"""
+
+CLAIMABLE = "media_type = %s AND attempts < %s AND (status = 'pending' OR (status = 'leased' AND lease_expires < %s))"
+
+
+def worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def ensure_table(db_conn):
+    with db_conn.cursor() as cursor:
+        cursor.execute(TABLE)
+    db_conn.commit()
+
+
+def work_units(source_dirs, shards=0):
+    """
+    The work keys for `source_dirs`: `shards` shards if set, each holding
+    the top-level entries (subdirectory trees and files) whose path hash
+    falls in it; otherwise one unit per top-level subdirectory plus one for
+    the files directly in each source directory.
+    """
+    if shards:
+        return [f"shard:{k}/{shards}" for k in range(shards)]
+    keys = []
+    for root in source_dirs:
+        if not os.path.isdir(root):
+            continue
+        keys.append(f"top:{root}")
+        with os.scandir(root) as it:
+            keys.extend(f"tree:{entry.path}" for entry in sorted(it, key=lambda e: e.name)
+                        if entry.is_dir(follow_symlinks=False))
+    return keys
+
+
+def unit_files(work_key, source_dirs, extensions):
+    """The DirEntry of every file in one work unit."""
+    kind, _, arg = work_key.partition(":")
+    exts = frozenset(extensions)
+    if kind == "tree":
+        yield from scan_files(arg, exts, logger=logger)
+    elif kind == "top":
+        with os.scandir(arg) as it:
+            for entry in it:
+                if entry.is_file() and os.path.splitext(entry.name)[1].lower() in exts:
+                    yield entry
+    elif kind == "shard":
+        # Only the subtrees hashed to this shard are walked.
+        k, n = map(int, arg.split("/"))
+        for root in source_dirs:
+            if not os.path.isdir(root):
+                continue
+            with os.scandir(root) as it:
+                entries = sorted(it, key=lambda e: e.name)
+            for entry in entries:
+                if int.from_bytes(path_hash(entry.path)[:8], "big") % n != k:
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    yield from scan_files(entry.path, exts, logger=logger)
+                elif entry.is_file() and os.path.splitext(entry.name)[1].lower() in exts:
+                    yield entry
+    else:
+        raise ValueError(f"Unknown work key {work_key!r}")
+
+
+def enqueue(db_conn, media_type, keys):
+    """
+    Add work units; ones already queued are left as they are, so every
+    worker can enqueue the same units on startup.
+    """
+    now = datetime.now()
+    with db_conn.cursor() as cursor:
+        cursor.executemany("INSERT IGNORE INTO MediaProcessingQueue (media_type, work_key, key_hash, updated_at) "
+                           "VALUES (%s, %s, %s, %s)",
+                           [(media_type, key, path_hash(key), now) for key in keys])
+    db_conn.commit()
+
+
+def requeue(db_conn, media_type, keys):
+    """
+    Start a new pass over `media_type`: reset its finished and failed units
+    to pending and add any new ones. Run once per pass, before the workers
+    start, rather than by each worker. Returns the number of units reset.
+    """
+    ensure_table(db_conn)
+    with db_conn.cursor() as cursor:
+        cursor.execute("UPDATE MediaProcessingQueue SET status = 'pending', attempts = 0, owner = NULL, "
+                       "lease_expires = NULL, updated_at = %s WHERE media_type = %s AND status IN ('done', 'failed')",
+                       (datetime.now(), media_type))
+        reset = cursor.rowcount
+    db_conn.commit()
+    enqueue(db_conn, media_type, keys)
+    return reset
+
+
+def claim(db_conn, media_type, owner, lease_seconds=DEFAULT_LEASE_SECONDS, max_attempts=MAX_ATTEMPTS):
+    """
+    Lease one pending unit, or one whose lease expired because its worker
+    died. Returns (id, work_key) or None. Concurrent claimers skip rows
+    another transaction has locked instead of waiting on them; SQLite has no
+    row locks, so there the whole claim runs under its write lock. Expired
+    leases of units that have used up their attempts are marked failed.
+    """
+    now = datetime.now()
+    db_conn.commit()
+    try:
+        with db_conn.cursor() as cursor:
+            if is_sqlite(db_conn):
+                cursor.execute("BEGIN IMMEDIATE")
+            cursor.execute("UPDATE MediaProcessingQueue SET status = 'failed', owner = NULL, lease_expires = NULL, "
+                           "updated_at = %s WHERE media_type = %s AND status = 'leased' AND lease_expires < %s "
+                           "AND attempts >= %s", (now, media_type, now, max_attempts))
+            if cursor.rowcount > 0:
+                logger.warning(f"[{media_type}] {cursor.rowcount} work items failed on their last attempt")
+            cursor.execute(f"SELECT id, work_key FROM MediaProcessingQueue WHERE {CLAIMABLE} "
+                           "ORDER BY id LIMIT 1 FOR UPDATE SKIP LOCKED", (media_type, max_attempts, now))
+            row = cursor.fetchone()
+            if row is not None:
+                cursor.execute("UPDATE MediaProcessingQueue SET status = 'leased', owner = %s, lease_expires = %s, "
+                               "attempts = attempts + 1, updated_at = %s WHERE id = %s",
+                               (owner, now + timedelta(seconds=lease_seconds), now, row[0]))
+        db_conn.commit()
+    except Exception:
+        db_conn.rollback()
+        raise
+    return tuple(row) if row is not None else None
+
+
+def renew(db_conn, item_id, owner, lease_seconds=DEFAULT_LEASE_SECONDS):
+    """Extend a lease; False if it expired and another worker took the unit over."""
+    now = datetime.now()
+    with db_conn.cursor() as cursor:
+        cursor.execute("UPDATE MediaProcessingQueue SET lease_expires = %s, updated_at = %s "
+                       "WHERE id = %s AND owner = %s AND status = 'leased'",
+                       (now + timedelta(seconds=lease_seconds), now, item_id, owner))
+        held = cursor.rowcount > 0
+    db_conn.commit()
+    return held
+
+
+def finish(db_conn, item_id, owner, files=None, failed=False, max_attempts=MAX_ATTEMPTS):
+    """
+    Mark a leased unit done, or on failure hand it back for another worker
+    (failed for good once it has used up its attempts). False if the lease
+    had already passed to someone else.
+    """
+    status = f"CASE WHEN attempts >= {int(max_attempts)} THEN 'failed' ELSE 'pending' END" if failed else "'done'"
+    with db_conn.cursor() as cursor:
+        cursor.execute(f"UPDATE MediaProcessingQueue SET status = {status}, owner = NULL, lease_expires = NULL, "
+                       "files = %s, updated_at = %s WHERE id = %s AND owner = %s AND status = 'leased'",
+                       (files, datetime.now(), item_id, owner))
+        held = cursor.rowcount > 0
+    db_conn.commit()
+    return held
+
+
+def outstanding(db_conn, media_type, max_attempts=MAX_ATTEMPTS):
+    """Units of `media_type` that are claimable or held under a live lease."""
+    with db_conn.cursor() as cursor:
+        cursor.execute("SELECT COUNT(*) FROM MediaProcessingQueue WHERE media_type = %s AND ("
+                       "(status = 'pending' AND attempts < %s) OR "
+                       "(status = 'leased' AND (lease_expires >= %s OR attempts < %s)))",
+                       (media_type, max_attempts, datetime.now(), max_attempts))
+        count = cursor.fetchone()[0]
+    db_conn.commit()
+    return count
+
+
+class Heartbeat:
+    """
+    Renews a lease from a background thread on its own pooled connection
+    while the unit is processed; `lost` is set if the lease was taken over.
+    """
+
+    def __init__(self, pool, item_id, owner, lease_seconds=DEFAULT_LEASE_SECONDS):
+        self.pool = pool
+        self.item_id = item_id
+        self.owner = owner
+        self.lease_seconds = lease_seconds
+        self.lost = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"lease-{item_id}", daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        with self.pool.session() as db_conn:
+            while not self._stop.wait(self.lease_seconds / 3):
+                try:
+                    if not renew(db_conn, self.item_id, self.owner, self.lease_seconds):
+                        logger.warning(f"Lease on work item {self.item_id} was lost")
+                        self.lost = True
+                        return
+                except Exception as e:
+                    db_conn.rollback()
+                    logger.warning(f"Lease heartbeat for work item {self.item_id} failed: {e}")
+
+
+def run_queue(pool, media_type, source_dirs, extensions, process_unit, logger, shards=0,
+              lease_seconds=DEFAULT_LEASE_SECONDS, max_attempts=MAX_ATTEMPTS, owner=None):
+    """
+    Work through the queued units of `media_type` alongside any other workers
+    on the same database. `process_unit(db_conn, files)` ingests one unit's
+    files and returns how many it handled. Returns once no unit is pending or
+    leased; while other workers still hold leases it keeps polling, so a unit
+    whose worker died is picked up when the lease expires.
+    """
+    owner = owner or worker_name()
+    done = 0
+    with pool.session() as db_conn:
+        ensure_table(db_conn)
+        enqueue(db_conn, media_type, work_units(source_dirs, shards))
+        while True:
+            item = claim(db_conn, media_type, owner, lease_seconds, max_attempts)
+            if item is None:
+                remaining = outstanding(db_conn, media_type, max_attempts)
+                if not remaining:
+                    break
+                logger.debug(f"[{media_type}] {remaining} work items held by other workers; waiting")
+                time.sleep(min(IDLE_POLL_SECONDS, lease_seconds / 3))
+                continue
+
+            item_id, work_key = item
+            logger.info(f"[{media_type}] {owner} leased {work_key}")
+            with Heartbeat(pool, item_id, owner, lease_seconds) as heartbeat:
+                try:
+                    files = process_unit(db_conn, unit_files(work_key, source_dirs, extensions))
+                except Exception as e:
+                    db_conn.rollback()
+                    logger.error(f"[{media_type}] Work item {work_key} failed: {e}")
+                    finish(db_conn, item_id, owner, failed=True, max_attempts=max_attempts)
+                    continue
+            if heartbeat.lost or not finish(db_conn, item_id, owner, files):
+                logger.warning(f"[{media_type}] {work_key} was reclaimed by another worker before it finished")
+                continue
+            done += 1
+    logger.info(f"[{media_type}] Queue drained; {owner} finished {done} work items")
+    return done
@@ -1,7 +1,6 @@
-import subprocess
 import re
 from datetime import datetime
-import json
+from utils.exiftool_batch import extract_metadata_batch
 
 EXIFTOOL_FIELDS = [
     "DateTimeOriginal", "CreateDate", "ModifyDate",
@@ -11,31 +10,27 @@ EXIFTOOL_FIELDS = [
 
 def extract_datetimes(file_path, logger):
     logger.debug(f"Executing exiftool metadata extraction on: {file_path}")
-    command = ["exiftool", "-j"] + [f"-{field}" for field in EXIFTOOL_FIELDS] + [file_path]
-    logger.debug(f"COMMAND: {' '.join(command)}")
+    for _, metadata_raw in extract_metadata_batch([file_path], logger, tags=EXIFTOOL_FIELDS):
+        return datetimes_from_metadata(metadata_raw, logger)
+    return {}
 
+def datetimes_from_metadata(metadata_raw, logger):
     date_map = {}
-    try:
-        result = subprocess.run(command, capture_output=True, text=True, check=True)
-        logger.debug(f"Raw ExifTool stdout: {result.stdout.strip()[:500]}")
-        metadata_raw = json.loads(result.stdout)[0]
-        normalized = {k.replace(" ", "").lower(): v for k, v in metadata_raw.items()}
-        logger.debug(f"Normalized metadata keys: {list(normalized.keys())}")
+    normalized = {k.replace(" ", "").lower(): v for k, v in metadata_raw.items()}
+    logger.debug(f"Normalized metadata keys: {list(normalized.keys())}")
 
-        for field in EXIFTOOL_FIELDS:
-            key = field.replace(" ", "").lower()
-            raw = normalized.get(key)
-            if raw:
-                dt = sanitize_datetime(raw)
-                if dt:
-                    logger.debug(f"Accepted datetime for '{field}': {dt}")
-                    date_map[field] = dt
-                else:
-                    logger.debug(f"Rejected datetime for '{field}': {raw}")
+    for field in EXIFTOOL_FIELDS:
+        key = field.replace(" ", "").lower()
+        raw = normalized.get(key)
+        if raw:
+            dt = sanitize_datetime(raw)
+            if dt:
+                logger.debug(f"Accepted datetime for '{field}': {dt}")
+                date_map[field] = dt
             else:
-                logger.debug(f"Field '{field}' not found in metadata.")
-    except Exception as e:
-        logger.warning(f"ExifTool failed: {e}")
+                logger.debug(f"Rejected datetime for '{field}': {raw}")
+        else:
+            logger.debug(f"Field '{field}' not found in metadata.")
     return date_map
 
 def sanitize_datetime(raw):
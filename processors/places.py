@@ -0,0 +1,337 @@
+# processors/places.py
+
+import logging
+import time
+from datetime import datetime, timedelta
+
+try:
+    import requests
+except ImportError:  # only needed for Nominatim lookups
+    requests = None
+
+from utils.geocoder import (
+    DEFAULT_GEOHASH_PRECISION,
+    DEFAULT_MAX_PLACE_KM,
+    Gazetteer,
+    available as gazetteer_available,
+    geohash
+)
+
+logger = logging.getLogger(__name__)
+
+NOMINATIM_API_URL = "https://nominatim.openstreetmap.org/reverse"
+NOMINATIM_USER_AGENT = "processmedia.py/1.0 (robcampbell08105@gmail.com)"
+NOMINATIM_DELAY_SECONDS = 1.1  # Minimum 1 second delay between requests as per Nominatim policy
+PLACE_BATCH_SIZE = 1000
+STAGE_BATCH_SIZE = 5000
+MISS_RETRY = timedelta(days=30)  # how long a cell Nominatim had no place for is left alone
+
+TABLES = [
+    """
+    CREATE TABLE IF NOT EXISTS Places (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        osm_id BIGINT UNIQUE,           -- OpenStreetMap ID; -geonameid for gazetteer places
+        osm_type VARCHAR(50),           -- e.g., 'node', 'way', 'relation', 'geonames'
+        display_name TEXT,
+        city VARCHAR(255),
+        state VARCHAR(255),
+        country VARCHAR(255),
+        latitude DOUBLE,
+        longitude DOUBLE
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS photo_places (
+        photo_id INT,
+        place_id INT,
+        PRIMARY KEY (photo_id, place_id),
+        FOREIGN KEY (photo_id) REFERENCES Photos(id) ON DELETE CASCADE,
+        FOREIGN KEY (place_id) REFERENCES Places(id) ON DELETE CASCADE
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS video_places (
+        video_id INT,
+        place_id INT,
+        PRIMARY KEY (video_id, place_id),
+        FOREIGN KEY (video_id) REFERENCES Videos(id) ON DELETE CASCADE,
+        FOREIGN KEY (place_id) REFERENCES Places(id) ON DELETE CASCADE
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS GeocodingCells (
+        geohash VARCHAR(12) CHARACTER SET ascii COLLATE ascii_bin PRIMARY KEY,  -- length is the precision
+        osm_id BIGINT,                  -- NULL: no place found; not looked up again before retry_after
+        display_name TEXT,
+        geocoded_at DATETIME,
+        retry_after DATETIME
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+    """,
+]
+
+STAGE_TABLE = """
+    CREATE TEMPORARY TABLE place_stage (
+        media_type CHAR(1) NOT NULL,    -- 'p' for Photos, 'v' for Videos
+        media_id INT NOT NULL,
+        geohash VARCHAR(12) CHARACTER SET ascii COLLATE ascii_bin NOT NULL,
+        latitude DOUBLE,
+        longitude DOUBLE,
+        KEY idx_place_stage_geohash (geohash)
+    ) ENGINE=InnoDB
+"""
+
+MEDIA_TABLES = (("p", "Photos", "photo_places", "photo_id"), ("v", "Videos", "video_places", "video_id"))
+
+_last_nominatim_request_time = 0
+
+
+def ensure_tables(conn):
+    with conn.cursor() as cursor:
+        for query in TABLES:
+            cursor.execute(query)
+    conn.commit()
+    logger.debug("Tables created/checked: Places, photo_places, video_places, GeocodingCells")
+
+
+def reverse_geocode_coordinates(lat, lon):
+    """
+    Performs reverse geocoding using the Nominatim API, rate limited to one
+    request per NOMINATIM_DELAY_SECONDS. Returns the parsed JSON, {} if
+    Nominatim has no place there, or None on error.
+    """
+    global _last_nominatim_request_time
+
+    if requests is None:
+        logger.error("The requests package is required for Nominatim lookups")
+        return None
+
+    time_since_last_request = time.time() - _last_nominatim_request_time
+    if time_since_last_request < NOMINATIM_DELAY_SECONDS:
+        time.sleep(NOMINATIM_DELAY_SECONDS - time_since_last_request)
+
+    params = {'lat': lat, 'lon': lon, 'format': 'json', 'addressdetails': 1}
+    headers = {'User-Agent': NOMINATIM_USER_AGENT}
+    try:
+        logger.debug(f"Querying Nominatim for {lat},{lon}...")
+        response = requests.get(NOMINATIM_API_URL, params=params, headers=headers, timeout=10)
+        _last_nominatim_request_time = time.time()
+        response.raise_for_status()
+        data = response.json()
+        if data and data.get('osm_id'):
+            return data
+        logger.warning(f"Nominatim returned no valid result for {lat},{lon}: {data}")
+        return {}
+    except requests.exceptions.RequestException as e:
+        logger.error(f"Error querying Nominatim for {lat},{lon}: {e}")
+        return None
+    except ValueError as e:
+        logger.error(f"Error decoding Nominatim JSON response for {lat},{lon}: {e}")
+        return None
+
+
+def _place_row(data, lat, lon):
+    address = data.get('address') or {}
+    city = address.get('city') or address.get('town') or address.get('village')
+    # Gazetteer places carry their own coordinates; Nominatim results keep the queried point, as before.
+    lat = data['lat'] if data.get('osm_type') == 'geonames' else lat
+    lon = data['lon'] if data.get('osm_type') == 'geonames' else lon
+    return (data.get('osm_id'), data.get('osm_type'), data.get('display_name'), city,
+            address.get('state'), address.get('country'), lat, lon)
+
+
+def store_places(conn, resolved):
+    """
+    Write a batch of (geohash, (lat, lon), place data) results: upsert the
+    places and record each cell in GeocodingCells, in one transaction.
+    Returns the number of cells stored.
+    """
+    if not resolved:
+        return 0
+    rows = {}
+    for _, (lat, lon), data in resolved:
+        rows.setdefault(data.get('osm_id'), _place_row(data, lat, lon))
+    now = datetime.now()
+
+    cursor = conn.cursor()
+    try:
+        cursor.executemany("""
+            INSERT INTO Places (osm_id, osm_type, display_name, city, state, country, latitude, longitude)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE
+                osm_type = VALUES(osm_type), display_name = VALUES(display_name),
+                city = VALUES(city), state = VALUES(state), country = VALUES(country)
+        """, list(rows.values()))
+        cursor.executemany("""
+            INSERT INTO GeocodingCells (geohash, osm_id, display_name, geocoded_at, retry_after)
+            VALUES (%s, %s, %s, %s, NULL)
+            ON DUPLICATE KEY UPDATE
+                osm_id = VALUES(osm_id), display_name = VALUES(display_name), geocoded_at = VALUES(geocoded_at),
+                retry_after = NULL
+        """, [(cell, data.get('osm_id'), data.get('display_name'), now) for cell, _, data in resolved])
+        conn.commit()
+        return len(resolved)
+    except Exception as e:
+        conn.rollback()
+        logger.error(f"Error storing {len(resolved)} geocoded cells: {e}", exc_info=True)
+        return 0
+    finally:
+        cursor.close()
+
+
+def store_miss(conn, cell):
+    """Cache that `cell` has no place, so it is not looked up again before MISS_RETRY has passed."""
+    now = datetime.now()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                INSERT INTO GeocodingCells (geohash, osm_id, display_name, geocoded_at, retry_after)
+                VALUES (%s, NULL, NULL, %s, %s)
+                ON DUPLICATE KEY UPDATE
+                    osm_id = NULL, display_name = NULL, geocoded_at = VALUES(geocoded_at), retry_after = VALUES(retry_after)
+            """, (cell, now, now + MISS_RETRY))
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        logger.error(f"Error caching geocoding miss for cell {cell}: {e}")
+
+
+def stage_media(conn, precision=DEFAULT_GEOHASH_PRECISION, batch_size=STAGE_BATCH_SIZE):
+    """
+    Fill the connection's temporary place_stage table with the geohash cell
+    of every photo and video that has coordinates but no place yet.
+    Returns the number of rows staged.
+    """
+    staged = 0
+    with conn.cursor() as cursor:
+        cursor.execute("DROP TEMPORARY TABLE IF EXISTS place_stage")
+        cursor.execute(STAGE_TABLE)
+        for code, table, link_table, link_column in MEDIA_TABLES:
+            # Read a page of ids at a time and stage it before the next, on the one connection the temporary table lives on.
+            last = 0
+            while True:
+                cursor.execute(f"""
+                    SELECT m.id, m.latitude, m.longitude FROM {table} m
+                    WHERE m.id > %s AND m.latitude BETWEEN -90 AND 90 AND m.longitude BETWEEN -180 AND 180
+                      AND NOT EXISTS (SELECT 1 FROM {link_table} l WHERE l.{link_column} = m.id)
+                    ORDER BY m.id LIMIT %s
+                """, (last, batch_size))
+                fetched = cursor.fetchall()
+                if not fetched:
+                    break
+                last = fetched[-1][0]
+                cursor.executemany("INSERT INTO place_stage (media_type, media_id, geohash, latitude, longitude) "
+                                   "VALUES (%s, %s, %s, %s, %s)",
+                                   [(code, media_id, geohash(lat, lon, precision), lat, lon)
+                                    for media_id, lat, lon in fetched])
+                staged += len(fetched)
+    conn.commit()
+    return staged
+
+
+def _cells_to_geocode(conn):
+    """
+    (geohash, (lat, lon)) for staged cells not in GeocodingCells, or cached
+    as having no place with a retry time that has passed, with the mean
+    position of the media in each.
+    """
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            SELECT s.geohash, AVG(s.latitude), AVG(s.longitude)
+            FROM place_stage s LEFT JOIN GeocodingCells c ON c.geohash = s.geohash
+            WHERE c.geohash IS NULL OR (c.osm_id IS NULL AND (c.retry_after IS NULL OR c.retry_after <= %s))
+            GROUP BY s.geohash
+            ORDER BY s.geohash
+        """, (datetime.now(),))
+        return [(cell, (float(lat), float(lon))) for cell, lat, lon in cursor.fetchall()]
+
+
+def link_staged_media(conn):
+    """Link every staged photo and video to the place cached for its cell: one join per media table."""
+    linked = 0
+    try:
+        with conn.cursor() as cursor:
+            for code, _, link_table, link_column in MEDIA_TABLES:
+                cursor.execute(f"""
+                    INSERT IGNORE INTO {link_table} ({link_column}, place_id)
+                    SELECT s.media_id, p.id
+                    FROM place_stage s
+                    JOIN GeocodingCells c ON c.geohash = s.geohash
+                    JOIN Places p ON p.osm_id = c.osm_id
+                    WHERE s.media_type = %s
+                """, (code,))
+                linked += cursor.rowcount
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        logger.error(f"Error linking media to places: {e}", exc_info=True)
+        return 0
+    return linked
+
+
+def process_places(conn, gazetteer_path=None, use_nominatim=True, max_km=DEFAULT_MAX_PLACE_KM,
+                   precision=DEFAULT_GEOHASH_PRECISION, batch_size=PLACE_BATCH_SIZE):
+    """
+    Reverse geocode the photos and videos that have coordinates but no place.
+
+    Media are bucketed by geohash cell of `precision` characters; each cell is
+    geocoded once (at the mean position of its media) and cached in
+    GeocodingCells, so nearby shots share one lookup. With `gazetteer_path`
+    (a GeoNames dump or an index built from one) cells are resolved offline
+    in vectorised KD-tree batches; a cell with no gazetteer place within
+    `max_km` is left for Nominatim when `use_nominatim` is set, one
+    rate-limited request at a time; cells it has no place for are cached as
+    misses and not queried again for MISS_RETRY. Media are then linked with
+    one join per table.
+    """
+    logger.info("--- Phase 3: Reverse Geocoding for Places ---")
+    ensure_tables(conn)
+
+    try:
+        staged = stage_media(conn, precision)
+        cells = _cells_to_geocode(conn)
+    except Exception as e:
+        logger.error(f"Error collecting coordinates for geocoding: {e}")
+        return
+    if not staged:
+        logger.info("No media without a place found for geocoding.")
+        return
+    logger.info(f"Found {staged} media without a place; {len(cells)} of their geohash cells are not geocoded yet.")
+
+    unresolved = cells
+    stored = 0
+    if cells and gazetteer_path:
+        if not gazetteer_available():
+            logger.warning("numpy and scipy are required for offline geocoding; using Nominatim only")
+        else:
+            gazetteer = Gazetteer.open(gazetteer_path)
+            unresolved = []
+            batch = []
+            places = gazetteer.reverse([coord for _, coord in cells], max_km)
+            for (cell, coord), (_, place) in zip(cells, places):
+                if place is None:
+                    unresolved.append((cell, coord))
+                    continue
+                batch.append((cell, coord, place))
+                if len(batch) >= batch_size:
+                    stored += store_places(conn, batch)
+                    batch = []
+            stored += store_places(conn, batch)
+            logger.info(f"Gazetteer resolved {stored} cells; {len(unresolved)} have no place within {max_km} km.")
+
+    if unresolved and use_nominatim:
+        logger.info(f"Querying Nominatim for {len(unresolved)} cells.")
+        for i, (cell, (lat, lon)) in enumerate(unresolved, 1):
+            data = reverse_geocode_coordinates(lat, lon)
+            if data:
+                stored += store_places(conn, [(cell, (lat, lon), data)])
+            elif data is not None:
+                store_miss(conn, cell)
+            else:
+                logger.warning(f"Failed to geocode coordinates {lat},{lon}. Skipping.")
+            if i % 100 == 0:
+                logger.info(f"Nominatim: {i}/{len(unresolved)} cells")
+
+    linked = link_staged_media(conn)
+    with conn.cursor() as cursor:
+        cursor.execute("DROP TEMPORARY TABLE IF EXISTS place_stage")
+    logger.info(f"Finished reverse geocoding for places: {stored} cells geocoded, {linked} media linked.")
@@ -1,12 +1,14 @@
-from managers.db_manager import store_metadata
-from managers.media_transfer import organize_file
-from utils.logger import log_action
-from metadata_parser import parse_metadata
+from processors.takeout import process_google_takeout
 
 def process(file_paths):
+    # Imported here so that importing this module (e.g. for process_google_takeout) does not need them.
+    from managers.db_manager import store_metadata
+    from managers.media_transfer import organize_file
+    from utils.logger import log_action
+    from metadata_parser import parse_metadata
+
     for path in file_paths:
         metadata = parse_metadata(path)
         store_metadata(metadata)
         organize_file(path, metadata)
         log_action(f"Processed: {path}")
-
@@ -0,0 +1,388 @@
+# processors/takeout.py
+
+import json
+import logging
+import os
+import tarfile
+import zipfile
+from bisect import bisect_left, bisect_right
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+GOOGLE_TAKEOUT_ROOT_DIR = '/home/rwcampbell/Dropbox/Backup/Takeout/Google Photos'
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.tif', '.tiff', '.heic', '.webp', '.nef', '.raw', '.dng'}
+VIDEO_EXTENSIONS = {'.mp4', '.mov', '.avi', '.mkv', '.webm', '.mpg', '.mpeg', '.asf', '.3gp'}
+
+MATCH_WINDOW_SECONDS = 3 * 3600  # Takeout timestamps vs. date_taken
+FETCH_SIZE = 10000
+DEFAULT_TAKEOUT_BATCH_SIZE = 100
+DEFAULT_TAKEOUT_WORKERS = os.cpu_count() or 1
+PEOPLE_MARKER = b'"people"'
+MAX_FACE_NAME_LENGTH = 255  # faces.name is VARCHAR(255)
+
+
+class TakeoutMatchIndex:
+    """
+    In-memory replacement for the per-JSON
+    `WHERE file_name LIKE 'base%' AND date_taken BETWEEN ... ORDER BY ABS(...)`
+    query: maps each lowercased base filename (no extension) to a sorted list
+    of (unix timestamp, id), so a match is a dict lookup plus a bisect over
+    the +/- 3 hour window.
+    """
+
+    def __init__(self, table):
+        self.table = table
+        self._index = {}
+
+    @classmethod
+    def load(cls, conn, table, fetch_size=FETCH_SIZE):
+        index = cls(table)
+        cursor = conn.cursor(buffered=False)
+        try:
+            cursor.execute(f"SELECT id, file_name, date_taken FROM {table} "
+                           f"WHERE file_name IS NOT NULL AND date_taken IS NOT NULL")
+            while True:
+                rows = cursor.fetchmany(fetch_size)
+                if not rows:
+                    break
+                for media_id, file_name, date_taken in rows:
+                    index.add(file_name, date_taken, media_id)
+        finally:
+            cursor.close()
+        for entries in index._index.values():
+            entries.sort()
+        logger.info(f"Loaded Takeout match index for {table}: {len(index._index)} base names")
+        return index
+
+    @staticmethod
+    def key(file_name):
+        return os.path.splitext(file_name)[0].lower()
+
+    def add(self, file_name, date_taken, media_id):
+        # date_taken is local time, as UNIX_TIMESTAMP() read it in the old query.
+        self._index.setdefault(self.key(file_name), []).append((int(date_taken.timestamp()), media_id))
+
+    def match(self, file_name, timestamp, window=MATCH_WINDOW_SECONDS):
+        """The id whose date_taken is closest to `timestamp` within `window` seconds, or None."""
+        entries = self._index.get(self.key(file_name))
+        if not entries:
+            return None
+        lo = bisect_left(entries, (timestamp - window,))
+        hi = bisect_right(entries, (timestamp + window, float("inf")))
+        if lo >= hi:
+            return None
+        return min(entries[lo:hi], key=lambda entry: abs(entry[0] - timestamp))[1]
+
+
+class FaceCache:
+    """
+    Per-run name -> faces.id map, preloaded from `faces`. Names not seen yet
+    are collected with want() and created together by resolve(), one
+    multi-row upsert plus one SELECT per batch instead of a lookup per person.
+    """
+
+    def __init__(self):
+        self._ids = {}
+        self._unknown = set()
+        self._uncommitted = []
+
+    @classmethod
+    def load(cls, conn, fetch_size=FETCH_SIZE):
+        cache = cls()
+        cursor = conn.cursor(buffered=False)
+        try:
+            cursor.execute("SELECT id, name FROM faces WHERE name IS NOT NULL")
+            while True:
+                rows = cursor.fetchmany(fetch_size)
+                if not rows:
+                    break
+                for face_id, name in rows:
+                    cache._ids[name] = face_id
+        finally:
+            cursor.close()
+        logger.info(f"Loaded {len(cache._ids)} face names")
+        return cache
+
+    def __len__(self):
+        return len(self._ids)
+
+    def want(self, name):
+        """Queue `name` for resolve(); False (and nothing queued) if it cannot be stored as a face name."""
+        if not isinstance(name, str) or not name.strip() or len(name) > MAX_FACE_NAME_LENGTH:
+            return False
+        if name not in self._ids:
+            self._unknown.add(name)
+        return True
+
+    def get(self, name):
+        return self._ids.get(name)
+
+    def resolve(self, cursor):
+        """Create the wanted names that are not in `faces` yet and cache their ids. Does not commit."""
+        self._uncommitted = []
+        if not self._unknown:
+            return 0
+        names = sorted(self._unknown)
+        self._unknown.clear()
+        placeholders = ", ".join(["(%s)"] * len(names))
+        try:
+            cursor.execute(f"INSERT INTO faces (name) VALUES {placeholders} ON DUPLICATE KEY UPDATE name = name",
+                           names)
+            created = cursor.rowcount
+        except Exception as e:
+            # One bad name fails the whole statement; insert them one by one and drop the ones that fail.
+            logger.warning(f"Upserting {len(names)} face names failed ({e}); inserting them one at a time")
+            kept, created = [], 0
+            for name in names:
+                try:
+                    cursor.execute("INSERT INTO faces (name) VALUES (%s) ON DUPLICATE KEY UPDATE name = name", (name,))
+                    created += cursor.rowcount
+                    kept.append(name)
+                except Exception as e:
+                    logger.error(f"Skipping face name {name!r}: {e}")
+            names = kept
+            if not names:
+                return 0
+        cursor.execute(f"SELECT id, name FROM faces WHERE name IN ({', '.join(['%s'] * len(names))})", names)
+        # The column collation is case-insensitive, so a stored name may differ in case from the requested one.
+        stored = {}
+        for face_id, name in cursor.fetchall():
+            self._ids[name] = face_id
+            stored[name.lower()] = face_id
+        for name in names:
+            if name not in self._ids and name.lower() in stored:
+                self._ids[name] = stored[name.lower()]
+        self._uncommitted = names
+        self._unknown.clear()
+        logger.debug(f"Upserted {len(names)} new face names ({created} rows affected).")
+        return len(names)
+
+    def rollback(self):
+        """Forget the ids cached by the last resolve(); its insert was rolled back."""
+        for name in self._uncommitted:
+            self._ids.pop(name, None)
+            self._unknown.add(name)
+        self._uncommitted = []
+
+
+def _flush_face_batch(conn, faces, batch):
+    """
+    Write the (media_type, media_id, person name) associations in `batch`:
+    unknown names are upserted into `faces`, then photo_faces and video_faces
+    rows are inserted, all in one transaction.
+    """
+    if not batch:
+        return 0
+    cursor = conn.cursor()
+    try:
+        faces.resolve(cursor)
+        # Names resolve() had to drop have no id and are left out.
+        resolved = [(media_type, media_id, faces.get(name)) for media_type, media_id, name in batch
+                    if faces.get(name) is not None]
+        photo_rows = [(media_id, face_id) for media_type, media_id, face_id in resolved if media_type == 'photo']
+        # Assuming frame_number 0 for now
+        video_rows = [(media_id, face_id, 0) for media_type, media_id, face_id in resolved if media_type == 'video']
+        inserted = 0
+        if photo_rows:
+            cursor.executemany("INSERT IGNORE INTO photo_faces (photo_id, face_id) VALUES (%s, %s)", photo_rows)
+            inserted += cursor.rowcount
+        if video_rows:
+            cursor.executemany("INSERT IGNORE INTO video_faces (video_id, face_id, frame_number) VALUES (%s, %s, %s)",
+                               video_rows)
+            inserted += cursor.rowcount
+        conn.commit()
+        logger.debug(f"Inserted {inserted} of {len(batch)} face associations.")
+        return inserted
+    except Exception as e:
+        conn.rollback()
+        faces.rollback()
+        logger.error(f"Error inserting face association batch: {e}", exc_info=True)
+        return 0
+    finally:
+        cursor.close()
+
+
+ARCHIVE_SUFFIXES = ('.zip', '.tgz', '.tar.gz', '.tar')
+
+
+def _is_archive(path):
+    return path.lower().endswith(ARCHIVE_SUFFIXES)
+
+
+def _json_member(name):
+    base = os.path.basename(name).lower()
+    return base.endswith('.json') and not base.startswith('album_')
+
+
+def iter_takeout_jsons(sources):
+    """
+    Yield (name, bytes) for every JSON sidecar in `sources`, which may be
+    Takeout directories or the original .zip/.tgz archives (archives found
+    inside a directory are read too). Nothing is extracted to disk, and members
+    without a "people" key are dropped on a byte search before any parsing.
+    """
+    for source in sources:
+        if os.path.isdir(source):
+            for root, _, names in os.walk(source):
+                for name in sorted(names):
+                    path = os.path.join(root, name)
+                    if _is_archive(name):
+                        yield from iter_takeout_jsons([path])
+                    elif _json_member(name):
+                        try:
+                            with open(path, 'rb') as f:
+                                data = f.read()
+                        except OSError as e:
+                            logger.error(f"Cannot read {path}: {e}")
+                            continue
+                        if PEOPLE_MARKER in data:
+                            yield path, data
+        elif _is_archive(source):
+            logger.info(f"Reading Takeout archive {source}")
+            try:
+                yield from _archive_jsons(source)
+            except Exception as e:
+                # A truncated or corrupt download; the other archives are still worth reading.
+                logger.error(f"Cannot read Takeout archive {source}: {e}")
+        else:
+            logger.warning(f"Google Takeout source '{source}' is not a directory or a .zip/.tgz archive.")
+
+
+def _archive_jsons(source):
+    if source.lower().endswith('.zip'):
+        with zipfile.ZipFile(source) as zf:
+            for info in zf.infolist():
+                if not info.is_dir() and _json_member(info.filename):
+                    data = zf.read(info)
+                    if PEOPLE_MARKER in data:
+                        yield f"{source}:{info.filename}", data
+    else:
+        # Stream mode reads the (compressed) archive front to back exactly once.
+        with tarfile.open(source, 'r|*') as tf:
+            for member in tf:
+                if member.isfile() and _json_member(member.name):
+                    data = tf.extractfile(member).read()
+                    if PEOPLE_MARKER in data:
+                        yield f"{source}:{member.name}", data
+
+
+def parse_sidecar(item):
+    """
+    Parse one sidecar in a worker process. Returns (name, title, timestamp,
+    [person names], error) so only the fields used cross back to the parent.
+    """
+    name, data = item
+    try:
+        return _parse_sidecar(name, data)
+    except ValueError as e:
+        return name, None, None, [], f"Error decoding JSON: {e}"
+    except Exception as e:
+        return name, None, None, [], f"Unexpected sidecar structure: {e}"
+
+
+def _parse_sidecar(name, data):
+    sidecar = json.loads(data)
+    title = sidecar.get('title')
+    if not title:
+        return name, None, None, [], None
+    taken = sidecar.get('photoTakenTime') or {}
+    try:
+        timestamp = int(taken['timestamp'])
+    except (KeyError, ValueError, TypeError):
+        return name, title, None, [], None
+    people = [person.get('name') for person in sidecar.get('people') or () if isinstance(person, dict)]
+    return name, title, timestamp, people, None
+
+
+def ordered_map(executor, fn, items, max_pending):
+    """Like executor.map, but with at most `max_pending` items in flight, so `items` is consumed lazily."""
+    pending = deque()
+    for item in items:
+        pending.append(executor.submit(fn, item))
+        if len(pending) >= max_pending:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def process_google_takeout(conn, batch_size=DEFAULT_TAKEOUT_BATCH_SIZE, root_dir=GOOGLE_TAKEOUT_ROOT_DIR,
+                           workers=DEFAULT_TAKEOUT_WORKERS):
+    """
+    Processes Google Takeout JSON files to extract face information and associate it with media.
+    `root_dir` is one or more Takeout directories or .zip/.tgz archives. Sidecars
+    are parsed in a pool of `workers` processes and handled in archive order.
+    Each JSON is matched to a Photos/Videos row by base filename and the closest
+    date_taken within 3 hours of its photoTakenTime, using in-memory indexes
+    loaded once per run.
+    """
+    logger.info("--- Phase 2: Processing Google Takeout Data for Faces ---")
+
+    sources = [root_dir] if isinstance(root_dir, str) else list(root_dir)
+    missing = [src for src in sources if not os.path.exists(src)]
+    for src in missing:
+        logger.warning(f"Google Takeout source '{src}' does not exist. Skipping it.")
+    sources = [src for src in sources if src not in missing]
+    if not sources:
+        return
+
+    photo_index = TakeoutMatchIndex.load(conn, "Photos")
+    video_index = TakeoutMatchIndex.load(conn, "Videos")
+    faces = FaceCache.load(conn)
+
+    face_batch = []
+    processed_json_with_people_data_count = 0
+    count = 0
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = ordered_map(executor, parse_sidecar, iter_takeout_jsons(sources), max_pending=workers * 64)
+        for json_file_path, media_filename, json_timestamp_int, people, error in results:
+            count += 1
+            if count % 1000 == 0:
+                logger.info(f"Processed {count} Takeout JSONs with people data")
+            if error:
+                logger.error(f"{error} ({json_file_path})")
+                continue
+            if not media_filename:
+                logger.debug(f"Skipping JSON {json_file_path}: No 'title' (media filename) found.")
+                continue
+            if json_timestamp_int is None:
+                logger.debug(f"Skipping JSON {json_file_path}: No usable 'photoTakenTime' timestamp.")
+                continue
+
+            ext = os.path.splitext(media_filename)[1].lower()
+            if ext in IMAGE_EXTENSIONS:
+                media_type, media_id = 'photo', photo_index.match(media_filename, json_timestamp_int)
+            elif ext in VIDEO_EXTENSIONS:
+                media_type, media_id = 'video', video_index.match(media_filename, json_timestamp_int)
+            else:
+                logger.debug(f"Skipping JSON {json_file_path}: Media file '{media_filename}' is not a recognized image or video type.")
+                continue
+
+            if not media_id:
+                logger.debug(f"Skipping JSON {json_file_path}: Media file '{media_filename}' not found in Photos or Videos table within date range.")
+                continue
+
+            if not people:
+                logger.debug(f"Skipping JSON {json_file_path}: No 'people' data found or 'people' array is empty.")
+                continue
+
+            for person_name in people:
+                if not person_name:
+                    logger.debug(f"Skipping person in JSON {json_file_path}: 'name' not found in person data.")
+                    continue
+                if not faces.want(person_name):
+                    logger.warning(f"Skipping person in JSON {json_file_path}: unusable name {person_name!r}.")
+                    continue
+                face_batch.append((media_type, media_id, person_name))
+            processed_json_with_people_data_count += 1
+
+            if len(face_batch) >= batch_size:
+                _flush_face_batch(conn, faces, face_batch)
+                face_batch = []
+
+    _flush_face_batch(conn, faces, face_batch)
+
+    logger.info(f"Finished processing Google Takeout data. Processed {processed_json_with_people_data_count} media JSONs that had associated face data.")
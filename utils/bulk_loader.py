@@ -0,0 +1,122 @@
+# utils/bulk_loader.py
+
+import os
+import tempfile
+from datetime import datetime
+
+from utils.media_utils import MAPPINGS, lookup_columns, sanitize_metadata
+
+_TSV_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r", "\0": "\\0"})
+
+
+def _tsv_value(value):
+    if value is None:
+        return "\\N"
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d %H:%M:%S")
+    return str(value).translate(_TSV_ESCAPES)
+
+
+def enable_local_infile(db_conn, logger):
+    """
+    Make sure LOAD DATA LOCAL INFILE can be used on this connection. The server
+    must have local_infile enabled; the client side is switched on and the
+    connection re-established if needed. Returns False if it is unavailable.
+    """
+    try:
+        with db_conn.cursor() as cursor:
+            cursor.execute("SELECT @@local_infile")
+            if not int(cursor.fetchone()[0]):
+                logger.warning("Server has local_infile disabled; --bulk-load is unavailable")
+                return False
+        db_conn.config(allow_local_infile=True)
+        db_conn.reconnect()
+        return True
+    except Exception as e:
+        logger.warning(f"Could not enable LOAD DATA LOCAL INFILE on this connection: {e}")
+        return False
+
+
+def _write_tsv(items, columns, media_type, logger, tsv):
+    """Sanitize each (file_path, metadata) into one TSV row; return the file paths written."""
+    mapping = MAPPINGS.get(media_type, {})
+    file_paths = []
+    for file_path, metadata in items:
+        sanitized = sanitize_metadata(metadata, mapping, logger, file_path=file_path)
+        if not sanitized.get("file_name"):
+            logger.warning(f"Skipping bulk load — missing required metadata for {media_type}. Source file: {file_path}")
+            continue
+        tsv.write("\t".join(_tsv_value(sanitized.get(col)) for col in columns) + "\n")
+        file_paths.append(file_path)
+    return file_paths
+
+
+def _missing_value_sql(target, col):
+    """The serial path's `existing in (None, '', 0)` test, written so it is safe for any column type."""
+    return f"COALESCE(CAST({target}.`{col}` AS CHAR), '') IN ('', '0')"
+
+
+def bulk_load_media(db_conn, items, media_type, logger, tmp_dir=None):
+    """
+    Stream sanitized records into a TSV file, LOAD DATA LOCAL INFILE it into a
+    temporary staging table and merge that into `media_type` with a single
+    INSERT ... SELECT ... ON DUPLICATE KEY UPDATE.
+
+    Staged rows are joined to the lowest existing id with the same file_name,
+    as get_existing_media_records does. Rows with a match hit the primary key
+    and only fill columns that are still empty, like update_missing_media_fields.
+    Rows without a match get a NULL id and are inserted.
+
+    Returns the file paths that were loaded.
+    """
+    columns = [col for col in lookup_columns(media_type) if col != "id"]
+    column_sql = ", ".join(f"`{col}`" for col in columns)
+    stage = f"{media_type}_bulk_stage"
+
+    with tempfile.NamedTemporaryFile("w", suffix=".tsv", dir=tmp_dir, encoding="utf-8",
+                                     newline="", delete=False) as tsv:
+        tsv_path = tsv.name
+        file_paths = _write_tsv(items, columns, media_type, logger, tsv)
+
+    try:
+        if not file_paths:
+            logger.info(f"[{media_type}] Bulk load: nothing to load")
+            return []
+        logger.info(f"[{media_type}] Bulk loading {len(file_paths)} records from {tsv_path}")
+
+        updates = ", ".join(
+            f"`{col}` = IF(VALUES(`{col}`) IS NOT NULL AND {_missing_value_sql(media_type, col)}, "
+            f"VALUES(`{col}`), {media_type}.`{col}`)"
+            for col in columns
+        )
+        with db_conn.cursor() as cursor:
+            cursor.execute(f"DROP TEMPORARY TABLE IF EXISTS {stage}")
+            cursor.execute(f"CREATE TEMPORARY TABLE {stage} LIKE {media_type}")
+            cursor.execute(f"""
+                LOAD DATA LOCAL INFILE %s INTO TABLE {stage}
+                CHARACTER SET utf8mb4
+                FIELDS TERMINATED BY '\\t' ESCAPED BY '\\\\'
+                LINES TERMINATED BY '\\n'
+                ({column_sql})
+            """, (tsv_path,))
+            logger.debug(f"[{media_type}] Staged {cursor.rowcount} rows in {stage}")
+
+            cursor.execute(f"""
+                INSERT INTO {media_type} (id, {column_sql})
+                SELECT t.id, {", ".join(f"s.`{col}`" for col in columns)}
+                FROM {stage} s
+                LEFT JOIN (
+                    SELECT MIN(id) AS id, file_name FROM {media_type} GROUP BY file_name
+                ) t ON t.file_name = s.file_name
+                ON DUPLICATE KEY UPDATE {updates}
+            """)
+            cursor.execute(f"DROP TEMPORARY TABLE IF EXISTS {stage}")
+        db_conn.commit()
+        logger.info(f"[{media_type}] Bulk load merged {len(file_paths)} records")
+        return file_paths
+    except Exception as e:
+        db_conn.rollback()
+        logger.error(f"[{media_type}] Bulk load failed: {e}")
+        return []
+    finally:
+        os.unlink(tsv_path)
@@ -0,0 +1,253 @@
+# utils/content_index.py
+
+import hashlib
+import heapq
+import os
+import threading
+from array import array
+from bisect import bisect_left
+from datetime import datetime
+
+from utils.db_pool import prepared
+from utils.processed_index import path_key
+
+PARTIAL_BYTES = 64 * 1024
+HASH_CHUNK = 1024 * 1024
+FETCH_SIZE = 10000
+FLUSH_BATCH_SIZE = 1000
+
+CREATE_TABLE = """
+    CREATE TABLE IF NOT EXISTS ContentHashes (
+        id BIGINT AUTO_INCREMENT PRIMARY KEY,
+        path_key BIGINT UNSIGNED NOT NULL,
+        file_path VARCHAR(2048),
+        size BIGINT NOT NULL,
+        partial_hash BINARY(16),
+        full_hash BINARY(32),
+        indexed_at DATETIME,
+        UNIQUE KEY idx_content_path_key (path_key),
+        KEY idx_content_size_partial (size, partial_hash),
+        KEY idx_content_full_hash (full_hash)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+"""
+
+
+def partial_hash(file_path, size):
+    """BLAKE2 of the size and the first and last 64 KB."""
+    h = hashlib.blake2b(str(size).encode(), digest_size=16)
+    with open(file_path, "rb") as f:
+        h.update(f.read(PARTIAL_BYTES))
+        if size > PARTIAL_BYTES:
+            f.seek(max(PARTIAL_BYTES, size - PARTIAL_BYTES))
+            h.update(f.read(PARTIAL_BYTES))
+    return h.digest()
+
+
+def full_hash(file_path):
+    h = hashlib.blake2b(digest_size=32)
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+            h.update(chunk)
+    return h.digest()
+
+
+class ContentEntry:
+    """What is known about one file's content; hashes are filled in only when needed."""
+    __slots__ = ("path", "size", "partial", "full", "row_id")
+
+    def __init__(self, path, size, partial=None, full=None, row_id=None):
+        self.path = path
+        self.size = size
+        self.partial = partial
+        self.full = full
+        self.row_id = row_id
+
+
+class ContentIndex:
+    """
+    Exact-duplicate detection backed by the ContentHashes table.
+
+    A file is compared in stages, each only when the previous one collides:
+    size (answered from an in-memory sorted array of known sizes, skipping
+    the database when a size's only row is the file itself), then a
+    partial hash of its first and last 64 KB, then a full BLAKE2 hash. Hashes
+    of indexed files are computed and stored lazily, the first time another
+    file collides with them. New entries are queued with add() and written by
+    flush() on the thread that owns the connection.
+    """
+
+    def __init__(self, sizes=(), owners=None):
+        # owners[i] is the path_key of the only row of size sizes[i], or 0 when it has several.
+        self._sizes = array("q", sizes)
+        self._owners = array("Q", owners if owners is not None else [0] * len(self._sizes))
+        self._recent = {}    # size -> [ContentEntry] seen this run
+        self._pending = []
+        self._lock = threading.Lock()
+        self.duplicates = 0
+
+    @staticmethod
+    def ensure_table(db_conn, logger):
+        with db_conn.cursor() as cursor:
+            cursor.execute(CREATE_TABLE)
+        db_conn.commit()
+        logger.debug("Table created/checked: ContentHashes")
+
+    @classmethod
+    def load(cls, db_conn, logger, fetch_size=FETCH_SIZE):
+        sizes, owners = array("q"), array("Q")
+        if db_conn is None:
+            return cls(sizes, owners)
+        try:
+            cls.ensure_table(db_conn, logger)
+            cursor = db_conn.cursor(buffered=False)
+            try:
+                cursor.execute("SELECT size, COUNT(*), MIN(path_key) FROM ContentHashes GROUP BY size ORDER BY size")
+                while True:
+                    rows = cursor.fetchmany(fetch_size)
+                    if not rows:
+                        break
+                    for size, count, owner in rows:
+                        sizes.append(size)
+                        owners.append(owner & 0xFFFFFFFFFFFFFFFF if count == 1 else 0)  # SQLite returns it signed
+            finally:
+                cursor.close()
+        except Exception as e:
+            logger.error(f"Failed to load content index sizes: {e}")
+            sizes, owners = array("q"), array("Q")
+        logger.info(f"Loaded {len(sizes)} distinct file sizes from ContentHashes")
+        return cls(sizes, owners)
+
+    def _size_index(self, size):
+        idx = bisect_left(self._sizes, size)
+        return idx if idx < len(self._sizes) and self._sizes[idx] == size else None
+
+    def _candidates(self, db_conn, entry):
+        key = path_key(entry.path)
+        with self._lock:
+            candidates = [c for c in self._recent.get(entry.size, ()) if c.path != entry.path]
+            idx = self._size_index(entry.size)
+            # A size whose only row is this file (a moved file being ingested) has nothing to compare against.
+            others = idx is not None and self._owners[idx] != key
+        if db_conn is not None and others:
+            sql = "SELECT id, file_path, partial_hash, full_hash FROM ContentHashes WHERE size = %s AND path_key != %s"
+            with prepared(db_conn, sql) as cursor:
+                cursor.execute(sql, (entry.size, key))
+                seen = {c.path for c in candidates}
+                candidates += [ContentEntry(path, entry.size, partial and bytes(partial), full and bytes(full), row_id)
+                               for row_id, path, partial, full in cursor.fetchall() if path not in seen]
+        return candidates
+
+    def _forget(self, db_conn, entry):
+        # The indexed file is gone; its stored hashes no longer stand for anything on disk.
+        if db_conn is not None and entry.row_id is not None:
+            with db_conn.cursor() as cursor:
+                cursor.execute("DELETE FROM ContentHashes WHERE id = %s", (entry.row_id,))
+
+    def _fill(self, db_conn, entry, column):
+        """Compute a missing hash of an indexed file and store it on its row."""
+        try:
+            if column == "partial_hash":
+                entry.partial = partial_hash(entry.path, entry.size)
+                value = entry.partial
+            else:
+                entry.full = full_hash(entry.path)
+                value = entry.full
+        except OSError:
+            return False
+        if db_conn is not None and entry.row_id is not None:
+            with db_conn.cursor() as cursor:
+                cursor.execute(f"UPDATE ContentHashes SET {column} = %s WHERE id = %s", (value, entry.row_id))
+        return True
+
+    def find_duplicate(self, db_conn, file_path, size=None, logger=None, accept=None):
+        """
+        Return (duplicate_path, entry): the path of an indexed file with the
+        same content as `file_path` (or None), and a ContentEntry for
+        `file_path` with whatever hashes had to be computed, for add().
+        Only indexed files that still exist and, given `accept(path)`, that it
+        accepts count as duplicates.
+        """
+        if size is None:
+            size = os.path.getsize(file_path)
+        entry = ContentEntry(file_path, size)
+        try:
+            candidates = self._candidates(db_conn, entry)
+            if accept is not None:
+                candidates = [c for c in candidates if accept(c.path)]
+            if candidates:
+                entry.partial = partial_hash(file_path, size)
+                candidates = [c for c in candidates
+                              if (c.partial is not None or self._fill(db_conn, c, "partial_hash"))
+                              and c.partial == entry.partial]
+            if candidates:
+                entry.full = full_hash(file_path)
+                for c in candidates:
+                    if (c.full is not None or self._fill(db_conn, c, "full_hash")) and c.full == entry.full:
+                        if not os.path.exists(c.path):
+                            self._forget(db_conn, c)
+                            continue
+                        with self._lock:
+                            self.duplicates += 1
+                        return c.path, entry
+        except Exception as e:
+            if logger:
+                logger.warning(f"Content index lookup failed for {file_path}: {e}")
+            return None, entry
+
+        # Later files this run are compared against this one too.
+        with self._lock:
+            self._recent.setdefault(size, []).append(entry)
+        return None, entry
+
+    def pending(self):
+        return len(self._pending)
+
+    def add(self, file_path, entry):
+        """Queue `file_path` (with the content described by `entry`) for the index."""
+        with self._lock:
+            self._pending.append((path_key(file_path), file_path, entry.size, entry.partial, entry.full,
+                                  datetime.now()))
+
+    def flush(self, db_conn, logger, batch_size=FLUSH_BATCH_SIZE):
+        if db_conn is None:
+            return
+        with self._lock:
+            pending, self._pending = self._pending, []
+        if not pending:
+            db_conn.commit()  # hashes filled in by lookups
+            return
+        sql = """
+            INSERT INTO ContentHashes (path_key, file_path, size, partial_hash, full_hash, indexed_at)
+            VALUES (%s, %s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE file_path = VALUES(file_path), size = VALUES(size),
+                partial_hash = VALUES(partial_hash), full_hash = VALUES(full_hash), indexed_at = VALUES(indexed_at)
+        """
+        written = 0
+        for i in range(0, len(pending), batch_size):
+            batch = pending[i:i + batch_size]
+            try:
+                with db_conn.cursor() as cursor:
+                    cursor.executemany(sql, batch)
+                db_conn.commit()
+                written += len(batch)
+            except Exception as e:
+                db_conn.rollback()
+                logger.error(f"Failed to index content of {len(batch)} files: {e}")
+        keys_by_size = {}
+        for row in pending:
+            keys_by_size.setdefault(row[2], set()).add(row[0])
+        with self._lock:
+            new_sizes = []
+            for size, keys in keys_by_size.items():
+                idx = self._size_index(size)
+                if idx is None:
+                    new_sizes.append((size, next(iter(keys)) if len(keys) == 1 else 0))
+                elif keys != {self._owners[idx]}:
+                    self._owners[idx] = 0
+            if new_sizes:
+                merged = list(heapq.merge(zip(self._sizes, self._owners), sorted(new_sizes)))
+                self._sizes = array("q", (size for size, _ in merged))
+                self._owners = array("Q", (owner for _, owner in merged))
+            # Everything noted so far is now in the table (or was a failed write).
+            self._recent.clear()
+        logger.info(f"Indexed content of {written} files in ContentHashes")
@@ -0,0 +1,148 @@
+# utils/date_writeback.py
+
+import logging
+import os
+import re
+import threading
+
+from utils.exiftool_pool import run_exiftool
+from utils.file_transfer import set_file_date
+
+logger = logging.getLogger(__name__)
+
+DATE_TAGS = ("CreateDate", "ModifyDate", "DateTimeOriginal")
+XMP_TAGS = {"CreateDate": "XMP-xmp:CreateDate", "ModifyDate": "XMP-xmp:ModifyDate",
+            "DateTimeOriginal": "XMP-exif:DateTimeOriginal"}
+DEFAULT_WRITE_BATCH = 100
+VIDEO_RE = re.compile(r"\.(mp4|mov|avi|mkv|webm|3gp|mpeg|mpg)$", re.IGNORECASE)
+_UPDATED_RE = re.compile(r"(\d+) image files (?:updated|created)")
+
+
+def exif_date(date):
+    return f"{date:%Y:%m:%d} 00:00:00"
+
+
+def dates_to_write(metadata, date):
+    """
+    The date tags that do not already hold `date`. Tags a file does not have
+    are only added when it has none of them, so a video without
+    DateTimeOriginal is not rewritten just to add one.
+    """
+    if not metadata:
+        return list(DATE_TAGS)
+    wanted = f"{date:%Y:%m:%d}"
+    present = {tag: str(metadata[tag]) for tag in DATE_TAGS if metadata.get(tag)}
+    if not present:
+        return list(DATE_TAGS)
+    return [tag for tag, value in present.items() if value[:10].replace("-", ":") != wanted]
+
+
+def sidecar_path(file_path):
+    return os.path.splitext(os.fspath(file_path))[0] + ".xmp"
+
+
+def _updated_count(out):
+    return sum(int(n) for n in _UPDATED_RE.findall(out))
+
+
+def write_dates(files, date, tags, sidecar=False):
+    """
+    Write `date` into `tags` of every file in `files` with one exiftool call.
+    With `sidecar` the dates go to an XMP file next to each one instead, so
+    the media file itself is not rewritten. Returns True if every file was written.
+    """
+    value = exif_date(date)
+    files = [str(f) for f in files]
+    if not sidecar:
+        args = [f"-{tag}={value}" for tag in tags] + ["-overwrite_original"] + files
+        return _updated_count(run_exiftool(args)) == len(files)
+
+    assignments = [f"-{XMP_TAGS[tag]}={value}" for tag in tags]
+    existing = [f for f in files if os.path.exists(sidecar_path(f))]
+    new = [f for f in files if f not in existing]
+    written = 0
+    if existing:
+        written += _updated_count(run_exiftool(assignments + ["-overwrite_original"]
+                                               + [sidecar_path(f) for f in existing]))
+    if new:
+        written += _updated_count(run_exiftool(assignments + ["-o", "%d%f.xmp"] + new))
+    return written == len(files)
+
+
+class DateWriteBack:
+    """
+    Collects moved files whose dates need writing and writes them in batches,
+    one exiftool call per (date, tags) group, instead of one call per file.
+
+    Videos of at least `sidecar_min_bytes` get an XMP sidecar rather than
+    having their container rewritten. `on_written(file, date, tags_written,
+    sidecar, metadata)` runs for every file after its write (or right away
+    when nothing needed writing) once its final mtime has been set;
+    `tags_written` is None when the write failed.
+    """
+
+    def __init__(self, batch_size=DEFAULT_WRITE_BATCH, sidecar_min_bytes=None, on_written=None):
+        self.batch_size = max(1, batch_size)
+        self.sidecar_min_bytes = sidecar_min_bytes
+        self.on_written = on_written
+        self.skipped = self.written = self.failed = 0
+        self._pending = []
+        self._lock = threading.Lock()
+
+    def use_sidecar(self, file_path):
+        if self.sidecar_min_bytes is None or not VIDEO_RE.search(str(file_path)):
+            return False
+        try:
+            return os.path.getsize(file_path) >= self.sidecar_min_bytes
+        except OSError:
+            return False
+
+    def add(self, files, date, tags, metadata=None):
+        if not tags:
+            with self._lock:
+                self.skipped += len(files)
+            for f in files:
+                self._finish(f, date, (), False, metadata)
+            return
+
+        with self._lock:
+            self._pending.extend((f, date, tuple(tags), metadata) for f in files)
+            if len(self._pending) < self.batch_size:
+                return
+            batch, self._pending = self._pending, []
+        self._write(batch)
+
+    def flush(self):
+        with self._lock:
+            batch, self._pending = self._pending, []
+        if batch:
+            self._write(batch)
+        if self.skipped or self.written or self.failed:
+            logger.info(f"Date write-back: written={self.written}, already_correct={self.skipped}, failed={self.failed}")
+
+    def _write(self, batch):
+        groups = {}
+        for f, date, tags, metadata in batch:
+            groups.setdefault((date, tags, self.use_sidecar(f)), []).append((f, metadata))
+
+        for (date, tags, sidecar), entries in groups.items():
+            files = [f for f, _ in entries]
+            try:
+                ok = write_dates(files, date, tags, sidecar=sidecar)
+            except Exception as e:
+                logger.debug(f"ExifTool date write failed for {len(files)} files: {e}")
+                ok = False
+            with self._lock:
+                if ok:
+                    self.written += len(files)
+                else:
+                    self.failed += len(files)
+            for f, metadata in entries:
+                # A partly failed batch does not say which files failed, so none are trusted.
+                self._finish(f, date, tags if ok else None, sidecar, metadata)
+
+    def _finish(self, file_path, date, tags_written, sidecar, metadata):
+        set_file_date(file_path, date)
+        if self.on_written is not None:
+            self.on_written(file_path, date, tags_written, sidecar, metadata)
+
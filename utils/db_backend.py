@@ -0,0 +1,234 @@
+# utils/db_backend.py
+
+import logging
+import re
+import sqlite3
+from datetime import date, datetime
+from functools import lru_cache
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BACKEND = "mysql"
+SQLITE_PREFIX = "sqlite://"
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",     # WAL keeps this crash-safe; only the last commits can be lost on power loss
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-65536",      # 64 MB page cache
+    "PRAGMA mmap_size=268435456",
+    # Foreign keys stay off: MySQL's INSERT IGNORE skips rows that violate them, SQLite's OR IGNORE would not.
+)
+BUSY_TIMEOUT = 30.0
+# Upserts are rewritten to ON CONFLICT DO UPDATE without a conflict target, which needs SQLite 3.35.
+MIN_SQLITE_VERSION = (3, 35)
+STATEMENT_CACHE = 512
+INT64_MAX = 2 ** 63 - 1
+UINT64 = 2 ** 64
+
+# MySQL -> SQLite rewrites for the SQL this repo issues. Enough for its own
+# queries, not a general translator.
+_CREATE_TABLE = re.compile(r"CREATE\s+(?:TEMPORARY\s+)?TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?`?(\w+)`?", re.I)
+_TABLE_OPTIONS = re.compile(r"\)\s*ENGINE\s*=[^;]*;?\s*$", re.I | re.S)
+_COMMENT = re.compile(r"--[^\n]*")
+_CHARSET = re.compile(r"\s+(?:CHARACTER\s+SET|CHARSET)\s+\w+|\s+COLLATE\s+\w+", re.I)
+_AUTO_PK = re.compile(r"\b(?:BIG)?INT\s+AUTO_INCREMENT\s+PRIMARY\s+KEY", re.I)
+_UNSIGNED = re.compile(r"\bBIGINT\s+UNSIGNED\b", re.I)
+_TEXT_COLUMN = re.compile(r"\b(VARCHAR\(\d+\)|TEXT\b)", re.I)
+_INLINE_KEY = re.compile(r",\s*(UNIQUE\s+)?(?:KEY|INDEX)\s+`?(\w+)`?\s*\(((?:[^()]|\(\d+\))*)\)", re.I)
+_PREFIX_LENGTH = re.compile(r"\(\d+\)")
+_VALUES_REF = re.compile(r"\bVALUES\(\s*`?(\w+)`?\s*\)", re.I)
+_DML_REWRITES = (
+    (re.compile(r"\bINSERT\s+IGNORE\b", re.I), "INSERT OR IGNORE"),
+    (re.compile(r"\bDROP\s+TEMPORARY\s+TABLE\b", re.I), "DROP TABLE"),
+    (re.compile(r"\s+FOR\s+UPDATE(?:\s+SKIP\s+LOCKED)?\b", re.I), ""),
+    (re.compile(r"%s"), "?"),
+)
+_ON_DUPLICATE = re.compile(r"\bON\s+DUPLICATE\s+KEY\s+UPDATE\b", re.I)
+
+
+def _translate_create(sql):
+    table = _CREATE_TABLE.search(sql).group(1)
+    sql = _COMMENT.sub("", sql)
+    nocase = re.search(r"COLLATE\s*=\s*\w+_ci\b", sql, re.I)
+    sql = _TABLE_OPTIONS.sub(")", sql.strip())
+    # Text columns compare case-insensitively like the MySQL table collation,
+    # except columns that name their own collation.
+    lines = []
+    for line in sql.split("\n"):
+        explicit = re.search(r"\bCOLLATE\b", line, re.I)
+        line = _CHARSET.sub("", line)
+        lines.append(_TEXT_COLUMN.sub(r"\1 COLLATE NOCASE", line, count=1) if nocase and not explicit else line)
+    sql = "\n".join(lines)
+    sql = _AUTO_PK.sub("INTEGER PRIMARY KEY", sql)
+    sql = _UNSIGNED.sub("UINT64", sql)
+
+    indexes = []
+
+    def inline_key(match):
+        unique, name, columns = match.groups()
+        columns = _PREFIX_LENGTH.sub("", columns)
+        if unique:
+            return f", UNIQUE ({columns})"
+        indexes.append(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})")
+        return ""
+
+    return (_INLINE_KEY.sub(inline_key, sql), *indexes)
+
+
+@lru_cache(maxsize=1024)
+def translate(sql):
+    """The SQLite statements for one MySQL statement (CREATE TABLE may add CREATE INDEX statements)."""
+    if _CREATE_TABLE.match(sql.strip()):
+        return _translate_create(sql)
+    for pattern, replacement in _DML_REWRITES:
+        sql = pattern.sub(replacement, sql)
+    if _ON_DUPLICATE.search(sql):
+        head, updates = _ON_DUPLICATE.split(sql, maxsplit=1)
+        sql = head + " ON CONFLICT DO UPDATE SET " + _VALUES_REF.sub(r"excluded.\1", updates)
+    return (sql,)
+
+
+def _param(value):
+    # SQLite integers are signed 64-bit; BIGINT UNSIGNED values are stored wrapped and unwrapped by the UINT64 converter.
+    if type(value) is int and value > INT64_MAX:
+        return value - UINT64
+    return value
+
+
+def _params(params):
+    if params is None:
+        return ()
+    if isinstance(params, dict):
+        return {k: _param(v) for k, v in params.items()}
+    return tuple(_param(v) for v in params)
+
+
+def _dict_row(cursor, row):
+    return {column[0]: value for column, value in zip(cursor.description, row)}
+
+
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(" "))
+sqlite3.register_adapter(date, lambda value: value.isoformat())
+sqlite3.register_converter("DATETIME", lambda raw: datetime.fromisoformat(raw.decode()))
+sqlite3.register_converter("UINT64", lambda raw: int(raw) % UINT64)
+
+
+class SQLiteCursor:
+    """The parts of the mysql.connector cursor API this repo uses, over a sqlite3 cursor."""
+
+    def __init__(self, conn, dictionary=False):
+        self._cursor = conn.cursor()
+        if dictionary:
+            self._cursor.row_factory = _dict_row
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    def execute(self, sql, params=None):
+        statement, *extra = translate(sql)
+        self._cursor.execute(statement, _params(params))
+        for follow_up in extra:
+            self._cursor.execute(follow_up)
+        return self
+
+    def executemany(self, sql, seq_params):
+        statement, = translate(sql)
+        self._cursor.executemany(statement, (_params(p) for p in seq_params))
+        return self
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchmany(self, size=1):
+        return self._cursor.fetchmany(size)
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    def close(self):
+        self._cursor.close()
+
+
+class SQLiteConnection:
+    """
+    A SQLite database behind the mysql.connector connection API the helpers
+    call (cursor(dictionary=..., buffered=...), commit, rollback, close).
+    Statements are translated from the MySQL dialect once and then served
+    from sqlite3's per-connection prepared-statement cache; writes run in one
+    transaction until commit(), so batching code sets the transaction size.
+    """
+
+    backend = "sqlite"
+
+    def __init__(self, path):
+        if sqlite3.sqlite_version_info < MIN_SQLITE_VERSION:
+            raise RuntimeError(f"The SQLite backend needs SQLite {'.'.join(map(str, MIN_SQLITE_VERSION))} or newer; "
+                               f"this Python is linked against {sqlite3.sqlite_version}")
+        self.path = Path(path).expanduser()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Worker threads share the ingest writer's connection, as they do with MySQL.
+        self._conn = sqlite3.connect(str(self.path), timeout=BUSY_TIMEOUT, check_same_thread=False,
+                                     detect_types=sqlite3.PARSE_DECLTYPES, cached_statements=STATEMENT_CACHE)
+        for pragma in SQLITE_PRAGMAS:
+            self._conn.execute(pragma)
+        logger.info(f"Opened SQLite database {self.path}")
+
+    def cursor(self, dictionary=False, buffered=None, **kwargs):
+        return SQLiteCursor(self._conn, dictionary=dictionary)
+
+    def commit(self):
+        self._conn.commit()
+
+    def rollback(self):
+        self._conn.rollback()
+
+    def close(self):
+        self._conn.close()
+
+    def is_connected(self):
+        return True
+
+    def ping(self, reconnect=False, attempts=1, delay=0):
+        pass
+
+    def reconnect(self, attempts=1, delay=0):
+        pass
+
+    def config(self, **kwargs):
+        pass
+
+
+def is_sqlite(db_conn):
+    return getattr(db_conn, "backend", DEFAULT_BACKEND) == "sqlite"
+
+
+def connect_backend(backend=DEFAULT_BACKEND, config_file=None, config_section=None):
+    """
+    Open the database named by `backend`: "mysql" (the ~/.my.cnf section, as
+    before) or "sqlite:///path/to/media.sqlite".
+    """
+    if not backend or backend == "mysql":
+        from db_connection import connect_to_database
+        return connect_to_database(config_file, config_section)
+    if backend.startswith(SQLITE_PREFIX):
+        return SQLiteConnection(backend[len(SQLITE_PREFIX):])
+    raise ValueError(f"Unknown database backend '{backend}' (expected 'mysql' or 'sqlite:///path')")
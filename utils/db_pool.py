@@ -0,0 +1,210 @@
+# utils/db_pool.py
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from utils.db_backend import DEFAULT_BACKEND, connect_backend
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POOL_SIZE = 4
+PING_AFTER_IDLE = 30.0  # seconds a connection may sit unused before it is checked on checkout
+RECONNECT_ATTEMPTS = 3
+RECONNECT_DELAY = 1
+STATEMENT_CACHE_SIZE = 64
+
+
+class _CachedStatement:
+    """`with` support for a cached prepared cursor: leftover rows are drained instead of closing it."""
+
+    def __init__(self, cursor):
+        self.cursor = cursor
+
+    def __enter__(self):
+        return self.cursor
+
+    def __exit__(self, *exc):
+        try:
+            if getattr(self.cursor, "with_rows", False):
+                self.cursor.fetchall()
+        except Exception:
+            pass
+
+
+class PooledConnection:
+    """
+    A backend connection handed out by ConnectionManager. Anything not
+    defined here is forwarded to the underlying connection, so helpers use
+    it exactly like a plain connection. Autocommit is off, so the caller's
+    commit() sets the transaction boundaries.
+    """
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.last_used = time.monotonic()
+        self._statements = {}
+        self._set_autocommit()
+
+    def __getattr__(self, name):
+        return getattr(self.raw, name)
+
+    def _set_autocommit(self):
+        try:
+            self.raw.autocommit = False
+        except Exception as e:
+            logger.debug(f"Could not switch autocommit off: {e}")
+
+    def prepared(self, sql):
+        """
+        A cursor bound to one server-side prepared statement for `sql`,
+        cached on this connection; use it as `with conn.prepared(sql) as cur:
+        cur.execute(sql, params)`. SQLite already caches compiled statements,
+        so there it is a plain cursor.
+        """
+        if getattr(self.raw, "backend", DEFAULT_BACKEND) == "sqlite":
+            return self.raw.cursor()
+        cursor = self._statements.get(sql)
+        if cursor is None:
+            if len(self._statements) >= STATEMENT_CACHE_SIZE:
+                self._close_statements()
+            cursor = self._statements[sql] = self.raw.cursor(prepared=True)
+        return _CachedStatement(cursor)
+
+    def _close_statements(self):
+        for cursor in self._statements.values():
+            try:
+                cursor.close()
+            except Exception:
+                pass
+        self._statements.clear()
+
+    def check(self):
+        """Make sure the server is still there after an idle spell, reconnecting if it dropped us."""
+        if time.monotonic() - self.last_used >= PING_AFTER_IDLE:
+            try:
+                self.raw.ping(reconnect=False)
+            except Exception as e:
+                logger.warning(f"Database connection was lost ({e}); reconnecting")
+                self.reconnect(attempts=RECONNECT_ATTEMPTS, delay=RECONNECT_DELAY)
+        self.last_used = time.monotonic()
+
+    def reconnect(self, attempts=1, delay=0):
+        # Server-side statements and session settings do not survive a reconnect.
+        self._statements.clear()
+        self.raw.reconnect(attempts=attempts, delay=delay)
+        self._set_autocommit()
+
+    def reset(self):
+        """Roll back anything left uncommitted before the connection goes back to the pool."""
+        try:
+            self.raw.rollback()
+        except Exception as e:
+            logger.debug(f"Rollback on release failed: {e}")
+        self.last_used = time.monotonic()
+
+    def close(self):
+        self._close_statements()
+        self.raw.close()
+
+
+class ConnectionManager:
+    """
+    Pool of up to `size` connections to one backend, one per thread: a
+    thread keeps the connection it checked out until it releases it, so a
+    phase that runs on the main thread reuses the same connection as the
+    next one, and worker threads each get their own.
+    """
+
+    def __init__(self, backend=DEFAULT_BACKEND, config_file=None, config_section=None, size=DEFAULT_POOL_SIZE):
+        self.backend = backend
+        self.config_file = config_file
+        self.config_section = config_section
+        self.size = max(1, size)
+        self._idle = []
+        self._open = 0
+        self._local = threading.local()
+        self._cond = threading.Condition()
+
+    def connection(self):
+        """
+        The calling thread's connection, checking one out (or opening one) on
+        first use. A connection not asked for in a while is health-checked
+        first, so a long-lived thread should call this again at the start of
+        each phase rather than keep its first result.
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.check()
+            return conn
+        with self._cond:
+            while not self._idle and self._open >= self.size:
+                self._cond.wait()
+            if self._idle:
+                conn = self._idle.pop()
+            else:
+                self._open += 1
+        if conn is None:
+            try:
+                conn = PooledConnection(connect_backend(self.backend, self.config_file, self.config_section))
+            except Exception:
+                with self._cond:
+                    self._open -= 1
+                    self._cond.notify()
+                raise
+            logger.debug(f"Opened pooled database connection {self._open}/{self.size}")
+        else:
+            conn.check()
+        self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def session(self):
+        """The calling thread's connection for a `with` block, released at the end only if the block checked it out."""
+        held = getattr(self._local, "conn", None) is not None
+        conn = self.connection()
+        try:
+            yield conn
+        finally:
+            if not held:
+                self.release()
+
+    def release(self):
+        """Return the calling thread's connection to the pool."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            return
+        self._local.conn = None
+        conn.reset()
+        with self._cond:
+            self._idle.append(conn)
+            self._cond.notify()
+
+    def close_all(self):
+        self.release()
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._open -= len(idle)
+        for conn in idle:
+            try:
+                conn.close()
+            except Exception as e:
+                logger.debug(f"Closing pooled connection failed: {e}")
+
+
+def prepared(db_conn, sql):
+    """A cursor for `sql` on a cached prepared statement when `db_conn` is pooled, else a plain cursor."""
+    get = getattr(db_conn, "prepared", None)
+    return get(sql) if get is not None else db_conn.cursor()
+
+
+def dict_rows(cursor):
+    """The remaining rows of `cursor` as dicts; prepared cursors have no dictionary=True."""
+    names = [column[0] for column in cursor.description]
+    return [dict(zip(names, row)) for row in cursor.fetchall()]
+
+
+def bucket(n):
+    """`n` rounded up to a power of two, so variable-length IN lists reuse a handful of prepared statements."""
+    return 1 << max(0, n - 1).bit_length()
@@ -0,0 +1,164 @@
+# utils/exiftool_batch.py
+
+import codecs
+import json
+import os
+
+from utils.exiftool_pool import ExifToolError, get_pool
+from utils.metadata_cache import get_cache
+
+DEFAULT_CHUNK_FILES = 200
+DEFAULT_CHUNK_BYTES = 1024 ** 3  # total size of the files handed to one exiftool call
+PER_FILE_TIMEOUT = 2
+
+
+def iter_json_array(chunks):
+    """
+    Incrementally decode a top-level JSON array from an iterable of byte chunks,
+    yielding each element as soon as it is complete.
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    buf = ""
+    pos = 0
+    started = False
+    chunks = iter(chunks)
+    exhausted = False
+
+    while True:
+        # Skip separators between elements.
+        while pos < len(buf) and buf[pos] in " \t\r\n,":
+            pos += 1
+        if pos < len(buf):
+            if not started:
+                if buf[pos] != "[":
+                    raise json.JSONDecodeError("Expected '['", buf, pos)
+                started = True
+                pos += 1
+                continue
+            if buf[pos] == "]":
+                return
+            try:
+                item, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if exhausted:
+                    raise
+            else:
+                yield item
+                buf, pos = buf[end:], 0
+                continue
+
+        if exhausted:
+            if started:
+                raise json.JSONDecodeError("Unterminated array", buf, pos)
+            return
+
+        try:
+            buf = buf[pos:] + utf8.decode(next(chunks))
+        except StopIteration:
+            buf = buf[pos:] + utf8.decode(b"", final=True)
+            exhausted = True
+        pos = 0
+
+
+def _run_chunk(chunk, args, logger, timeout):
+    """
+    Yield (path, metadata) for one exiftool call covering every path in `chunk`.
+
+    The whole response is read before the first yield, so the pool worker is
+    back in the pool (and the timeout stops counting) while the caller handles
+    the results; callers may run exiftool themselves in the meantime.
+    """
+    wanted = {path: path for path in chunk}
+    wanted.update({os.path.normpath(path): path for path in chunk})
+
+    output = b"".join(get_pool().stream(args + list(chunk), timeout=timeout))
+    for metadata in iter_json_array([output]):
+        source = metadata.get("SourceFile", "")
+        path = wanted.pop(source, None) or wanted.pop(os.path.normpath(source), None)
+        if path is None:
+            logger.debug(f"ExifTool returned metadata for unexpected file: {source}")
+            continue
+        yield path, metadata
+
+
+def _extract_chunk(chunk, args, logger, cache, stats):
+    """Yield (path, metadata) for a chunk, isolating files if the chunk fails."""
+    logger.debug(f"Running exiftool on a chunk of {len(chunk)} file(s)")
+    done = set()
+    try:
+        for path, metadata in _run_chunk(chunk, args, logger,
+                                         get_pool().timeout + PER_FILE_TIMEOUT * len(chunk)):
+            done.add(path)
+            if cache is not None:
+                cache.put(path, metadata, stats.get(path))
+            yield path, metadata
+    except (ExifToolError, json.JSONDecodeError) as e:
+        remaining = [path for path in chunk if path not in done]
+        logger.warning(f"ExifTool chunk failed ({e}); retrying {len(remaining)} file(s) individually")
+        for path in remaining:
+            try:
+                result = dict(_run_chunk([path], args, logger, None))
+            except (ExifToolError, json.JSONDecodeError) as e:
+                logger.warning(f"ExifTool failed for {path}: {e}")
+                result = {}
+            done.add(path)
+            if cache is not None and path in result:
+                cache.put(path, result[path], stats.get(path))
+            yield path, result.get(path, {})
+        return
+
+    for path in chunk:
+        if path not in done:
+            logger.warning(f"ExifTool returned no metadata for {path}")
+            yield path, {}
+
+
+def extract_metadata_batch(paths, logger, tags=None, chunk_files=DEFAULT_CHUNK_FILES,
+                           chunk_bytes=DEFAULT_CHUNK_BYTES):
+    """
+    Extract metadata for many files with one exiftool call per chunk.
+
+    `paths` may hold path strings or os.DirEntry objects from utils.scanner.
+    Yields (path, metadata) pairs a chunk at a time. Files exiftool
+    reports nothing for get an empty dict. If a chunk fails part-way (crash,
+    timeout, bad JSON) the files it had not answered yet are retried one at a
+    time so a single bad file cannot sink the rest of the chunk.
+
+    When the metadata cache is enabled every file gets the same full
+    extraction regardless of `tags`, and files already in the cache are
+    answered from it without running exiftool.
+    """
+    cache = get_cache()
+    args = ["-j"]
+    if cache is None:
+        args += [f"-{tag}" for tag in (tags or [])]
+
+    chunk, stats, total = [], {}, 0
+    for path in paths:
+        entry = path if isinstance(path, os.DirEntry) else None
+        if entry is not None:
+            path = entry.path
+        try:
+            # A DirEntry keeps its stat result, so a scan that already stat'ed it is not repeated.
+            st = entry.stat() if entry is not None else os.stat(path)
+        except OSError:
+            # Removed since it was scanned; exiftool reports nothing for it.
+            st = None
+
+        if cache is not None and st is not None:
+            metadata = cache.get(path, st)
+            if metadata is not None:
+                yield path, metadata
+                continue
+
+        size = st.st_size if st is not None else 0
+        if chunk and (len(chunk) >= chunk_files or total + size > chunk_bytes):
+            yield from _extract_chunk(chunk, args, logger, cache, stats)
+            chunk, stats, total = [], {}, 0
+        chunk.append(path)
+        stats[path] = st
+        total += size
+
+    if chunk:
+        yield from _extract_chunk(chunk, args, logger, cache, stats)
@@ -0,0 +1,247 @@
+# utils/exiftool_pool.py
+
+import atexit
+import itertools
+import logging
+import os
+import queue
+import select
+import subprocess
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+EXIFTOOL_CMD = "exiftool"
+DEFAULT_TIMEOUT = 120
+DEFAULT_WORKERS = min(4, os.cpu_count() or 1)
+
+
+class ExifToolError(RuntimeError):
+    pass
+
+
+class ExifToolTimeout(ExifToolError):
+    pass
+
+
+class ExifToolWorker:
+    """
+    One long-lived `exiftool -stay_open True -@ -` process.
+
+    Requests are framed with numbered markers: every argument goes on its own
+    line, followed by `-echo4 {readyN}` (printed to stderr once the command is
+    done) and `-execute{N}` (which makes exiftool print `{readyN}` on stdout).
+    A response is complete once both markers have been seen.
+    """
+
+    def __init__(self, executable=EXIFTOOL_CMD):
+        self.executable = executable
+        self.proc = None
+        self.last_stderr = ""
+        self._seq = itertools.count(1)
+
+    def alive(self):
+        return self.proc is not None and self.proc.poll() is None
+
+    def start(self):
+        self.proc = subprocess.Popen(
+            [self.executable, "-stay_open", "True", "-@", "-"],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+            bufsize=0,
+        )
+        logger.debug(f"Started exiftool worker pid={self.proc.pid}")
+
+    def stop(self, timeout=5):
+        if self.proc is None:
+            return
+        proc, self.proc = self.proc, None
+        try:
+            if proc.poll() is None:
+                proc.stdin.write(b"-stay_open\nFalse\n")
+                proc.stdin.flush()
+                proc.wait(timeout=timeout)
+        except Exception as e:
+            logger.debug(f"exiftool worker pid={proc.pid} did not exit cleanly: {e}")
+        finally:
+            if proc.poll() is None:
+                proc.kill()
+                proc.wait()
+            for stream in (proc.stdin, proc.stdout, proc.stderr):
+                try:
+                    stream.close()
+                except Exception:
+                    pass
+
+    def stream(self, args, timeout=DEFAULT_TIMEOUT):
+        """
+        Run one exiftool command, yielding raw stdout chunks as they arrive.
+
+        stderr for the request is left in `last_stderr` once the generator is
+        exhausted. If the caller abandons the generator early the worker is
+        stopped, since its pipes would otherwise be out of sync.
+        """
+        if not self.alive():
+            self.start()
+
+        if any("\n" in str(arg) for arg in args):
+            raise ExifToolError(f"exiftool arguments cannot contain newlines: {args!r}")
+
+        seq = next(self._seq)
+        marker = b"{ready%d}" % seq
+        request = "".join(f"{arg}\n" for arg in args)
+        request += f"-echo4\n{{ready{seq}}}\n-execute{seq}\n"
+
+        try:
+            self.proc.stdin.write(request.encode("utf-8"))
+            self.proc.stdin.flush()
+        except (BrokenPipeError, OSError) as e:
+            self.stop()
+            raise ExifToolError(f"exiftool worker died before request: {e}")
+
+        out_fd = self.proc.stdout.fileno()
+        err_fd = self.proc.stderr.fileno()
+        out = bytearray()
+        err = bytearray()
+        pending = {out_fd, err_fd}
+        deadline = time.monotonic() + timeout if timeout else None
+        hold = len(marker) + 1
+        completed = False
+
+        try:
+            while pending:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise ExifToolTimeout(f"exiftool timed out after {timeout}s: {' '.join(map(str, args))}")
+
+                readable, _, _ = select.select(list(pending), [], [], remaining)
+                for fd in readable:
+                    chunk = os.read(fd, 65536)
+                    if not chunk:
+                        raise ExifToolError("exiftool worker exited unexpectedly")
+                    if fd == err_fd:
+                        err += chunk
+                        if marker in err:
+                            pending.discard(err_fd)
+                        continue
+
+                    out += chunk
+                    end = out.find(marker)
+                    if end >= 0:
+                        pending.discard(out_fd)
+                        if end:
+                            yield bytes(out[:end])
+                        out.clear()
+                    elif len(out) > hold:
+                        # Hold back enough bytes to catch a marker split across reads.
+                        yield bytes(out[:-hold])
+                        del out[:-hold]
+            completed = True
+        finally:
+            if not completed:
+                self.stop(timeout=0)
+
+        self.last_stderr = bytes(err[:err.rindex(marker)]).decode("utf-8", errors="replace")
+
+    def execute(self, args, timeout=DEFAULT_TIMEOUT):
+        """Run one exiftool command and return (stdout, stderr) as text."""
+        out = b"".join(self.stream(args, timeout=timeout))
+        return out.decode("utf-8", errors="replace"), self.last_stderr
+
+
+class ExifToolPool:
+    """A fixed-size set of ExifToolWorkers shared between threads."""
+
+    def __init__(self, size=DEFAULT_WORKERS, executable=EXIFTOOL_CMD, timeout=DEFAULT_TIMEOUT):
+        self.size = max(1, int(size))
+        self.timeout = timeout
+        self._workers = [ExifToolWorker(executable) for _ in range(self.size)]
+        self._idle = queue.LifoQueue()
+        for worker in self._workers:
+            self._idle.put(worker)
+
+    def execute(self, args, timeout=None, retries=1):
+        """
+        Run `args` on the next idle worker and return its stdout as text.
+
+        A worker that crashes is restarted and the request retried up to
+        `retries` times; timeouts are not retried.
+        """
+        timeout = timeout or self.timeout
+        worker = self._idle.get()
+        try:
+            for attempt in range(retries + 1):
+                try:
+                    out, err = worker.execute(args, timeout=timeout)
+                    if err.strip():
+                        logger.debug(f"exiftool stderr: {err.strip()}")
+                    return out
+                except ExifToolTimeout:
+                    raise
+                except ExifToolError as e:
+                    if attempt >= retries:
+                        raise
+                    logger.warning(f"Restarting exiftool worker after failure: {e}")
+        finally:
+            self._idle.put(worker)
+
+    def stream(self, args, timeout=None):
+        """
+        Yield stdout chunks (bytes) for one command as they are produced.
+
+        The worker stays checked out, and the timeout keeps running, until the
+        generator is exhausted or closed, so consume it without doing other
+        work (least of all running exiftool) between chunks. Failures are not
+        retried here because part of the output may already have been consumed.
+        """
+        timeout = timeout or self.timeout
+        worker = self._idle.get()
+        try:
+            yield from worker.stream(args, timeout=timeout)
+            if worker.last_stderr.strip():
+                logger.debug(f"exiftool stderr: {worker.last_stderr.strip()}")
+        finally:
+            self._idle.put(worker)
+
+    def close(self):
+        for worker in self._workers:
+            worker.stop()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def configure_pool(workers=DEFAULT_WORKERS, timeout=DEFAULT_TIMEOUT, executable=EXIFTOOL_CMD):
+    """(Re)create the shared pool used by every metadata reader and writer."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+        _pool = ExifToolPool(workers, executable=executable, timeout=timeout)
+        logger.debug(f"Configured exiftool pool with {_pool.size} worker(s)")
+        return _pool
+
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ExifToolPool()
+        return _pool
+
+
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+
+def run_exiftool(args, timeout=None):
+    """Convenience wrapper: run one exiftool command on the shared pool."""
+    return get_pool().execute(list(args), timeout=timeout)
+
+
+atexit.register(shutdown_pool)
@@ -1,12 +1,19 @@
 import os
 import re
-import subprocess
 from datetime import datetime
 from pathlib import Path
 import getpass
-# Import db-backed processor skip logic if needed
-from db_connection import is_processed  # Optional — depends on integration
-from metadata_parser import extract_datetimes, select_oldest_datetime
+# Bulk-loaded processed set replaces per-file db_connection.is_processed lookups
+from utils.processed_index import ProcessedIndex
+from metadata_parser import EXIFTOOL_FIELDS, datetimes_from_metadata, select_oldest_datetime
+from utils.exiftool_pool import run_exiftool
+from utils.exiftool_batch import extract_metadata_batch
+from utils.metadata_cache import get_cache
+from utils.scanner import scan_files
+from utils.scan_journal import get_journal
+from utils.file_transfer import ensure_dir, transfer_file_multi
+from utils.date_writeback import DateWriteBack, DEFAULT_WRITE_BATCH, dates_to_write, exif_date
+from utils.transfer_scheduler import TransferScheduler, DEFAULT_PER_DEVICE
 import logging
 import argparse
 
@@ -26,9 +33,8 @@ def extract_create_date(file_path):
 
     # ExifTool fallback
     try:
-        result = subprocess.run(["exiftool", "-CreateDate", file_path],
-                                capture_output=True, text=True, check=True)
-        line = result.stdout.strip().split(": ", 1)[-1].split()[0]
+        stdout = run_exiftool(["-CreateDate", file_path])
+        line = stdout.strip().split(": ", 1)[-1].split()[0]
         cleaned = line.replace(":", "-", 2)
         return datetime.strptime(cleaned, "%Y-%m-%d").date()
     except Exception:
@@ -38,7 +44,30 @@ def is_tiktok(file_path):
     base = os.path.basename(file_path)
     return len(base) == 32 and base.isalnum()
 
-def move_file(file_path, target_base, date=None, dry_run=False, verbose=False, remove=False):
+def _exif_datetime(date):
+    """Format a local midnight on `date` the way exiftool prints it."""
+    midnight = datetime(date.year, date.month, date.day).astimezone()
+    offset = midnight.strftime("%z")
+    return midnight.strftime("%Y:%m:%d %H:%M:%S") + f"{offset[:3]}:{offset[3:]}"
+
+def _cache_moved_metadata(target_file, date, tags_written, sidecar, metadata):
+    """
+    Record what the moved file now looks like so the next reader of it (e.g. a
+    later ingest run) is answered from the metadata cache instead of exiftool.
+    Called by DateWriteBack once the file's dates are final.
+    """
+    cache = get_cache()
+    if cache is None or not metadata or tags_written is None:
+        return
+    updated = dict(metadata)
+    if not sidecar:
+        for tag in tags_written:
+            updated[tag] = exif_date(date)
+    updated["FileModifyDate"] = _exif_datetime(date)
+    cache.put(str(target_file), updated)
+
+def move_file(file_path, target_base, date=None, dry_run=False, verbose=False, remove=False, metadata=None,
+              use_rsync=False, writeback=None):
     """
     date = extract_create_date(file_path)
     if not date:
@@ -49,30 +78,39 @@ def move_file(file_path, target_base, date=None, dry_run=False, verbose=False, r
         if verbose: print(f"[SKIP] move_file called without valid date: {file_path}")
         return
 
-    target_dir = Path(target_base) / str(date)
-    target_dir.mkdir(parents=True, exist_ok=True)
+    # `target_base` may be a list of bases (--target both): the file is read once and written to each.
+    bases = target_base if isinstance(target_base, (list, tuple)) else [target_base]
     filename = os.path.basename(file_path)
-    target_file = target_dir / filename
-
-    if target_file.exists():
-        if verbose: print(f"[SKIP] Already exists in {target_dir}: {filename}")
+    target_files = []
+    for base in bases:
+        target_dir = Path(base) / str(date)
+        print(f"{'[DRY_RUN]' if dry_run else '[MOVE]'} {file_path} → {target_dir}")
+        if dry_run:
+            continue
+        ensure_dir(target_dir)
+        if os.path.lexists(target_dir / filename):
+            if verbose: print(f"[SKIP] Already exists in {target_dir}: {filename}")
+            continue
+        target_files.append(target_dir / filename)
+
+    if not target_files:
         return
 
-    rsync_cmd = ["rsync", "-rltD"]
-    if not dry_run and remove:
-        rsync_cmd.append("--remove-source-files")
-
-    rsync_cmd += [file_path, str(target_dir)]
-
-    print(f"{'[DRY_RUN]' if dry_run else '[MOVE]'} {file_path} → {target_dir}")
-    subprocess.run(rsync_cmd)
+    try:
+        # The lexists checks above are only a shortcut: concurrent moves can race for the same name, and
+        # the transfer itself never replaces an existing file.
+        written = transfer_file_multi(file_path, target_files, remove=remove, use_rsync=use_rsync)
+    except FileExistsError:
+        if verbose: print(f"[SKIP] Already exists: {filename}")
+        return
 
-    if not dry_run:
-        subprocess.run(["exiftool",
-                        f"-CreateDate={date}", f"-ModifyDate={date}", f"-DateTimeOriginal={date}",
-                        "-overwrite_original", str(target_file)],
-                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-        subprocess.run(["touch", "-d", str(date), str(target_file)])
+    # Dates already right in the extracted metadata are not rewritten; the rest
+    # are written by `writeback` in batches (immediately without one).
+    if writeback is None:
+        writeback = DateWriteBack(batch_size=1, on_written=_cache_moved_metadata)
+    target_files = [Path(t) for t in written]
+    writeback.add(target_files, date, dates_to_write(metadata, date), metadata)
+    return target_files
 
 import getpass
 
@@ -147,44 +185,136 @@ def resolve_target(file_path, mode="local"):
 
     return None
 
-def process_sources(sources, mode="local", dry_run=False, verbose=False, debug=False, db_conn=None, remove=False):
-    if not sources:
-        print("No media sources provided.")
-        return
+def resolve_targets(file_path, mode="local"):
+    """Target bases for `file_path`; mode "both" gives the local and the remote one."""
+    modes = ("local", "remote") if mode == "both" else (mode,)
+    return [base for base in (resolve_target(file_path, mode=m) for m in modes) if base]
 
-    for source in sources:
-        print(f"\n🔍 Scanning: {source}")
-        for root, dirs, files in os.walk(source):
-            # 🔒 Skip hidden directories (those starting with '.')
-            dirs[:] = [d for d in dirs if not d.startswith(".")]
-
-            for name in files:
-                if name.startswith("."):
-                    if verbose: print(f"[SKIP] Hidden file: {name}")
+def move_files(file_paths, mode="local", dry_run=False, verbose=False, processed=None, use_rsync=False,
+               per_device=DEFAULT_PER_DEVICE, date_write_batch=DEFAULT_WRITE_BATCH, sidecar_min_bytes=None,
+               db_conn=None, content_index=None):
+    """
+    Move each file into its dated target folder(s). `file_paths` may be paths
+    or DirEntry objects; moved files are added to `processed`. Returns the
+    paths whose transfer raised an error; files skipped because their target
+    already exists do not count as failed.
+
+    Metadata extraction runs ahead while a TransferScheduler copies files, at
+    most `per_device` at a time per destination device. Date write-back is
+    batched across files; videos of at least `sidecar_min_bytes` get an XMP
+    sidecar instead. With a `content_index`, files whose content is already
+    indexed are skipped and the copies made are added to it.
+    """
+    failed = set()
+    in_flight = {}  # source path -> future of its transfer, until it succeeds
+    writeback = DateWriteBack(batch_size=date_write_batch, sidecar_min_bytes=sidecar_min_bytes,
+                              on_written=_cache_moved_metadata)
+
+    def finished(file_path, entry):
+        def callback(future):
+            if future.exception() is not None:
+                print(f"❌ Transfer failed for {file_path}: {future.exception()}")
+                failed.add(file_path)
+            elif future.result():
+                in_flight.pop(file_path, None)
+                if processed is not None:
+                    processed.add(file_path)
+                if content_index is not None and entry is not None:
+                    for target_file in future.result():
+                        content_index.add(str(target_file), entry)
+        return callback
+
+    def duplicate_of(file_path):
+        # A copy of a file still being transferred counts as done only once that transfer has succeeded.
+        def callback(future):
+            if future.exception() is not None:
+                failed.add(file_path)
+            elif future.result() and processed is not None:
+                processed.add(file_path)
+        return callback
+
+    with TransferScheduler(per_device=per_device) as scheduler:
+        # 🧠 Pull all known date fields via ExifTool, a chunk of files per call
+        for file_path, metadata in extract_metadata_batch(file_paths, logger, tags=EXIFTOOL_FIELDS):
+            target_bases = resolve_targets(file_path, mode=mode)
+            if not target_bases:
+                if verbose: print(f"[SKIP] Unknown target for: {file_path}")
+                continue
+
+            date_map = datetimes_from_metadata(metadata, logger)
+            best_date = select_oldest_datetime(date_map, logger, filename=os.path.basename(file_path))
+
+            if not best_date:
+                if verbose: print(f"[SKIP] No valid date extracted for: {file_path}")
+                continue
+
+            try:
+                size = os.path.getsize(file_path)
+            except OSError:
+                size = 0
+
+            entry = None
+            if content_index is not None:
+                duplicate, entry = content_index.find_duplicate(db_conn, file_path, size, logger=logger)
+                if duplicate:
+                    if verbose: print(f"[SKIP] Same content already at {duplicate}: {file_path}")
+                    first = in_flight.get(duplicate)
+                    if first is not None:
+                        first.add_done_callback(duplicate_of(file_path))
+                    elif processed is not None:
+                        processed.add(file_path)
                     continue
 
-                file_path = os.path.join(root, name)
+            # 🗂️ Move using best date
+            future = scheduler.submit(move_file, file_path, target_bases, size=size, targets=target_bases,
+                                      date=best_date.date(), dry_run=dry_run, verbose=verbose, remove=False,
+                                      metadata=metadata, use_rsync=use_rsync, writeback=writeback)
+            in_flight[file_path] = future
+            future.add_done_callback(finished(file_path, entry))
+    writeback.flush()
+    if content_index is not None:
+        content_index.flush(db_conn, logger)
+    return failed
+
+def process_sources(sources, mode="local", dry_run=False, verbose=False, debug=False, db_conn=None, remove=False,
+                    processed=None, full_rescan=False, use_rsync=False, per_device=DEFAULT_PER_DEVICE,
+                    date_write_batch=DEFAULT_WRITE_BATCH, sidecar_min_bytes=None, content_index=None):
+    if not sources:
+        print("No media sources provided.")
+        return
 
-                if db_conn and is_processed(db_conn, file_path):
-                    if verbose: print(f"[SKIP] Already processed: {file_path}")
-                    continue
+    if processed is None:
+        processed = ProcessedIndex.load(db_conn, logger)
 
-                target_base = resolve_target(file_path, mode=mode)
-                if not target_base:
-                    if debug: print(f"[SKIP] Unknown target for: {file_path}")
-                    continue
+    journal = get_journal()
+    scan = journal.begin(f"move:{mode}", full_rescan) if journal is not None else None
+    failed = set()
 
-                # 🧠 Pull all known date fields via ExifTool
-                date_map = extract_datetimes(file_path, logger)
-                #best_date = select_oldest_datetime(date_map, logger, filename=name)
+    def candidates(source):
+        # 🔒 Hidden directories (those starting with '.') are never entered
+        for entry in scan_files(source, skip_hidden_dirs=True, journal=scan):
+            if entry.name.startswith("."):
+                if verbose: print(f"[SKIP] Hidden file: {entry.name}")
+                continue
 
-                best_date = select_oldest_datetime(date_map, logger, filename=os.path.basename(file_path))
+            if entry.path in processed:
+                if verbose: print(f"[SKIP] Already processed: {entry.path}")
+                continue
 
-                if not best_date:
-                    if verbose: print(f"[SKIP] No valid date extracted for: {file_path}")
-                    continue
+            if not resolve_targets(entry.path, mode=mode):
+                if debug: print(f"[SKIP] Unknown target for: {entry.path}")
+                continue
 
-                # 🗂️ Move using best date
-                target_dir = Path(resolve_target(file_path, mode=mode)) / best_date.date().isoformat()
-                move_file(file_path, target_base, date=best_date.date(), dry_run=dry_run, verbose=verbose, remove=False)
+            yield entry
 
+    for source in sources:
+        print(f"\n🔍 Scanning: {source}")
+        failed.update(move_files(candidates(source), mode=mode, dry_run=dry_run, verbose=verbose,
+                                 processed=processed, use_rsync=use_rsync, per_device=per_device,
+                                 date_write_batch=date_write_batch, sidecar_min_bytes=sidecar_min_bytes,
+                                 db_conn=db_conn, content_index=content_index))
+
+    processed.flush(db_conn, logger)
+    if scan is not None and not dry_run:
+        # Files that failed to move are offered again on the next run.
+        scan.commit(keep=lambda path: path not in failed)
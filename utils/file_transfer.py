@@ -0,0 +1,232 @@
+# utils/file_transfer.py
+
+import errno
+import os
+import shutil
+import subprocess
+import threading
+from datetime import datetime
+
+COPY_CHUNK = 64 * 1024 * 1024
+
+_made_dirs = set()
+_made_dirs_lock = threading.Lock()
+_publish_lock = threading.Lock()
+# Filesystems that refuse hard links (FAT, some SMB mounts)
+NO_LINK_ERRNOS = (errno.EPERM, errno.EOPNOTSUPP, errno.ENOTSUP, errno.EMLINK)
+
+
+def ensure_dir(path):
+    """mkdir -p, done once per directory for the life of the process."""
+    path = os.fspath(path)
+    if path in _made_dirs:
+        return
+    os.makedirs(path, exist_ok=True)
+    with _made_dirs_lock:
+        _made_dirs.add(path)
+
+
+def _copy_range(src_fd, dst_fd, size):
+    """Copy `size` bytes in the kernel: copy_file_range (reflinks where supported), then sendfile."""
+    copied = 0
+    use_copy_file_range = hasattr(os, "copy_file_range")
+    while copied < size:
+        count = min(COPY_CHUNK, size - copied)
+        n = 0
+        if use_copy_file_range:
+            try:
+                n = os.copy_file_range(src_fd, dst_fd, count)
+            except OSError as e:
+                if e.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.EPERM):
+                    raise
+                use_copy_file_range = False
+                continue
+        else:
+            n = os.sendfile(dst_fd, src_fd, None, count)
+        if n == 0:
+            break
+        copied += n
+    return copied
+
+
+def _publish(path, dst):
+    """
+    Give the file at `path` the name `dst` without replacing an existing `dst`
+    (FileExistsError then): a hard link plus unlink of `path`. Where the
+    filesystem has no hard links, the check and rename are serialized within
+    the process instead.
+    """
+    try:
+        os.link(path, dst)
+    except OSError as e:
+        if e.errno not in NO_LINK_ERRNOS:
+            raise
+        with _publish_lock:
+            if os.path.lexists(dst):
+                raise FileExistsError(errno.EEXIST, "File exists", dst)
+            os.rename(path, dst)
+        return
+    os.unlink(path)
+
+
+def copy_file(src, dst):
+    """
+    Copy `src` to `dst` via a hidden temp file in the target directory, fsync
+    it and publish it under `dst`, so `dst` never exists half-written and an
+    existing `dst` is never replaced (FileExistsError).
+    """
+    src, dst = os.fspath(src), os.fspath(dst)
+    target_dir = os.path.dirname(dst)
+    tmp = _temp_name(dst)
+    try:
+        with open(src, "rb") as fsrc, open(tmp, "xb") as fdst:
+            st = os.fstat(fsrc.fileno())
+            try:
+                copied = _copy_range(fsrc.fileno(), fdst.fileno(), st.st_size)
+            except OSError:
+                copied = -1
+            if copied != st.st_size:
+                # Neither syscall works for this pair of filesystems.
+                fsrc.seek(0)
+                fdst.seek(0)
+                fdst.truncate()
+                shutil.copyfileobj(fsrc, fdst, COPY_CHUNK)
+            fdst.flush()
+            os.fsync(fdst.fileno())
+        os.utime(tmp, ns=(st.st_atime_ns, st.st_mtime_ns))
+        _publish(tmp, dst)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+    _fsync_dir(target_dir)
+
+
+def _temp_name(dst):
+    target_dir, name = os.path.split(dst)
+    return os.path.join(target_dir, f".{name}.part-{os.getpid()}-{threading.get_ident()}")
+
+
+def copy_file_multi(src, dsts):
+    """
+    Copy `src` to several destinations with a single read of the source: each
+    chunk read is written to every destination's temp file, which are then
+    fsynced and published as in copy_file. Returns the destinations written;
+    ones that already existed are left alone.
+    """
+    src, dsts = os.fspath(src), [os.fspath(d) for d in dsts]
+    tmps = [_temp_name(d) for d in dsts]
+    outs = []
+    written = []
+    try:
+        with open(src, "rb") as fsrc:
+            st = os.fstat(fsrc.fileno())
+            for tmp in tmps:
+                outs.append(open(tmp, "xb"))
+            while True:
+                chunk = fsrc.read(COPY_CHUNK // 8)
+                if not chunk:
+                    break
+                for out in outs:
+                    out.write(chunk)
+            for out in outs:
+                out.flush()
+                os.fsync(out.fileno())
+                out.close()
+        for tmp, dst in zip(tmps, dsts):
+            os.utime(tmp, ns=(st.st_atime_ns, st.st_mtime_ns))
+            try:
+                _publish(tmp, dst)
+                written.append(dst)
+            except FileExistsError:
+                os.unlink(tmp)
+    except BaseException:
+        for out in outs:
+            out.close()
+        for tmp in tmps:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+        raise
+    for target_dir in {os.path.dirname(d) for d in written}:
+        _fsync_dir(target_dir)
+    return written
+
+
+def _fsync_dir(path):
+    try:
+        fd = os.open(path or ".", os.O_RDONLY | os.O_DIRECTORY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def transfer_file(src, dst, remove=False, use_rsync=False):
+    """
+    Move (`remove=True`) or copy `src` to the full path `dst`.
+
+    Moves within one filesystem are a rename. Everything else is an
+    in-kernel copy via copy_file_range/sendfile, with the source unlinked
+    afterwards for moves. With `use_rsync` the old rsync subprocess is used.
+    An existing `dst` is never replaced: FileExistsError is raised and the
+    source is kept.
+    """
+    src, dst = os.fspath(src), os.fspath(dst)
+    if use_rsync:
+        if os.path.lexists(dst):
+            raise FileExistsError(errno.EEXIST, "File exists", dst)
+        cmd = ["rsync", "-rltD", "--ignore-existing"]
+        if remove:
+            cmd.append("--remove-source-files")
+        subprocess.run(cmd + [src, dst], check=True)
+        return [dst]
+
+    if remove:
+        try:
+            _publish(src, dst)
+            return [dst]
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+    copy_file(src, dst)
+    if remove:
+        os.unlink(src)
+    return [dst]
+
+
+def transfer_file_multi(src, dsts, remove=False, use_rsync=False):
+    """
+    transfer_file to every path in `dsts`, reading the source only once.
+    Returns the destinations written; FileExistsError if every one already
+    existed, in which case a move keeps its source.
+    """
+    if len(dsts) == 1:
+        return transfer_file(src, dsts[0], remove=remove, use_rsync=use_rsync)
+    if use_rsync:
+        written = []
+        for dst in dsts:
+            try:
+                written += transfer_file(src, dst, use_rsync=True)
+            except FileExistsError:
+                pass
+    else:
+        written = copy_file_multi(src, dsts)
+    if not written:
+        raise FileExistsError(errno.EEXIST, "File exists", os.fspath(dsts[0]))
+    if remove:
+        os.unlink(src)
+    return written
+
+
+def set_file_date(path, date):
+    """Set atime and mtime to local midnight on `date`, as `touch -d YYYY-MM-DD` does."""
+    ts = datetime(date.year, date.month, date.day).timestamp()
+    os.utime(path, (ts, ts))
@@ -0,0 +1,204 @@
+# utils/geocoder.py
+
+import logging
+import math
+import os
+from pathlib import Path
+
+try:
+    import numpy as np
+    from scipy.spatial import cKDTree
+except ImportError:  # offline reverse geocoding is optional
+    np = None
+    cKDTree = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_GAZETTEER_CACHE = Path.home() / ".cache" / "media_organizer" / "gazetteer"
+DEFAULT_MAX_PLACE_KM = 25.0
+EARTH_RADIUS_KM = 6371.0088
+FEATURE_CLASSES = ("P",)  # GeoNames populated places
+QUERY_CHUNK = 100_000
+GEOHASH_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+DEFAULT_GEOHASH_PRECISION = 7  # cells of about 150 x 150 m
+
+# Fixed-width UTF-8 columns keep the place table a plain array that np.load can memory-map.
+PLACE_DTYPE = [("geonameid", "<i8"), ("lat", "<f8"), ("lon", "<f8"),
+               ("name", "S96"), ("admin1", "S64"), ("country", "S64")]
+
+
+def available():
+    return cKDTree is not None
+
+
+def to_xyz(lats, lons):
+    """Unit vectors for (lat, lon) in degrees, so Euclidean nearest neighbours are great-circle nearest."""
+    lat = np.radians(np.asarray(lats, dtype="f8"))
+    lon = np.radians(np.asarray(lons, dtype="f8"))
+    cos_lat = np.cos(lat)
+    return np.column_stack((cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)))
+
+
+def geohash(lat, lon, precision=DEFAULT_GEOHASH_PRECISION):
+    """Standard base-32 geohash of (lat, lon); nearby points share a prefix, so a prefix is a grid cell."""
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars = []
+    bits = value = 0
+    even = True
+    while len(chars) < precision:
+        rng, coord = (lon_range, lon) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        if coord >= mid:
+            value = (value << 1) | 1
+            rng[0] = mid
+        else:
+            value <<= 1
+            rng[1] = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(GEOHASH_BASE32[value])
+            bits = value = 0
+    return "".join(chars)
+
+
+def chord_for_km(km):
+    return 2 * math.sin(min(km / EARTH_RADIUS_KM, math.pi) / 2)
+
+
+def _read_admin1_names(directory):
+    """admin1CodesASCII.txt: "US.CA<TAB>California<TAB>..." -> {"US.CA": "California"}."""
+    names = {}
+    path = os.path.join(directory, "admin1CodesASCII.txt")
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                cols = line.rstrip("\n").split("\t")
+                if len(cols) > 1:
+                    names[cols[0]] = cols[1]
+    return names
+
+
+def _read_country_names(directory):
+    """countryInfo.txt: ISO code in column 0, country name in column 4."""
+    names = {}
+    path = os.path.join(directory, "countryInfo.txt")
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("#"):
+                    continue
+                cols = line.rstrip("\n").split("\t")
+                if len(cols) > 4:
+                    names[cols[0]] = cols[4]
+    return names
+
+
+def _encode(value, width):
+    # Cut on a character boundary so a truncated name still decodes.
+    return value.encode("utf-8")[:width].decode("utf-8", "ignore").encode("utf-8")
+
+
+def build_gazetteer(dump_path, out_dir, feature_classes=FEATURE_CLASSES):
+    """
+    Convert a GeoNames dump (allCountries.txt, cities500.txt, ...) into
+    places.npy and xyz.npy under `out_dir`. admin1CodesASCII.txt and
+    countryInfo.txt next to the dump, when present, supply state and country
+    names; otherwise the codes are used.
+    """
+    directory = os.path.dirname(os.path.abspath(dump_path))
+    admin1_names = _read_admin1_names(directory)
+    country_names = _read_country_names(directory)
+
+    rows = []
+    with open(dump_path, encoding="utf-8") as f:
+        for line in f:
+            cols = line.rstrip("\n").split("\t")
+            if len(cols) < 11 or (feature_classes and cols[6] not in feature_classes):
+                continue
+            try:
+                geonameid, lat, lon = int(cols[0]), float(cols[4]), float(cols[5])
+            except ValueError:
+                continue
+            country = cols[8]
+            admin1 = admin1_names.get(f"{country}.{cols[10]}", cols[10])
+            rows.append((geonameid, lat, lon, _encode(cols[1], 96), _encode(admin1, 64),
+                         _encode(country_names.get(country, country), 64)))
+
+    places = np.array(rows, dtype=PLACE_DTYPE)
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    # Written under temporary names so a half-built index is never loaded.
+    np.save(out_dir / "places.tmp.npy", places)
+    np.save(out_dir / "xyz.tmp.npy", to_xyz(places["lat"], places["lon"]))
+    os.replace(out_dir / "places.tmp.npy", out_dir / "places.npy")
+    os.replace(out_dir / "xyz.tmp.npy", out_dir / "xyz.npy")
+    logger.info(f"Built gazetteer index of {len(places)} places from {dump_path} in {out_dir}")
+    return out_dir
+
+
+class Gazetteer:
+    """
+    Offline reverse geocoder over a GeoNames-style gazetteer.
+
+    The place table and its unit-sphere coordinates are .npy files opened
+    with mmap_mode="r", so startup does not parse the dump and pages are only
+    read as the tree and the lookups touch them. Lookups are vectorised: one
+    KD-tree query answers a whole batch of (lat, lon) pairs.
+    """
+
+    def __init__(self, places, xyz):
+        self.places = places
+        # An unbalanced build is several times faster and queries about as fast on point data.
+        self.tree = cKDTree(xyz, balanced_tree=False, compact_nodes=False)
+
+    @classmethod
+    def open(cls, path, cache_dir=DEFAULT_GAZETTEER_CACHE):
+        """
+        `path` is a directory built by build_gazetteer() or a GeoNames dump;
+        a dump is converted once into `cache_dir` and reused until it changes.
+        """
+        path = Path(path).expanduser()
+        if path.is_file():
+            st = path.stat()
+            index_dir = Path(cache_dir).expanduser() / f"{path.stem}-{st.st_size}-{st.st_mtime_ns}"
+            if not (index_dir / "xyz.npy").exists():
+                build_gazetteer(path, index_dir)
+            path = index_dir
+        places = np.load(path / "places.npy", mmap_mode="r")
+        xyz = np.load(path / "xyz.npy", mmap_mode="r")
+        logger.info(f"Loaded gazetteer of {len(places)} places from {path}")
+        return cls(places, xyz)
+
+    def __len__(self):
+        return len(self.places)
+
+    def nearest(self, lats, lons, max_km=DEFAULT_MAX_PLACE_KM):
+        """Distances (km) and row indexes of the nearest place to each point; the index is -1 beyond `max_km`."""
+        distances, indexes = self.tree.query(to_xyz(lats, lons), k=1, distance_upper_bound=chord_for_km(max_km))
+        missing = ~np.isfinite(distances)
+        indexes = np.where(missing, -1, indexes)
+        km = 2 * EARTH_RADIUS_KM * np.arcsin(np.clip(np.where(missing, 0, distances) / 2, 0, 1))
+        return np.where(missing, np.inf, km), indexes
+
+    def place(self, index):
+        """A Nominatim-shaped result for gazetteer row `index`, so both sources are stored the same way."""
+        row = self.places[index]
+        name, admin1, country = (row[col].decode("utf-8", "ignore") for col in ("name", "admin1", "country"))
+        return {
+            "osm_id": -int(row["geonameid"]),  # negative: never collides with a real OSM id
+            "osm_type": "geonames",
+            "display_name": ", ".join(part for part in (name, admin1, country) if part),
+            "address": {"city": name or None, "state": admin1 or None, "country": country or None},
+            "lat": float(row["lat"]),
+            "lon": float(row["lon"]),
+        }
+
+    def reverse(self, coords, max_km=DEFAULT_MAX_PLACE_KM, chunk_size=QUERY_CHUNK):
+        """Yield ((lat, lon), place or None) for every pair in `coords`, querying `chunk_size` at a time."""
+        coords = list(coords)
+        for i in range(0, len(coords), chunk_size):
+            chunk = coords[i:i + chunk_size]
+            _, indexes = self.nearest([c[0] for c in chunk], [c[1] for c in chunk], max_km)
+            for coord, index in zip(chunk, indexes.tolist()):
+                yield coord, self.place(index) if index >= 0 else None
@@ -5,25 +5,55 @@ import re
 from datetime import datetime
 from db_connection import safe_query as execute_query
 from app_utils import load_metadata_mappings
+from utils.db_pool import bucket, dict_rows, prepared
 import logger
 
 MAPPINGS = load_metadata_mappings()
 
+LOOKUP_CHUNK_SIZE = 500
+
+def lookup_columns(media_type):
+    """Columns update_missing_media_fields can compare: the mapped fields plus id and location."""
+    mapping = MAPPINGS.get(media_type, {})
+    return ["id", "file_name", "file_location"] + sorted(set(mapping.values()) - {"file_name", "file_location"})
+
 def get_existing_media_record(db_conn, file_name, media_type, logger):
     try:
-        logger.debug("Using context-managed cursor to fetch existing record")
-        query = f"SELECT * FROM {media_type} WHERE file_name = %s"
-        with db_conn.cursor(buffered=True) as cursor:
-            cursor.execute(query, (file_name,))
-            row = cursor.fetchone()
-            if not row:
-                return None
-            column_names = [desc[0] for desc in cursor.description]  # ← MOVE THIS HERE
-            return dict(zip(column_names, row))                      # ← AND THIS
+        return get_existing_media_records(db_conn, [file_name], media_type, logger).get(file_name)
     except Exception as e:
         logger.error(f"Failed to fetch record for {file_name}: {e}")
         return None
 
+def get_existing_media_records(db_conn, file_names, media_type, logger, chunk_size=LOOKUP_CHUNK_SIZE):
+    """
+    Resolve existing rows for many file names at once.
+
+    Names are looked up with `WHERE file_name IN (...)` queries of
+    `chunk_size` names. Returns {file_name: row} keeping the lowest id per
+    name. Names are matched case-insensitively, like the table's collation
+    does. Database errors are raised so the caller can skip the chunk rather
+    than insert duplicates.
+    """
+    names = list(dict.fromkeys(n for n in file_names if n))
+    if not names:
+        return {}
+
+    columns = ", ".join(f"t.`{col}`" for col in lookup_columns(media_type))
+    found = {}
+    for i in range(0, len(names), chunk_size):
+        chunk = names[i:i + chunk_size]
+        # Padded with NULLs (which match nothing) so chunks of similar size share a prepared statement.
+        width = min(bucket(len(chunk)), chunk_size)
+        sql = (f"SELECT {columns} FROM {media_type} t WHERE t.file_name IN ({', '.join(['%s'] * width)}) "
+               "ORDER BY t.id")
+        logger.debug(f"Resolving {len(chunk)} {media_type} names with one IN query")
+        with prepared(db_conn, sql) as lookup:
+            lookup.execute(sql, tuple(chunk) + (None,) * (width - len(chunk)))
+            for row in dict_rows(lookup):
+                found.setdefault(row["file_name"].lower(), row)
+
+    return {name: found[name.lower()] for name in names if name.lower() in found}
+
 def sanitize_metadata(raw_metadata, mapping, logger, file_path=None):
     clean = {}
     logger.debug(f"Raw metadata received: {raw_metadata}")
@@ -93,7 +123,7 @@ def insert_new_media_record(db_conn, metadata, media_type, logger, dry_run=False
 
     if not sanitized or not sanitized.get("file_name"):
         logger.warning(f"Skipping insert — missing required metadata for {media_type}. Source file: {file_path}")
-        return
+        return False
 
     logger.info(f"Preparing insert for {media_type}: {sanitized.get('file_name')}")
 
@@ -107,28 +137,31 @@ def insert_new_media_record(db_conn, metadata, media_type, logger, dry_run=False
 
     if dry_run:
         logger.info(f"DRY_RUN: Would insert new {media_type} record for {sanitized.get('file_name')}")
-        return
+        return False
 
     try:
-        with db_conn.cursor() as cursor:
+        with prepared(db_conn, sql) as cursor:
             cursor.execute(sql, tuple(values))
             db_conn.commit()
             logger.info(f"Inserted new {media_type} record: {sanitized.get('file_name')}")
+            return True
     except Exception as e:
         logger.error(f"Insert failed for {media_type} file '{sanitized.get('file_name')}': {e}")
+        return False
+
+def missing_fields(sanitized, existing_row):
+    """Fields from `sanitized` that the existing row has no value for yet."""
+    return {field: value for field, value in sanitized.items()
+            if field not in existing_row or existing_row[field] in (None, '', 0)}
 
 def update_missing_media_fields(db_conn, media_id, metadata, existing_row, media_type, logger, dry_run=False, file_path=None):
     mapping = MAPPINGS.get(media_type, {})
     sanitized = sanitize_metadata(metadata, mapping, logger, file_path=file_path)
-    updates = {}
-
-    for field, value in sanitized.items():
-        if field not in existing_row or existing_row[field] in (None, '', 0):
-            updates[field] = value
+    updates = missing_fields(sanitized, existing_row)
 
     if not updates:
         logger.debug(f"No new fields to update for ID {media_id}")
-        return
+        return not dry_run
 
     sql_parts = [f"`{field}` = %s" for field in updates]
     values = list(updates.values()) + [media_id]
@@ -138,12 +171,147 @@ def update_missing_media_fields(db_conn, media_id, metadata, existing_row, media
     logger.debug(f"Values: {values}")
     if dry_run:
         logger.info(f"DRY_RUN: Would update {media_type} ID {media_id} with {len(updates)} fields")
+        return False
     else:
         try:
-            with db_conn.cursor() as cursor:
+            with prepared(db_conn, sql) as cursor:
                 cursor.execute(sql, tuple(values))
                 db_conn.commit()
                 logger.info(f"Updated {media_type} ID {media_id} with {len(updates)} fields")
+                return True
         except Exception as e:
             logger.error(f"Update failed for ID {media_id}: {e}")
+            return False
+
+
+# --- Bulk writes ---
+
+DEFAULT_WRITE_BATCH_SIZE = 500
+PACKET_HEADROOM = 0.75  # fraction of max_allowed_packet one statement may use
+DEFAULT_MAX_PACKET = 4 * 1024 * 1024
+
+_max_packet = {}
+
+def max_allowed_packet(db_conn, logger):
+    key = id(db_conn)
+    if key not in _max_packet:
+        try:
+            with db_conn.cursor() as cursor:
+                cursor.execute("SELECT @@max_allowed_packet")
+                _max_packet[key] = int(cursor.fetchone()[0])
+        except Exception as e:
+            logger.debug(f"Could not read max_allowed_packet, assuming {DEFAULT_MAX_PACKET}: {e}")
+            _max_packet[key] = DEFAULT_MAX_PACKET
+    return _max_packet[key]
+
+def _row_bytes(values):
+    return sum(len(str(v)) + 4 for v in values)
+
+def _packet_batches(rows, batch_size, max_bytes):
+    """Split [(file_path, values)] into batches bounded by row count and estimated statement size."""
+    batch, size = [], 0
+    for row in rows:
+        row_size = _row_bytes(row[1])
+        if batch and (len(batch) >= batch_size or size + row_size > max_bytes):
+            yield batch
+            batch, size = [], 0
+        batch.append(row)
+        size += row_size
+    if batch:
+        yield batch
+
+def _write_bisecting(db_conn, rows, write, logger, label):
+    """
+    Run `write(db_conn, rows)` in one transaction. If it fails, split the
+    batch in half and retry each half, so only the offending rows are lost.
+    Returns the file paths whose rows were written.
+    """
+    try:
+        write(db_conn, rows)
+        db_conn.commit()
+        return [file_path for file_path, _ in rows]
+    except Exception as e:
+        db_conn.rollback()
+        if len(rows) == 1:
+            logger.error(f"{label} failed for {rows[0][0]}: {e}")
+            return []
+        logger.debug(f"{label} batch of {len(rows)} failed ({e}); bisecting")
+        mid = len(rows) // 2
+        return (_write_bisecting(db_conn, rows[:mid], write, logger, label) +
+                _write_bisecting(db_conn, rows[mid:], write, logger, label))
+
+def insert_media_records(db_conn, items, media_type, logger, dry_run=False, batch_size=DEFAULT_WRITE_BATCH_SIZE):
+    """
+    Insert many new records with multi-row INSERTs, one per group of rows that
+    share a column set. `items` is [(file_path, metadata)]; returns the file
+    paths that were written.
+    """
+    mapping = MAPPINGS.get(media_type, {})
+    groups = {}
+    for file_path, metadata in items:
+        sanitized = sanitize_metadata(metadata, mapping, logger, file_path=file_path)
+        if not sanitized.get("file_name"):
+            logger.warning(f"Skipping insert — missing required metadata for {media_type}. Source file: {file_path}")
+            continue
+        columns = tuple(sorted(sanitized))
+        groups.setdefault(columns, []).append((file_path, tuple(sanitized[c] for c in columns)))
+
+    if dry_run:
+        logger.info(f"DRY_RUN: Would insert {sum(len(rows) for rows in groups.values())} new {media_type} records")
+        return []
+
+    max_bytes = int(max_allowed_packet(db_conn, logger) * PACKET_HEADROOM)
+    written = []
+    for columns, rows in groups.items():
+        column_sql = ", ".join(f"`{c}`" for c in columns)
+        row_sql = "(" + ", ".join(["%s"] * len(columns)) + ")"
+
+        def write(conn, batch):
+            sql = f"INSERT INTO {media_type} ({column_sql}) VALUES " + ", ".join([row_sql] * len(batch))
+            with prepared(conn, sql) as cursor:
+                cursor.execute(sql, tuple(v for _, values in batch for v in values))
+
+        for batch in _packet_batches(rows, batch_size, max_bytes):
+            done = _write_bisecting(db_conn, batch, write, logger, f"{media_type} insert")
+            logger.info(f"Inserted {len(done)}/{len(batch)} new {media_type} records")
+            written.extend(done)
+    return written
+
+def update_media_records(db_conn, items, media_type, logger, dry_run=False, batch_size=DEFAULT_WRITE_BATCH_SIZE):
+    """
+    Fill missing fields on many existing records. Rows are grouped by the set of
+    columns they change and written with executemany, one transaction per
+    batch. `items` is [(file_path, media_id, metadata, existing_row)]; returns
+    the file paths that were written or already complete.
+    """
+    mapping = MAPPINGS.get(media_type, {})
+    groups = {}
+    complete = []
+    for file_path, media_id, metadata, existing_row in items:
+        sanitized = sanitize_metadata(metadata, mapping, logger, file_path=file_path)
+        updates = missing_fields(sanitized, existing_row)
+        if not updates:
+            logger.debug(f"No new fields to update for ID {media_id}")
+            complete.append(file_path)
+            continue
+        columns = tuple(sorted(updates))
+        groups.setdefault(columns, []).append((file_path, tuple(updates[c] for c in columns) + (media_id,)))
+
+    if dry_run:
+        logger.info(f"DRY_RUN: Would update {sum(len(rows) for rows in groups.values())} {media_type} records")
+        return []
+
+    max_bytes = int(max_allowed_packet(db_conn, logger) * PACKET_HEADROOM)
+    written = complete
+    for columns, rows in groups.items():
+        sql = f"UPDATE {media_type} SET {', '.join(f'`{c}` = %s' for c in columns)} WHERE id = %s"
+
+        def write(conn, batch):
+            with prepared(conn, sql) as cursor:
+                cursor.executemany(sql, [values for _, values in batch])
 
+        for batch in _packet_batches(rows, batch_size, max_bytes):
+            done = _write_bisecting(db_conn, batch, write, logger, f"{media_type} update")
+            logger.info(f"Updated {len(done)}/{len(batch)} {media_type} records ({', '.join(columns)})")
+            written.extend(done)
+    return written
@@ -0,0 +1,171 @@
+# utils/metadata_cache.py
+
+import atexit
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_PATH = Path.home() / ".cache" / "media_organizer" / "metadata.sqlite"
+DEFAULT_MAX_ENTRIES = 2_000_000
+DEFAULT_MAX_BYTES = 4 * 1024 ** 3
+EVICT_EVERY = 1000  # writes between eviction checks
+COMMIT_EVERY = 500
+
+
+class MetadataCache:
+    """
+    On-disk cache of full exiftool metadata, keyed by (st_dev, st_ino, st_size,
+    st_mtime_ns) so any change to a file - or a different file at the same
+    path - misses, while a rename on the same filesystem still hits.
+
+    Least recently used entries are evicted once the cache grows past
+    `max_entries` rows or `max_bytes` of stored JSON.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = Path(path).expanduser()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = self.misses = self.writes = 0
+        self._dirty = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS metadata_cache (
+                dev INTEGER NOT NULL,
+                ino INTEGER NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                metadata TEXT NOT NULL,
+                nbytes INTEGER NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (dev, ino, size, mtime_ns)
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_metadata_cache_last_used ON metadata_cache (last_used)")
+        self._conn.commit()
+
+    @staticmethod
+    def key_for(st):
+        return (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns)
+
+    def get(self, path, st=None):
+        """Return cached metadata for `path`, or None on a miss."""
+        try:
+            st = st or os.stat(path)
+        except OSError:
+            return None
+
+        key = self.key_for(st)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT metadata FROM metadata_cache WHERE dev = ? AND ino = ? AND size = ? AND mtime_ns = ?", key
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._conn.execute(
+                "UPDATE metadata_cache SET last_used = ? WHERE dev = ? AND ino = ? AND size = ? AND mtime_ns = ?",
+                (time.time(),) + key,
+            )
+            self._mark_dirty()
+
+        metadata = json.loads(row[0])
+        # The same inode may have been moved or renamed since it was cached.
+        metadata["SourceFile"] = path
+        metadata["FileName"] = os.path.basename(path)
+        metadata["Directory"] = os.path.dirname(path) or "."
+        return metadata
+
+    def put(self, path, metadata, st=None):
+        if not metadata:
+            return
+        try:
+            st = st or os.stat(path)
+        except OSError:
+            return
+
+        payload = json.dumps(metadata, default=str)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO metadata_cache (dev, ino, size, mtime_ns, metadata, nbytes, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                self.key_for(st) + (payload, len(payload), time.time()),
+            )
+            self.writes += 1
+            self._mark_dirty()
+            if self.writes % EVICT_EVERY == 0:
+                self._evict()
+
+    def _mark_dirty(self):
+        self._dirty += 1
+        if self._dirty >= COMMIT_EVERY:
+            self._conn.commit()
+            self._dirty = 0
+
+    def _evict(self):
+        count, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(nbytes), 0) FROM metadata_cache").fetchone()
+        if count <= self.max_entries and total <= self.max_bytes:
+            return
+
+        excess_rows = max(0, count - self.max_entries)
+        if total > self.max_bytes:
+            # Drop an extra slice proportional to the byte overage.
+            excess_rows = max(excess_rows, int(count * (total - self.max_bytes) / total) + 1)
+        self._conn.execute(
+            "DELETE FROM metadata_cache WHERE rowid IN "
+            "(SELECT rowid FROM metadata_cache ORDER BY last_used LIMIT ?)",
+            (excess_rows,),
+        )
+        self._conn.commit()
+        self._dirty = 0
+        logger.debug(f"Evicted {excess_rows} metadata cache entries")
+
+    def stats(self):
+        total = self.hits + self.misses
+        ratio = (self.hits / total * 100) if total else 0.0
+        return f"hits={self.hits}, misses={self.misses}, writes={self.writes}, hit_rate={ratio:.1f}%"
+
+    def close(self):
+        with self._lock:
+            try:
+                self._evict()
+                self._conn.commit()
+            finally:
+                self._conn.close()
+
+
+_cache = None
+
+
+def configure_cache(path=DEFAULT_CACHE_PATH, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES):
+    global _cache
+    close_cache()
+    _cache = MetadataCache(path, max_entries=max_entries, max_bytes=max_bytes)
+    logger.debug(f"Using metadata cache at {_cache.path}")
+    return _cache
+
+
+def get_cache():
+    """The shared cache, or None if caching has not been enabled for this run."""
+    return _cache
+
+
+def close_cache():
+    global _cache
+    if _cache is not None:
+        _cache.close()
+        _cache = None
+
+
+atexit.register(close_cache)
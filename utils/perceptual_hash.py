@@ -0,0 +1,273 @@
+# utils/perceptual_hash.py
+
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    from PIL import Image
+except ImportError:  # perceptual hashing is optional
+    Image = None
+
+try:
+    from pillow_heif import register_heif_opener
+    register_heif_opener()
+except ImportError:
+    pass
+
+HASH_SIZE = 8
+DEFAULT_MAX_DISTANCE = 6
+DEFAULT_PHASH_WORKERS = max(1, (os.cpu_count() or 2) - 1)
+FETCH_SIZE = 10000
+CHUNK_SIZE = 500
+HASH_CHUNK = 32
+
+CREATE_TABLE = """
+    CREATE TABLE IF NOT EXISTS PhotoHashes (
+        photo_id INT PRIMARY KEY,
+        dhash BIGINT UNSIGNED NULL,  -- NULL: the file could not be read or decoded
+        KEY idx_photo_hashes_dhash (dhash),
+        FOREIGN KEY (photo_id) REFERENCES Photos(id) ON DELETE CASCADE
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+"""
+
+
+def available():
+    return Image is not None
+
+
+def dhash(file_path, hash_size=HASH_SIZE):
+    """64-bit difference hash: brightness gradients of a (hash_size+1) x hash_size greyscale thumbnail."""
+    with Image.open(file_path) as img:
+        # JPEG decoders can downscale while decoding, which is most of the cost.
+        img.draft("L", (hash_size * 8, hash_size * 8))
+        pixels = list(img.convert("L").resize((hash_size + 1, hash_size), Image.LANCZOS).getdata())
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def _safe_dhashes(items):
+    results = []
+    for key, file_path in items:
+        try:
+            results.append((key, dhash(file_path)))
+        except Exception:
+            results.append((key, None))
+    return results
+
+
+def compute_dhashes(items, workers=DEFAULT_PHASH_WORKERS, chunk_size=HASH_CHUNK):
+    """
+    Hash (key, file_path) pairs in a process pool; yields (key, hash or None)
+    in order. `items` is consumed lazily: only a few chunks per worker are
+    submitted ahead of the results being read.
+    """
+    pending = deque()
+    chunk = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for item in items:
+            chunk.append(item)
+            if len(chunk) >= chunk_size:
+                pending.append(executor.submit(_safe_dhashes, chunk))
+                chunk = []
+                if len(pending) >= workers * 4:
+                    yield from pending.popleft().result()
+        if chunk:
+            pending.append(executor.submit(_safe_dhashes, chunk))
+        while pending:
+            yield from pending.popleft().result()
+
+
+def hamming(a, b):
+    return (a ^ b).bit_count()
+
+
+class BKTree:
+    """
+    Burkhard-Keller tree over 64-bit hashes under Hamming distance. A search
+    with radius r only descends into children whose edge distance is within
+    r of the query's distance to the node, so it visits a small part of the
+    tree rather than every hash.
+    """
+
+    def __init__(self):
+        self.root = None  # [hash, [ids], {distance: child}]
+        self.size = 0
+
+    def add(self, value, item):
+        self.size += 1
+        if self.root is None:
+            self.root = [value, [item], {}]
+            return
+        node = self.root
+        while True:
+            d = hamming(value, node[0])
+            if d == 0:
+                node[1].append(item)
+                return
+            child = node[2].get(d)
+            if child is None:
+                node[2][d] = [value, [item], {}]
+                return
+            node = child
+
+    def search(self, value, max_distance):
+        """(distance, item) for every item within `max_distance` of `value`, nearest first."""
+        found = []
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            node = stack.pop()
+            d = hamming(value, node[0])
+            if d <= max_distance:
+                found.extend((d, item) for item in node[1])
+            for edge, child in node[2].items():
+                if d - max_distance <= edge <= d + max_distance:
+                    stack.append(child)
+        found.sort(key=lambda pair: pair[0])
+        return found
+
+    def nodes(self):
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            node = stack.pop()
+            yield node[0], node[1]
+            stack.extend(node[2].values())
+
+
+def ensure_table(db_conn, logger):
+    with db_conn.cursor() as cursor:
+        cursor.execute(CREATE_TABLE)
+    db_conn.commit()
+    logger.debug("Table created/checked: PhotoHashes")
+
+
+def _unhashed_photos(db_conn, fetch_size=FETCH_SIZE):
+    """(photo_id, path) of every Photos row without a PhotoHashes row, read a page of ids at a time."""
+    last = 0
+    while True:
+        with db_conn.cursor() as cursor:
+            cursor.execute("""
+                SELECT p.id, p.file_location, p.file_name
+                FROM Photos p LEFT JOIN PhotoHashes h ON h.photo_id = p.id
+                WHERE p.id > %s AND h.photo_id IS NULL AND p.file_name IS NOT NULL
+                ORDER BY p.id LIMIT %s
+            """, (last, fetch_size))
+            rows = cursor.fetchall()
+        if not rows:
+            return
+        last = rows[-1][0]
+        for photo_id, location, name in rows:
+            yield photo_id, os.path.join(location or "", name)
+
+
+def index_photo_hashes(db_conn, logger, workers=DEFAULT_PHASH_WORKERS, chunk_size=CHUNK_SIZE):
+    """
+    Compute and store a dHash for every Photos row that does not have one yet.
+    Files that cannot be hashed get a row with a NULL dHash, so they are not
+    retried on every run; delete the row to try again.
+    """
+    if not available():
+        logger.warning("Pillow is not installed; skipping perceptual hashes")
+        return 0
+    ensure_table(db_conn, logger)
+    logger.info(f"[Photos] Computing perceptual hashes for unhashed photos with {workers} processes")
+
+    stored = failed = 0
+    batch = []
+
+    def write(rows):
+        with db_conn.cursor() as cursor:
+            cursor.executemany("INSERT INTO PhotoHashes (photo_id, dhash) VALUES (%s, %s) "
+                               "ON DUPLICATE KEY UPDATE dhash = VALUES(dhash)", rows)
+        db_conn.commit()
+
+    for photo_id, value in compute_dhashes(_unhashed_photos(db_conn), workers):
+        if value is None:
+            failed += 1
+        batch.append((photo_id, value))
+        if len(batch) >= chunk_size:
+            write(batch)
+            stored += len(batch)
+            batch = []
+    if batch:
+        write(batch)
+        stored += len(batch)
+    logger.info(f"[Photos] Stored {stored - failed} perceptual hashes ({failed} unreadable)")
+    return stored - failed
+
+
+def load_hash_tree(db_conn, logger, fetch_size=FETCH_SIZE):
+    tree = BKTree()
+    cursor = db_conn.cursor(buffered=False)
+    try:
+        cursor.execute("SELECT photo_id, dhash FROM PhotoHashes WHERE dhash IS NOT NULL")
+        while True:
+            rows = cursor.fetchmany(fetch_size)
+            if not rows:
+                break
+            for photo_id, value in rows:
+                tree.add(int(value), photo_id)
+    finally:
+        cursor.close()
+    logger.info(f"Loaded {tree.size} perceptual hashes")
+    return tree
+
+
+def find_similar(tree, file_path, max_distance=DEFAULT_MAX_DISTANCE):
+    """(distance, photo_id) for library photos that look like `file_path`."""
+    return tree.search(dhash(file_path), max_distance)
+
+
+def near_duplicate_groups(tree, max_distance=DEFAULT_MAX_DISTANCE):
+    """
+    Group photo ids whose hashes are within `max_distance` of each other
+    (transitively), with one tree search per distinct hash.
+    """
+    parent = {}
+
+    def find(x):
+        while parent.setdefault(x, x) != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for value, items in tree.nodes():
+        for _, other in tree.search(value, max_distance):
+            parent[find(other)] = find(items[0])
+        for item in items[1:]:
+            parent[find(item)] = find(items[0])
+
+    groups = {}
+    for item in parent:
+        groups.setdefault(find(item), []).append(item)
+    return [sorted(group) for group in groups.values() if len(group) > 1]
+
+
+def photo_paths(db_conn, photo_ids, chunk_size=CHUNK_SIZE):
+    paths = {}
+    ids = list(photo_ids)
+    with db_conn.cursor() as cursor:
+        for i in range(0, len(ids), chunk_size):
+            chunk = ids[i:i + chunk_size]
+            cursor.execute(f"SELECT id, file_location, file_name FROM Photos WHERE id IN ({', '.join(['%s'] * len(chunk))})",
+                           tuple(chunk))
+            for photo_id, location, name in cursor.fetchall():
+                paths[photo_id] = os.path.join(location or "", name or "")
+    return paths
+
+
+def near_duplicate_report(db_conn, logger, max_distance=DEFAULT_MAX_DISTANCE, out=None):
+    """Print every group of near-duplicate photos, one path per line, groups separated by blank lines."""
+    groups = near_duplicate_groups(load_hash_tree(db_conn, logger), max_distance)
+    paths = photo_paths(db_conn, (photo_id for group in groups for photo_id in group))
+    for group in sorted(groups, key=len, reverse=True):
+        print(f"# {len(group)} near-duplicates", file=out)
+        for photo_id in group:
+            print(f"{photo_id}\t{paths.get(photo_id, '?')}", file=out)
+        print(file=out)
+    logger.info(f"Found {len(groups)} near-duplicate groups covering {sum(map(len, groups))} photos")
+    return groups
@@ -0,0 +1,129 @@
+# utils/processed_index.py
+
+import hashlib
+import threading
+from array import array
+from bisect import bisect_left
+from datetime import datetime
+
+from utils.db_pool import prepared
+
+FETCH_SIZE = 10000
+FLUSH_BATCH_SIZE = 1000
+BLOOM_BITS_PER_ENTRY = 10
+BLOOM_HASHES = 7
+
+
+def path_key(file_path):
+    """64-bit hash of a path, used instead of storing the path itself."""
+    digest = hashlib.blake2b(file_path.encode("utf-8", "surrogateescape"), digest_size=8).digest()
+    return int.from_bytes(digest, "big")
+
+
+def path_hash(file_path):
+    """MD5 of a path, the same 16 bytes as MySQL's UNHEX(MD5(file_path)) in MediaProcessing.path_hash."""
+    return hashlib.md5(file_path.encode("utf-8", "surrogateescape")).digest()
+
+
+def _processed_key(file_path):
+    return int.from_bytes(path_hash(file_path)[:8], "big")
+
+
+class ProcessedIndex:
+    """
+    In-memory copy of the processed paths in MediaProcessing.
+
+    Paths are kept as a sorted array of 64-bit keys (the first 8 bytes of
+    their path_hash, so the preload reads hashes rather than paths) fronted
+    by a Bloom filter, so the common "not processed yet" answer costs a few
+    bit tests and only Bloom hits fall through to the exact binary search.
+    Paths marked during the run are queued and written back with flush().
+    """
+
+    def __init__(self, keys=()):
+        self._keys = array("Q", sorted(keys))
+        self._bloom_bits = max(64, len(self._keys) * BLOOM_BITS_PER_ENTRY)
+        self._bloom = bytearray((self._bloom_bits + 7) // 8)
+        for key in self._keys:
+            self._bloom_add(key)
+        self._added = set()
+        self._pending = []
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, db_conn, logger, fetch_size=FETCH_SIZE):
+        """Stream every processed path hash from MediaProcessing with one unbuffered query."""
+        keys = array("Q")
+        if db_conn is None:
+            return cls(keys)
+        try:
+            cursor = db_conn.cursor(buffered=False)
+            try:
+                cursor.execute("SELECT path_hash FROM MediaProcessing WHERE processed = 1 AND path_hash IS NOT NULL")
+                while True:
+                    rows = cursor.fetchmany(fetch_size)
+                    if not rows:
+                        break
+                    keys.extend(int.from_bytes(bytes(row[0][:8]), "big") for row in rows)
+            finally:
+                cursor.close()
+        except Exception as e:
+            logger.error(f"Failed to preload processed paths from MediaProcessing: {e}")
+        logger.info(f"Loaded {len(keys)} processed paths from MediaProcessing")
+        return cls(keys)
+
+    def _bloom_positions(self, key):
+        h1, h2 = key & 0xFFFFFFFF, (key >> 32) | 1
+        return ((h1 + i * h2) % self._bloom_bits for i in range(BLOOM_HASHES))
+
+    def _bloom_add(self, key):
+        for pos in self._bloom_positions(key):
+            self._bloom[pos >> 3] |= 1 << (pos & 7)
+
+    def _bloom_check(self, key):
+        return all(self._bloom[pos >> 3] & (1 << (pos & 7)) for pos in self._bloom_positions(key))
+
+    def __contains__(self, file_path):
+        key = _processed_key(file_path)
+        if key in self._added:
+            return True
+        if not self._bloom_check(key):
+            return False
+        idx = bisect_left(self._keys, key)
+        return idx < len(self._keys) and self._keys[idx] == key
+
+    def __len__(self):
+        return len(self._keys) + len(self._added)
+
+    def add(self, file_path):
+        """Mark a path processed; it is written to the database on the next flush()."""
+        key = _processed_key(file_path)
+        with self._lock:
+            if key in self._added:
+                return
+            self._added.add(key)
+            self._pending.append((file_path, path_hash(file_path), 1, datetime.now()))
+
+    def flush(self, db_conn, logger, batch_size=FLUSH_BATCH_SIZE):
+        if db_conn is None:
+            return
+        with self._lock:
+            pending, self._pending = self._pending, []
+        if not pending:
+            return
+        written = 0
+        for i in range(0, len(pending), batch_size):
+            batch = pending[i:i + batch_size]
+            # One multi-row statement per batch; every full batch reuses the same prepared statement.
+            sql = ("INSERT INTO MediaProcessing (file_path, path_hash, processed, processed_at) VALUES "
+                   + ", ".join(["(%s, %s, %s, %s)"] * len(batch))
+                   + " ON DUPLICATE KEY UPDATE processed = VALUES(processed), processed_at = VALUES(processed_at)")
+            try:
+                with prepared(db_conn, sql) as cursor:
+                    cursor.execute(sql, tuple(v for row in batch for v in row))
+                db_conn.commit()
+                written += len(batch)
+            except Exception as e:
+                db_conn.rollback()
+                logger.error(f"Failed to mark {len(batch)} paths as processed: {e}")
+        logger.info(f"Marked {written} paths as processed in MediaProcessing")
@@ -0,0 +1,258 @@
+# utils/scan_journal.py
+
+import atexit
+import json
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_JOURNAL_PATH = Path.home() / ".cache" / "media_organizer" / "scan_journal.sqlite"
+# A directory modified this close to the start of a scan may change again
+# within the same mtime tick, so it is never trusted on the next run.
+RACY_WINDOW_NS = 2 * 10 ** 9
+UNTRUSTED_MTIME = -1
+# Listed directories held in memory before they are staged in the journal file.
+STAGE_BATCH_FILES = 10000
+# Staged directories moved into the journal per transaction on commit.
+COMMIT_BATCH_DIRS = 1000
+
+
+class ScanJournal:
+    """
+    Persisted record of what the last scans saw: each directory's mtime, entry
+    count and subdirectories, and a (size, mtime) fingerprint per file.
+
+    Rows are kept per `scope` (e.g. "Videos", "move"), because scans of the
+    same tree with different extension filters yield different files.
+    """
+
+    def __init__(self, path=DEFAULT_JOURNAL_PATH):
+        self.path = Path(path).expanduser()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS scan_dirs (
+                scope TEXT NOT NULL,
+                path TEXT NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                entries INTEGER NOT NULL,
+                subdirs TEXT NOT NULL,
+                scanned_at REAL NOT NULL,
+                PRIMARY KEY (scope, path)
+            )
+        """)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS scan_files (
+                scope TEXT NOT NULL,
+                dir TEXT NOT NULL,
+                path TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                PRIMARY KEY (scope, path)
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_scan_files_dir ON scan_files (scope, dir)")
+        # Directories listed by a scan that has not been committed yet.
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS scan_staged (
+                scope TEXT NOT NULL,
+                path TEXT NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                entries INTEGER NOT NULL,
+                subdirs TEXT NOT NULL,
+                files TEXT NOT NULL,
+                PRIMARY KEY (scope, path)
+            )
+        """)
+        self._conn.commit()
+
+    def begin(self, scope, full_rescan=False):
+        return JournalScan(self, scope, full_rescan)
+
+    def dir_state(self, scope, path):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT mtime_ns, subdirs FROM scan_dirs WHERE scope = ? AND path = ?", (scope, path)
+            ).fetchone()
+        if row is None:
+            return None
+        return row[0], json.loads(row[1])
+
+    def file_states(self, scope, directory):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT path, size, mtime_ns FROM scan_files WHERE scope = ? AND dir = ?", (scope, directory)
+            ).fetchall()
+        return {path: (size, mtime_ns) for path, size, mtime_ns in rows}
+
+    def save(self, scope, dirs):
+        """Replace the journal rows of every directory in `dirs` in one transaction."""
+        now = time.time()
+        with self._lock:
+            with self._conn:
+                for directory, (mtime_ns, entries, subdirs, files) in dirs.items():
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO scan_dirs (scope, path, mtime_ns, entries, subdirs, scanned_at) "
+                        "VALUES (?, ?, ?, ?, ?, ?)",
+                        (scope, directory, mtime_ns, entries, json.dumps(subdirs), now),
+                    )
+                    self._conn.execute("DELETE FROM scan_files WHERE scope = ? AND dir = ?", (scope, directory))
+                    self._conn.executemany(
+                        "INSERT OR REPLACE INTO scan_files (scope, dir, path, size, mtime_ns) VALUES (?, ?, ?, ?, ?)",
+                        ((scope, directory, path, size, mtime_ns) for path, size, mtime_ns in files),
+                    )
+
+    def stage(self, scope, dirs):
+        """Keep listed directories aside, outside the journal proper, until their scan commits."""
+        with self._lock:
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO scan_staged (scope, path, mtime_ns, entries, subdirs, files) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    ((scope, directory, mtime_ns, entries, json.dumps(subdirs), json.dumps(files))
+                     for directory, (mtime_ns, entries, subdirs, files) in dirs.items()),
+                )
+
+    def staged(self, scope, batch_size):
+        """Yield the staged directories of `scope` as dicts of at most `batch_size` entries."""
+        last = 0
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT rowid, path, mtime_ns, entries, subdirs, files FROM scan_staged "
+                    "WHERE scope = ? AND rowid > ? ORDER BY rowid LIMIT ?", (scope, last, batch_size)
+                ).fetchall()
+            if not rows:
+                return
+            last = rows[-1][0]
+            yield {path: (mtime_ns, entries, json.loads(subdirs), json.loads(files))
+                   for _, path, mtime_ns, entries, subdirs, files in rows}
+
+    def clear_staged(self, scope):
+        with self._lock:
+            with self._conn:
+                self._conn.execute("DELETE FROM scan_staged WHERE scope = ?", (scope,))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class JournalScan:
+    """
+    One scan of one scope against the journal, used by utils.scanner.scan_files.
+
+    Directories whose mtime matches the journal are not listed again: their
+    recorded subdirectories are visited and their files are skipped. In
+    directories that did change, only new or modified files are yielded.
+    Listed directories are staged in the journal file in batches, so memory
+    stays bounded on large trees, and only take effect on commit(); an
+    interrupted run leaves the journal as it was. Editing a file in place does not touch its directory's mtime;
+    --full-rescan picks such changes up.
+    """
+
+    def __init__(self, journal, scope, full_rescan=False):
+        self.journal = journal
+        self.scope = scope
+        self.full_rescan = full_rescan
+        self.started_ns = time.time_ns()
+        self.dirs_skipped = self.dirs_listed = self.files_skipped = 0
+        self._pending = {}
+        self._pending_files = 0
+        self._lock = threading.Lock()
+        # Left over from a scan of this scope that never committed.
+        journal.clear_staged(scope)
+
+    def unchanged_subdirs(self, directory, st):
+        """The recorded subdirectories of `directory` if it is unchanged since the last scan, else None."""
+        if self.full_rescan:
+            return None
+        state = self.journal.dir_state(self.scope, directory)
+        if state is None or state[0] != st.st_mtime_ns:
+            return None
+        self.dirs_skipped += 1
+        return state[1]
+
+    def known_files(self, directory):
+        if self.full_rescan:
+            return {}
+        return self.journal.file_states(self.scope, directory)
+
+    def record_dir(self, directory, st, entries, subdirs, files):
+        """
+        Queue a listed directory. `files` holds (path, size, mtime_ns, fresh)
+        for every file in it; fresh ones were yielded by this scan.
+        """
+        mtime_ns = st.st_mtime_ns
+        if mtime_ns >= self.started_ns - RACY_WINDOW_NS:
+            mtime_ns = UNTRUSTED_MTIME
+        with self._lock:
+            self.dirs_listed += 1
+            self._pending[directory] = (mtime_ns, entries, subdirs, files)
+            self._pending_files += len(files) + 1
+            if self._pending_files >= STAGE_BATCH_FILES:
+                self._stage()
+
+    def _stage(self):
+        if self._pending:
+            self.journal.stage(self.scope, self._pending)
+        self._pending, self._pending_files = {}, 0
+
+    def commit(self, keep=None):
+        """
+        Write the scan to the journal. Fresh files for which `keep(path)` is
+        false (e.g. ones that failed to process) are left out and their
+        directory is marked untrusted, so the next scan offers them again.
+        """
+        with self._lock:
+            self._stage()
+        for staged in self.journal.staged(self.scope, COMMIT_BATCH_DIRS):
+            dirs = {}
+            for directory, (mtime_ns, entries, subdirs, files) in staged.items():
+                kept = []
+                for path, size, file_mtime_ns, fresh in files:
+                    if fresh and keep is not None and not keep(path):
+                        mtime_ns = UNTRUSTED_MTIME
+                        continue
+                    kept.append((path, size, file_mtime_ns))
+                dirs[directory] = (mtime_ns, entries, subdirs, kept)
+            self.journal.save(self.scope, dirs)
+        self.journal.clear_staged(self.scope)
+        logger.info(f"Scan journal [{self.scope}]: {self.stats()}")
+
+    def stats(self):
+        return (f"dirs_skipped={self.dirs_skipped}, dirs_listed={self.dirs_listed}, "
+                f"unchanged_files={self.files_skipped}")
+
+
+_journal = None
+
+
+def configure_journal(path=DEFAULT_JOURNAL_PATH):
+    global _journal
+    close_journal()
+    _journal = ScanJournal(path)
+    logger.debug(f"Using scan journal at {_journal.path}")
+    return _journal
+
+
+def get_journal():
+    """The shared journal, or None if incremental scanning is not enabled for this run."""
+    return _journal
+
+
+def close_journal():
+    global _journal
+    if _journal is not None:
+        _journal.close()
+        _journal = None
+
+
+atexit.register(close_journal)
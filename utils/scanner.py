@@ -0,0 +1,107 @@
+# utils/scanner.py
+
+import os
+import threading
+
+
+def scan_files(root, extensions=None, skip_hidden_dirs=False, logger=None, journal=None):
+    """
+    Walk `root` with os.scandir and yield an os.DirEntry for every file.
+
+    Unlike os.walk nothing is listed up front: directories are visited
+    depth-first from an explicit stack and files are yielded as they are seen,
+    so memory stays proportional to the directory depth. Each DirEntry keeps
+    its stat result, so callers can reuse it instead of calling os.stat again.
+    `extensions` (lowercase, with the dot) restricts which files are yielded.
+
+    With a `journal` (a utils.scan_journal.JournalScan), directories unchanged
+    since the last scan are only stat()ed, and only new or modified files are
+    yielded; the caller commits the journal once the files are handled.
+    """
+    exts = frozenset(extensions) if extensions is not None else None
+    stack = [os.fspath(root)]
+    while stack:
+        directory = stack.pop()
+        dir_st = None
+        if journal is not None:
+            try:
+                dir_st = os.stat(directory)
+            except OSError as e:
+                if logger:
+                    logger.warning(f"Cannot scan {directory}: {e}")
+                continue
+            subdirs = journal.unchanged_subdirs(directory, dir_st)
+            if subdirs is not None:
+                if logger:
+                    logger.debug(f"Unchanged since last scan: {directory}")
+                stack.extend(reversed(subdirs))
+                continue
+            known = journal.known_files(directory)
+
+        if logger:
+            logger.debug(f"Scanning: {directory}")
+        try:
+            it = os.scandir(directory)
+        except OSError as e:
+            if logger:
+                logger.warning(f"Cannot scan {directory}: {e}")
+            continue
+
+        subdirs, files, entries = [], [], 0
+        with it:
+            for entry in it:
+                entries += 1
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if not (skip_hidden_dirs and entry.name.startswith(".")):
+                            subdirs.append(entry.path)
+                        continue
+                    if not entry.is_file():
+                        continue
+                except OSError:
+                    continue
+
+                if exts is not None and os.path.splitext(entry.name)[1].lower() not in exts:
+                    if logger:
+                        logger.debug(f"Skipping unsupported: {entry.name}")
+                    continue
+
+                if journal is not None:
+                    try:
+                        st = entry.stat()
+                    except OSError:
+                        continue
+                    fresh = known.get(entry.path) != (st.st_size, st.st_mtime_ns)
+                    files.append((entry.path, st.st_size, st.st_mtime_ns, fresh))
+                    if not fresh:
+                        journal.files_skipped += 1
+                        continue
+                yield entry
+
+        if journal is not None:
+            journal.record_dir(directory, dir_st, entries, subdirs, files)
+        # Reversed so subdirectories are visited in listing order.
+        stack.extend(reversed(subdirs))
+
+
+class BackgroundCounter:
+    """
+    Count the files a scan will produce on a daemon thread, so progress output
+    can show a total without delaying the first file.
+    """
+
+    def __init__(self, roots, extensions=None, skip_hidden_dirs=False):
+        self.count = 0
+        self.finished = False
+        self._thread = threading.Thread(target=self._run, args=(roots, extensions, skip_hidden_dirs),
+                                        name="file-counter", daemon=True)
+        self._thread.start()
+
+    def _run(self, roots, extensions, skip_hidden_dirs):
+        for root in roots:
+            for _ in scan_files(root, extensions, skip_hidden_dirs):
+                self.count += 1
+        self.finished = True
+
+    def __str__(self):
+        return str(self.count) if self.finished else f"~{self.count}+"
@@ -0,0 +1,144 @@
+# utils/transfer_scheduler.py
+
+import os
+import threading
+from collections import deque
+from concurrent.futures import Future
+
+DEFAULT_PER_DEVICE = 2
+DEFAULT_MAX_PENDING = 256
+LARGE_FILE_BYTES = 64 * 1024 * 1024
+LOOKAHEAD = 64  # queued jobs inspected when the head's devices are busy
+
+
+def device_of(path):
+    """st_dev of `path`, or of its nearest existing parent if it does not exist yet."""
+    path = os.path.abspath(os.fspath(path))
+    while True:
+        try:
+            return os.stat(path).st_dev
+        except FileNotFoundError:
+            parent = os.path.dirname(path)
+            if parent == path:
+                raise
+            path = parent
+
+
+class _Job:
+    __slots__ = ("fn", "args", "kwargs", "devices", "future")
+
+    def __init__(self, fn, args, kwargs, devices):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.devices = devices
+        self.future = Future()
+
+
+class TransferScheduler:
+    """
+    Runs transfer jobs on a thread pool with at most `per_device` jobs writing
+    to any one destination device (st_dev) at a time, so a slow NAS link does
+    not hold up copies to a local disk and vice versa.
+
+    Jobs are queued as large or small by size and workers alternate between the
+    two queues, keeping sequential throughput (big videos) and IOPS (photos)
+    busy together. submit() blocks once `max_pending` jobs are queued.
+    """
+
+    def __init__(self, per_device=DEFAULT_PER_DEVICE, workers=None, max_pending=DEFAULT_MAX_PENDING,
+                 large_bytes=LARGE_FILE_BYTES):
+        self.per_device = max(1, per_device)
+        self.large_bytes = large_bytes
+        self.max_pending = max_pending
+        self._queues = {True: deque(), False: deque()}
+        self._prefer_large = True
+        self._busy = {}
+        self._devices = {}
+        self._closed = False
+        self._cond = threading.Condition()
+        workers = workers or self.per_device * 2
+        self._threads = [threading.Thread(target=self._work, name=f"transfer-{i}", daemon=True)
+                         for i in range(workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def _device(self, target_dir):
+        # Date folders share a device with their parent, so cache per directory.
+        target_dir = os.fspath(target_dir)
+        dev = self._devices.get(target_dir)
+        if dev is None:
+            dev = self._devices[target_dir] = device_of(target_dir)
+        return dev
+
+    def submit(self, fn, *args, size=0, targets=(), **kwargs):
+        """
+        Queue `fn(*args, **kwargs)` writing to the directories in `targets`;
+        `size` is the number of bytes it reads. Returns a Future.
+        """
+        devices = tuple(sorted({self._device(t) for t in targets}))
+        job = _Job(fn, args, kwargs, devices)
+        with self._cond:
+            while self._pending() >= self.max_pending and not self._closed:
+                self._cond.wait()
+            if self._closed:
+                raise RuntimeError("TransferScheduler is closed")
+            self._queues[size >= self.large_bytes].append(job)
+            self._cond.notify_all()
+        return job.future
+
+    def _pending(self):
+        return len(self._queues[True]) + len(self._queues[False])
+
+    def _runnable(self, job):
+        return all(self._busy.get(dev, 0) < self.per_device for dev in job.devices)
+
+    def _take(self):
+        order = (True, False) if self._prefer_large else (False, True)
+        for large in order:
+            queue = self._queues[large]
+            for i in range(min(len(queue), LOOKAHEAD)):
+                job = queue[i]
+                if self._runnable(job):
+                    del queue[i]
+                    self._prefer_large = not large
+                    for dev in job.devices:
+                        self._busy[dev] = self._busy.get(dev, 0) + 1
+                    return job
+        return None
+
+    def _work(self):
+        while True:
+            with self._cond:
+                job = self._take()
+                while job is None:
+                    if self._closed and not self._pending():
+                        return
+                    self._cond.wait()
+                    job = self._take()
+                self._cond.notify_all()  # room for submit()
+
+            if job.future.set_running_or_notify_cancel():
+                try:
+                    job.future.set_result(job.fn(*job.args, **job.kwargs))
+                except BaseException as e:
+                    job.future.set_exception(e)
+
+            with self._cond:
+                for dev in job.devices:
+                    self._busy[dev] -= 1
+                self._cond.notify_all()
+
+    def close(self):
+        """Run everything still queued, then stop the workers."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()